@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.binance_backfill import KlineBackfiller, WeightBucket, plan_chunks, KLINE_WEIGHT
+from benchmarks.binance_stub_server import StubKlineServer, start
+
+class CountingSink:
+    """Stands in for cache_data_binance: checks each flush and counts rows."""
+    def __init__(self):
+        self.rows = {}
+        self.flushes = 0
+
+    def __call__(self, df, symbol):
+        assert df['timestamp'].is_monotonic_increasing and not df['timestamp'].duplicated().any()
+        self.rows[symbol] = self.rows.get(symbol, 0) + len(df)
+        self.flushes += 1
+
+async def sequential_baseline(base_url, symbol, start, end, chunks, throttle=0.2):
+    """The old fetch_data pattern: one chunk at a time with a fixed sleep."""
+    import aiohttp
+    began = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        for _, start_ms, end_ms in plan_chunks(symbol, start, end)[:chunks]:
+            params = {"symbol": symbol, "interval": "1m", "startTime": start_ms, "endTime": end_ms, "limit": 1000}
+            async with session.get(base_url + "/api/v3/klines", params=params) as response:
+                await response.json()
+            await asyncio.sleep(throttle)
+    return (time.perf_counter() - began) / chunks
+
+async def run(args):
+    server = StubKlineServer(args.weight_limit, args.period, args.latency_ms)
+    runner, base_url = await start(server)
+    try:
+        end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        start_dt = end - timedelta(days=args.days)
+        symbols = [f"SYM{i:03d}USDT" for i in range(args.symbols)]
+        sink = CountingSink()
+        bucket = WeightBucket(args.weight_limit, args.headroom, args.period)
+        backfiller = KlineBackfiller(sink, base_url=base_url, concurrency=args.concurrency, bucket=bucket)
+        stats = await backfiller.run({s: (start_dt, end) for s in symbols})
+
+        expected = args.days * 1440
+        short = [s for s in symbols if sink.rows.get(s, 0) < expected]
+        budget_rate = args.weight_limit * args.headroom / args.period / KLINE_WEIGHT
+        print(f"symbols={args.symbols} days={args.days} requests={stats['requests']} rows={sum(sink.rows.values())} "
+              f"flushes={sink.flushes}")
+        print(f"async backfill  {stats['seconds']:7.2f}s  {stats['requests'] / stats['seconds']:7.1f} req/s "
+              f"(budget {budget_rate:.1f} req/s)  429s={server.rejected}  peak weight={server.peak_used}/{args.weight_limit}")
+        print(f"symbols short of {expected} rows: {len(short)}")
+
+        per_chunk = await sequential_baseline(base_url, symbols[0], int(start_dt.timestamp() * 1000),
+                                              int(end.timestamp() * 1000), chunks=10)
+        print(f"sequential      {per_chunk * stats['requests']:7.2f}s  (extrapolated, {per_chunk * 1000:.0f} ms/chunk)")
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description='Async kline backfill against a local stub server.')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--weight-limit', type=int, default=6000)
+    parser.add_argument('--headroom', type=float, default=0.9)
+    parser.add_argument('--period', type=float, default=60.0, help='weight window in seconds (shrink to test faster)')
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
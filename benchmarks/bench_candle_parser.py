@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+import orjson
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.candle_parser import parse_binance_klines, parse_fyers_candles, concat_candles, candles_frame
+
+IST = ZoneInfo("Asia/Kolkata")
+
+def binance_bodies(chunks, start_ms=1_700_000_000_000, seed=3):
+    """Raw /api/v3/klines bodies of 1000 candles each, prices as strings like the API."""
+    rng = np.random.default_rng(seed)
+    bodies = []
+    for c in range(chunks):
+        close = 30000 + np.cumsum(rng.normal(0, 5, 1000))
+        rows = []
+        for i, px in enumerate(close):
+            open_ms = start_ms + (c * 1000 + i) * 60_000
+            rows.append([open_ms, f"{px:.2f}", f"{px + 3:.2f}", f"{px - 3:.2f}", f"{px:.2f}", f"{rng.random() * 50:.5f}",
+                         open_ms + 59_999, "0", 10, "0", "0", "0"])
+        bodies.append(orjson.dumps(rows))
+    return bodies
+
+def fyers_payloads(chunks, start_s=1_700_000_000, seed=4):
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for c in range(chunks):
+        close = np.round(1500 + np.cumsum(rng.normal(0, 1, 1000)), 2)
+        payloads.append([[start_s + (c * 1000 + i) * 60, px, px + 1, px - 1, px, int(rng.integers(1, 5000))]
+                         for i, px in enumerate(close.tolist())])
+    return payloads
+
+def legacy_binance(symbol, bodies):
+    all_data = []
+    for body in bodies:
+        for candle in orjson.loads(body):
+            ts = datetime.fromtimestamp(candle[0] / 1000, tz=timezone.utc).astimezone(IST)
+            all_data.append({"symbol": symbol, "timestamp": ts, "open": float(candle[1]), "high": float(candle[2]),
+                             "low": float(candle[3]), "close": float(candle[4]), "volume": float(candle[5])})
+    return pd.DataFrame(all_data)
+
+def legacy_fyers(symbol, payloads):
+    all_data = []
+    for candles in payloads:
+        for c in candles:
+            all_data.append({"symbol": symbol, "timestamp": datetime.fromtimestamp(c[0], tz=IST), "open": float(c[1]),
+                             "high": float(c[2]), "low": float(c[3]), "close": float(c[4]), "volume": float(c[5])})
+    return pd.DataFrame(all_data)
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def compare(name, legacy, parsed, repeat):
+    t_old, old = timed(legacy, repeat)
+    t_new, new = timed(parsed, repeat)
+    same_ts = (old['timestamp'].map(pd.Timestamp).values == new['timestamp'].values).all()
+    same_px = np.array_equal(old[['open', 'high', 'low', 'close', 'volume']].to_numpy(),
+                             new[['open', 'high', 'low', 'close', 'volume']].to_numpy())
+    print(f"{name:8s} rows={len(new):8d}  legacy {t_old * 1000:8.1f} ms  columns {t_new * 1000:7.1f} ms  "
+          f"x{t_old / t_new:5.1f}  identical={same_ts and same_px}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-row vs columnar candle parsing.')
+    parser.add_argument('--chunks', type=int, default=100, help='responses of 1000 candles each')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = binance_bodies(args.chunks)
+    compare("binance", lambda: legacy_binance("BTCUSDT", bodies),
+            lambda: candles_frame("BTCUSDT", *concat_candles([parse_binance_klines(b) for b in bodies])), args.repeat)
+
+    payloads = fyers_payloads(args.chunks)
+    compare("fyers", lambda: legacy_fyers("RELIANCE", payloads),
+            lambda: candles_frame("RELIANCE", *concat_candles([parse_fyers_candles(p) for p in payloads])), args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import aiohttp
+from services.data_lake.fyers_history import FyersHistoryClient, RateLimiter, plan_fyers_chunks
+from benchmarks.fyers_stub_server import StubFyersServer, start
+
+class CountingSink:
+    """Stands in for cache_data_fyers: checks each flush and collects timestamps."""
+    def __init__(self):
+        self.minutes = {}
+        self.flushes = 0
+
+    def __call__(self, df, symbol):
+        assert df['timestamp'].is_monotonic_increasing and not df['timestamp'].duplicated().any()
+        self.minutes.setdefault(symbol, set()).update(df['timestamp'].astype('int64').tolist())
+        self.flushes += 1
+
+async def sequential_baseline(base_url, symbol, start_ms, end_ms, chunks):
+    """The old fetch_fyers_data pattern: a new client per chunk, one chunk at a time."""
+    began = time.perf_counter()
+    planned = plan_fyers_chunks(symbol, start_ms, end_ms)[:chunks]
+    for _, chunk_start, chunk_end in planned:
+        async with aiohttp.ClientSession(headers={"Authorization": "id:token"}) as session:
+            params = {"symbol": f"NSE:{symbol}-EQ", "resolution": "1", "date_format": "0",
+                      "range_from": str(chunk_start // 1000), "range_to": str(chunk_end // 1000), "cont_flag": "1"}
+            async with session.get(base_url + "/data/history", params=params) as response:
+                await response.read()
+    return (time.perf_counter() - began) / len(planned)
+
+async def run(args):
+    server = StubFyersServer(args.per_second, args.per_minute, args.scale, args.latency_ms)
+    runner, base_url = await start(server)
+    try:
+        end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        start_dt = end - timedelta(days=args.days)
+        symbols = [f"SYM{i:03d}" for i in range(args.symbols)]
+        sink = CountingSink()
+        # The client believes the documented limits; --per-minute below 200 makes the stub stricter than that
+        limiter = RateLimiter(((10, 1.0 * args.scale), (200, 60.0 * args.scale)), args.headroom)
+        client = FyersHistoryClient(sink, "id", "token", base_url=base_url, concurrency=args.concurrency,
+                                    limiter=limiter, retries=args.retries)
+        stats = await client.run({s: (start_dt, end) for s in symbols})
+
+        start_ms, end_ms = int(start_dt.timestamp() * 1000), int(end.timestamp() * 1000)
+        expected = {s: set((StubFyersServer.candles(s, start_ms // 1000, end_ms // 1000)[:, 0] * 1000).astype('int64').tolist())
+                    for s in symbols}
+        missing = sum(len(expected[s] - sink.minutes.get(s, set())) for s in symbols)
+        failed = sum(len(s["failed"]) for s in stats["symbols"].values())
+        print(f"symbols={args.symbols} days={args.days} requests={stats['requests']} "
+              f"rows={sum(len(m) for m in sink.minutes.values())} flushes={sink.flushes}")
+        print(f"concurrent client {stats['seconds']:7.2f}s  {stats['requests'] / stats['seconds']:6.1f} req/s  "
+              f"429s={server.rejected} re-queued={stats['requeued']} failed chunks={failed} missing candles={missing}")
+
+        per_chunk = await sequential_baseline(base_url, symbols[0], start_ms, end_ms, chunks=5)
+        print(f"sequential        {per_chunk * stats['requests']:7.2f}s  (extrapolated without 429 sleeps, "
+              f"{per_chunk * 1000:.0f} ms/chunk)")
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent Fyers history client against a local stub.')
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--days', type=float, default=365)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--headroom', type=float, default=0.6)
+    parser.add_argument('--per-second', type=int, default=10)
+    parser.add_argument('--per-minute', type=int, default=200)
+    parser.add_argument('--scale', type=float, default=0.1, help='shrink the 1s/60s windows to run faster')
+    parser.add_argument('--latency-ms', type=float, default=30.0)
+    parser.add_argument('--retries', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
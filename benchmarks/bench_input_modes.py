@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import json
+import argparse
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+import orjson
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.live_feed import build_pair_index, spread_updates, parse_price, PriceSampler
+from services.data_lake.redis_writer import CoalescingWriter
+
+IST = ZoneInfo("Asia/Kolkata")
+
+def trade_frame(mode, symbol, t_ms, seq, price):
+    if mode == "bookTicker":
+        return {"u": seq, "s": symbol, "b": f"{price - 0.01:.8f}", "B": "1.20000000",
+                "a": f"{price + 0.01:.8f}", "A": "0.80000000"}
+    frame = {"e": mode, "E": t_ms, "s": symbol, "p": f"{price:.8f}", "q": "0.01200000", "T": t_ms, "m": True, "M": True}
+    frame.update({"t": seq} if mode == "trade" else {"a": seq, "f": seq * 3, "l": seq * 3 + 2})
+    return frame
+
+def make_stream(mode, symbols, seconds, rate, rng):
+    """(sim time s, raw frame) in arrival order, Poisson arrivals at `rate` per symbol per second."""
+    events = []
+    for i, symbol in enumerate(symbols):
+        n = rng.poisson(rate * seconds)
+        times = np.sort(rng.uniform(0, seconds, n))
+        prices = 100 + i + np.cumsum(rng.normal(0, 0.01, n))
+        events += [(t, orjson.dumps(trade_frame(mode, symbol.upper(), int(t * 1000), k, p)))
+                   for k, (t, p) in enumerate(zip(times.tolist(), prices.tolist()))]
+    events.sort(key=lambda e: e[0])
+    return events
+
+class NullRedis:
+    def pipeline(self, transaction=True):
+        raise RuntimeError("not flushed in this benchmark")
+
+def run(mode, events, index, slopes, sample_ms):
+    """CPU seconds to take every frame through decode, parse, LTP + spread writes; plus counters."""
+    writer = CoalescingWriter(NullRedis(), "bench")
+    latest_prices = {}
+    live_slope = lambda pair, price1, price2: slopes.get(pair)
+    sampler = PriceSampler() if sample_ms else None
+    waiting_since = {}
+    staleness = 0.0
+
+    def on_price(symbol, price):
+        timestamp = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+        latest_prices[symbol] = price
+        writer.hset("binance_ltp:stocks", symbol, json.dumps({"symbol": symbol, "price": str(price), "timestamp": timestamp}))
+        for pair, spread_data in spread_updates(symbol, index, latest_prices, live_slope, timestamp):
+            writer.hset("spreads:live_data", pair, json.dumps(spread_data))
+
+    interval = sample_ms / 1000.0 if sample_ms else None
+    next_drain = interval
+    started = time.process_time()
+    for t, frame in events:
+        if sampler is not None:
+            while t >= next_drain:
+                for symbol, price in sampler.drain().items():
+                    staleness = max(staleness, next_drain - waiting_since.pop(symbol))
+                    on_price(symbol, price)
+                next_drain += interval
+        tick = parse_price(mode, orjson.loads(frame))
+        if tick is None:
+            continue
+        if sampler is not None:
+            sampler.offer(*tick)
+            waiting_since.setdefault(tick[0], t)
+        else:
+            on_price(*tick)
+    cpu = time.process_time() - started
+    return cpu, writer.updates, staleness
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU per symbol of each live feed input mode.')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--pairs-per-symbol', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--trade-rate', type=float, default=400, help='@trade messages per symbol per second')
+    parser.add_argument('--agg-rate', type=float, default=150, help='@aggTrade messages per symbol per second')
+    parser.add_argument('--book-rate', type=float, default=600, help='@bookTicker messages per symbol per second')
+    parser.add_argument('--sample-ms', type=float, nargs='+', default=[100, 250])
+    args = parser.parse_args()
+    rng = np.random.default_rng(21)
+
+    symbols = [f"sym{i:02d}usdt" for i in range(args.symbols)]
+    pairs = {}
+    for i, sym in enumerate(symbols):
+        for k in range(1, args.pairs_per_symbol // 2 + 1):
+            other = symbols[(i + k) % len(symbols)]
+            pairs[f"{sym}_{other}"] = [sym, other]
+    index = build_pair_index(pairs)
+    slopes = {pair: float(rng.uniform(0.5, 2.0)) for pair in pairs}
+    rates = {"trade": args.trade_rate, "aggTrade": args.agg_rate, "bookTicker": args.book_rate}
+    streams = {mode: make_stream(mode, symbols, args.seconds, rate, rng) for mode, rate in rates.items()}
+
+    symbol_seconds = args.symbols * args.seconds
+    print(f"{args.symbols} symbols, {len(pairs)} pairs, {args.seconds:.0f}s of simulated stream")
+    print(f"{'mode':<28}{'msgs/s/sym':>11}{'writes/s/sym':>14}{'CPU ms/s/sym':>14}{'max LTP age':>13}")
+    for mode, events in streams.items():
+        for sample_ms in [0] + args.sample_ms:
+            cpu, writes, staleness = run(mode, events, index, slopes, sample_ms)
+            label = mode + (f" + {sample_ms:.0f}ms sampler" if sample_ms else "")
+            print(f"{label:<28}{len(events) / symbol_seconds:11.0f}{writes / symbol_seconds:14.1f}"
+                  f"{cpu * 1000 / symbol_seconds:14.3f}{staleness * 1000:11.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.hedge_ratio import vectorized_ols, rolling_ols
+
+def synthetic_pair(rows, seed=7):
+    rng = np.random.default_rng(seed)
+    x = 30000 + np.cumsum(rng.normal(0, 5, rows))
+    y = 0.065 * x + np.cumsum(rng.normal(0, 0.4, rows)) + 100
+    return pd.Series(y), pd.Series(x)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling hedge ratio benchmark.')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--window', type=int, default=500)
+    args = parser.parse_args()
+
+    y, x = synthetic_pair(args.rows)
+    print(f"rows={args.rows} window={args.window}")
+
+    fast, fast_time = timed(rolling_ols, y, x, args.window)
+    print(f"rolling_ols     {fast_time:8.3f}s")
+
+    slow, slow_time = timed(vectorized_ols, y, x, args.window)
+    print(f"vectorized_ols  {slow_time:8.3f}s")
+
+    both = ~np.isnan(slow)
+    max_rel_err = np.max(np.abs(fast[both] - slow[both]) / np.abs(slow[both]))
+    print(f"speedup {slow_time / fast_time:.1f}x, max relative error {max_rel_err:.2e}")
+    assert np.array_equal(np.isnan(fast), np.isnan(slow))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.algo_signals.band_kernel import bollinger_signals_fast, bollinger_last_signals
+
+def spread_frames(pairs, rows, seed=25):
+    """Per-pair tails as fetch_spread_data returns them; some pairs are shorter than the window."""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range('2024-01-01', periods=rows, freq='min', tz='Asia/Kolkata')
+    frames = {}
+    for p in range(pairs):
+        n = rows if p % 50 else int(rng.integers(1, rows))
+        close = np.abs(np.cumsum(rng.normal(0, 1, n))) * rng.uniform(0.1, 3) + rng.uniform(0, 5)
+        frames[f"pair{p:04d}"] = pd.DataFrame({'symbol': f"pair{p:04d}", 'timestamp': timestamps[-n:], 'close': close})
+    return frames
+
+def legacy_signal(df, window, num_std):
+    """generate_signals + iloc[-1], as process_symbol ran it for every pair."""
+    result_df = df.copy()
+    std = df['close'].rolling(window).std()
+    signals, long_bands, short_bands, mean_vals = bollinger_signals_fast(df['close'].values, std.values, num_std)
+    bands_df = pd.DataFrame({'long_band': long_bands, 'short_band': short_bands, 'mean': mean_vals}, index=df.index)
+    result_df['signal'] = signals
+    return pd.concat([result_df, bands_df], axis=1).iloc[-1]
+
+def legacy_cycle(frames, window, num_std, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(lambda df: legacy_signal(df, window, num_std), frames.values()))
+    return {row['symbol']: row for row in rows if row['signal'] != 0}
+
+def batch_cycle(frames, window, num_std, bars):
+    """The (pairs, bars) matrix PriceCache.tails returns, then one kernel pass."""
+    closes = np.full((len(frames), bars), np.nan)
+    for i, df in enumerate(frames.values()):
+        tail = df['close'].to_numpy()[-bars:]
+        closes[i, bars - len(tail):] = tail
+    signals, long_bands, short_bands, mean_vals = bollinger_last_signals(closes, window, num_std)
+    names = list(frames)
+    return {names[i]: (signals[i], long_bands[i], short_bands[i], mean_vals[i]) for i in np.flatnonzero(signals)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Minute-cycle signal stage: per-pair pandas vs one batch kernel.')
+    parser.add_argument('--pairs', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--window', type=int, default=200)
+    parser.add_argument('--std', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=10)
+    args = parser.parse_args()
+    bars = args.window + 10
+
+    bollinger_last_signals(np.zeros((1, bars)), args.window, args.std)  # compile / load the numba cache
+    print("Compute only: the legacy path also ran one SQL query per pair, the batch path one for all pairs.")
+    print(f"{'pairs':>7}{'legacy ms':>12}{'batch ms':>11}{'speedup':>9}{'signals':>9}")
+    for pairs in args.pairs:
+        frames = spread_frames(pairs, bars)
+        legacy_cycle(frames, args.window, args.std, args.workers)
+        started = time.perf_counter()
+        legacy = legacy_cycle(frames, args.window, args.std, args.workers)
+        legacy_time = time.perf_counter() - started
+        started = time.perf_counter()
+        batch = batch_cycle(frames, args.window, args.std, bars)
+        batch_time = time.perf_counter() - started
+
+        assert legacy.keys() == batch.keys(), "signal mismatch"
+        for name, (signal, long_band, short_band, mean) in batch.items():
+            row = legacy[name]
+            assert row['signal'] == signal
+            assert np.allclose([row['long_band'], row['short_band'], row['mean']], [long_band, short_band, mean])
+        print(f"{pairs:7d}{legacy_time * 1000:12.1f}{batch_time * 1000:11.2f}{legacy_time / batch_time:8.0f}x{len(batch):9d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.hedge_ratio import REANCHOR_INTERVAL, rolling_ols
+from services.data_lake.spread_kernel import rolling_spread_ohlc, spread_buffers
+
+OHLC = ['open', 'high', 'low', 'close']
+
+def aligned_pair(rows, seed=5):
+    rng = np.random.default_rng(seed)
+    x = 30000 + np.cumsum(rng.normal(0, 5, rows))
+    y = 0.065 * x + np.cumsum(rng.normal(0, 0.4, rows)) + 100
+    merged = pd.DataFrame({
+        'timestamp': pd.date_range('2023-01-01', periods=rows, freq='min', tz='Asia/Kolkata'),
+        'symbol_x': 'ETHUSDT', 'symbol_y': 'BTCUSDT',
+    })
+    for leg, close in ((1, y), (2, x)):
+        merged[f'open_{leg}'] = close * 1.0001
+        merged[f'high_{leg}'] = close * 1.0005
+        merged[f'low_{leg}'] = close * 0.9995
+        merged[f'close_{leg}'] = close
+    # A few NULL prices, which dropna used to remove
+    merged.loc[rng.integers(0, rows, 20), 'high_2'] = np.nan
+    return merged
+
+def legacy_spread(merged, window):
+    """_calculate_ols_spread before the compiled kernel."""
+    hedge_series = pd.Series(rolling_ols(merged['close_1'], merged['close_2'], window), index=merged.index)
+    return pd.DataFrame({
+        "timestamp": merged["timestamp"],
+        "symbol": merged["symbol_x"] + "_" + merged["symbol_y"],
+        "open": merged["open_1"] - (hedge_series * merged["open_2"]),
+        "high": merged["high_1"] - (hedge_series * merged["high_2"]),
+        "low": merged["low_1"] - (hedge_series * merged["low_2"]),
+        "close": merged["close_1"] - (hedge_series * merged["close_2"]),
+        "volume": 0,
+        "slope": hedge_series
+    }).dropna()
+
+def kernel_spread(merged, window):
+    leg1 = np.vstack([merged[f'{col}_1'].to_numpy(dtype=np.float64) for col in OHLC])
+    leg2 = np.vstack([merged[f'{col}_2'].to_numpy(dtype=np.float64) for col in OHLC])
+    out, keep = spread_buffers(len(merged))
+    count = rolling_spread_ohlc(leg1, leg2, window, REANCHOR_INTERVAL, out, keep)
+    rows = keep[:count]
+    return pd.DataFrame({
+        "timestamp": merged["timestamp"].array[rows],
+        "symbol": f"{merged['symbol_x'].iloc[0]}_{merged['symbol_y'].iloc[0]}",
+        "open": out[1, :count], "high": out[2, :count], "low": out[3, :count], "close": out[4, :count],
+        "volume": 0,
+        "slope": out[0, :count]
+    }, index=rows)
+
+def best_of(fn, repeat, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description='Spread OHLC kernel benchmark.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[5_500, 100_000, 1_000_000])
+    parser.add_argument('--window', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    kernel_spread(aligned_pair(args.window * 2), args.window)  # compile / load the numba cache
+    for rows in args.rows:
+        merged = aligned_pair(rows)
+        legacy, legacy_time = best_of(legacy_spread, args.repeat, merged, args.window)
+        fused, fused_time = best_of(kernel_spread, args.repeat, merged, args.window)
+
+        assert (legacy.index == fused.index).all()
+        assert (legacy['timestamp'].array == fused['timestamp'].array).all()
+        slope_error = np.max(np.abs(legacy['slope'] - fused['slope']) / np.abs(legacy['slope']))
+        spread_error = np.max(np.abs(legacy[OHLC].to_numpy() - fused[OHLC].to_numpy()))
+        print(f"rows={rows:>9d}  pandas {legacy_time * 1e3:9.2f}ms  kernel {fused_time * 1e3:9.2f}ms  "
+              f"speedup {legacy_time / fused_time:5.1f}x  slope rel err {slope_error:.1e}  spread abs err {spread_error:.1e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import json
+import argparse
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.live_feed import build_pair_index, spread_updates
+
+IST = ZoneInfo("Asia/Kolkata")
+
+class CountingRedis:
+    """Stands in for redis_client.hset so only the tick path is timed."""
+    def __init__(self):
+        self.writes = {}
+
+    def hset(self, key, field, value):
+        self.writes[(key, field)] = value
+
+def legacy_tick(symbol, pairs, latest_prices, live_slope, redis_client):
+    """binance_ws_handler's spread loop before the pair index: every pair, every tick."""
+    for pair, symbols in pairs.items():
+        sym1, sym2 = symbols
+        if (symbol in [sym1, sym2] and
+                sym1 in latest_prices and
+                sym2 in latest_prices):
+            slope = live_slope(pair, latest_prices[sym1], latest_prices[sym2])
+            if slope is None:
+                continue
+            current_time = datetime.now(IST)
+            spread_data = {
+                "close": str(latest_prices[sym1] - (slope * latest_prices[sym2])),
+                "slope": str(slope),
+                "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "symbol1": sym1,
+                "symbol2": sym2
+            }
+            redis_client.hset("spreads:live_data", pair, json.dumps(spread_data))
+
+def indexed_tick(symbol, index, latest_prices, live_slope, redis_client):
+    timestamp = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+    for pair, spread_data in spread_updates(symbol, index, latest_prices, live_slope, timestamp):
+        redis_client.hset("spreads:live_data", pair, json.dumps(spread_data))
+
+def make_universe(n_symbols, n_pairs, rng):
+    symbols = [f"sym{i:04d}usdt" for i in range(n_symbols)]
+    pairs = {}
+    while len(pairs) < n_pairs:
+        a, b = rng.choice(n_symbols, 2, replace=False)
+        pairs[f"{symbols[a]}_{symbols[b]}"] = [symbols[a], symbols[b]]
+    slopes = {pair: float(rng.uniform(0.5, 2.0)) for pair in pairs}
+    return symbols, pairs, slopes
+
+def run(tick, target, ticks, prices, slopes):
+    latest_prices = {}
+    redis_client = CountingRedis()
+    live_slope = lambda pair, price1, price2: slopes.get(pair)
+    started = time.perf_counter()
+    for symbol, price in zip(ticks, prices):
+        latest_prices[symbol] = price
+        tick(symbol, target, latest_prices, live_slope, redis_client)
+    elapsed = time.perf_counter() - started
+    return elapsed, redis_client.writes
+
+def main():
+    parser = argparse.ArgumentParser(description='Live spread tick-path throughput, pair scan vs pair index.')
+    parser.add_argument('--symbols', type=int, default=300)
+    parser.add_argument('--pairs', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--ticks', type=int, default=50_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(17)
+
+    for n_pairs in args.pairs:
+        symbols, pairs, slopes = make_universe(args.symbols, n_pairs, rng)
+        # Liquid symbols tick far more often than the tail
+        weights = 1.0 / np.arange(1, len(symbols) + 1)
+        ticks = [symbols[i] for i in rng.choice(len(symbols), args.ticks, p=weights / weights.sum())]
+        prices = rng.uniform(1, 100, args.ticks).round(4).tolist()
+
+        legacy_time, legacy_writes = run(legacy_tick, pairs, ticks, prices, slopes)
+        indexed_time, indexed_writes = run(indexed_tick, build_pair_index(pairs), ticks, prices, slopes)
+        strip = lambda writes: {k: {f: v for f, v in json.loads(w).items() if f != "timestamp"}
+                                for k, w in writes.items()}
+        assert strip(legacy_writes) == strip(indexed_writes)
+        print(f"pairs={n_pairs:<5d} symbols={args.symbols}  scan {args.ticks / legacy_time:9.0f} ticks/s  "
+              f"index {args.ticks / indexed_time:9.0f} ticks/s  speedup {legacy_time / indexed_time:5.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+import argparse
+import asyncio
+import numpy as np
+from aiohttp import web
+
+MS_PER_MINUTE = 60_000
+
+class StubKlineServer:
+    """
+    Local stand-in for GET /api/v3/klines. Serves deterministic 1m candles up
+    to the current minute, charges 2 weight per request in a fixed window of
+    `period` seconds, reports it in X-MBX-USED-WEIGHT-1M and answers 429 with
+    Retry-After once the limit is crossed, like Binance does.
+    """
+    def __init__(self, weight_limit=6000, period=60.0, latency_ms=20.0):
+        self.weight_limit = weight_limit
+        self.period = period
+        self.latency = latency_ms / 1000.0
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.requests = 0
+        self.rejected = 0
+        self.peak_used = 0
+
+    def _charge(self, weight):
+        now = time.monotonic()
+        if now - self.window_start >= self.period:
+            self.window_start, self.used = now, 0
+        self.used += weight
+        self.peak_used = max(self.peak_used, self.used)
+        return self.used, self.period - (now - self.window_start)
+
+    @staticmethod
+    def candles(symbol, start_ms, end_ms, limit):
+        first = -(-start_ms // MS_PER_MINUTE)
+        last = min(end_ms // MS_PER_MINUTE, int(time.time() * 1000) // MS_PER_MINUTE, first + limit - 1)
+        minutes = np.arange(first, last + 1, dtype=np.int64)
+        if not len(minutes):
+            return []
+        phase = sum(map(ord, symbol)) % 97
+        close = 100 + 10 * np.sin(minutes / 500.0 + phase)
+        return [
+            [int(m * MS_PER_MINUTE), f"{c + 0.01:.8f}", f"{c + 0.05:.8f}", f"{c - 0.05:.8f}", f"{c:.8f}",
+             "12.50000000", int(m * MS_PER_MINUTE) + 59_999, "1250.0", 10, "6.0", "600.0", "0"]
+            for m, c in zip(minutes.tolist(), close.tolist())
+        ]
+
+    async def klines(self, request):
+        self.requests += 1
+        used, reset_in = self._charge(2)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if used > self.weight_limit:
+            self.rejected += 1
+            headers["Retry-After"] = str(max(1, int(np.ceil(reset_in))))
+            return web.json_response({"code": -1003, "msg": "Too many requests"}, status=429, headers=headers)
+        await asyncio.sleep(self.latency)
+        q = request.query
+        data = self.candles(q["symbol"], int(q["startTime"]), int(q["endTime"]), int(q.get("limit", 500)))
+        return web.json_response(data, headers=headers)
+
+    def app(self):
+        application = web.Application()
+        application.router.add_get("/api/v3/klines", self.klines)
+        return application
+
+async def start(server, host="127.0.0.1", port=0):
+    """Run the stub in the current loop; returns (runner, base_url)."""
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Binance kline server.')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--weight-limit', type=int, default=6000)
+    parser.add_argument('--period', type=float, default=60.0)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+    server = StubKlineServer(args.weight_limit, args.period, args.latency_ms)
+    web.run_app(server.app(), host="127.0.0.1", port=args.port)
+
+if __name__ == "__main__":
+    main()
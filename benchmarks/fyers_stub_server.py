@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import argparse
+import asyncio
+import numpy as np
+import orjson
+from aiohttp import web
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.trading_calendar import NSE_CALENDAR, IST_OFFSET_MINUTES
+
+class StubFyersServer:
+    """
+    Local stand-in for GET /data/history. Serves deterministic 1m candles
+    ([epoch s, o, h, l, c, v]) for every NSE_CALENDAR trading minute and
+    enforces per-second and per-minute request limits in fixed windows,
+    answering over-limit requests with the 429 JSON body Fyers sends,
+    retry_after included. Window lengths can be scaled down to exercise the
+    limiter quickly.
+    """
+    def __init__(self, per_second=10, per_minute=200, scale=1.0, latency_ms=30.0):
+        self.limits = [(per_second, 1.0 * scale), (per_minute, 60.0 * scale)]
+        self.windows = [[time.monotonic(), 0] for _ in self.limits]
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+        self.rejected = 0
+        self.unauthorized = 0
+
+    def _admit(self):
+        now = time.monotonic()
+        wait = 0.0
+        for (limit, period), window in zip(self.limits, self.windows):
+            if now - window[0] >= period:
+                window[0], window[1] = now, 0
+            if window[1] >= limit:
+                wait = max(wait, period - (now - window[0]))
+        if wait:
+            return wait
+        for window in self.windows:
+            window[1] += 1
+        return 0.0
+
+    @staticmethod
+    def candles(symbol, range_from, range_to):
+        first = -(-range_from // 60)
+        last = min(range_to, int(time.time()) - 60) // 60
+        minutes = NSE_CALENDAR.between(first + IST_OFFSET_MINUTES, last + IST_OFFSET_MINUTES) - IST_OFFSET_MINUTES
+        phase = sum(map(ord, symbol)) % 89
+        close = np.round(1000 + 50 * np.sin(minutes / 700.0 + phase), 2)
+        return np.column_stack([minutes * 60.0, close + 0.5, close + 1.0, close - 1.0, close, 100.0 + minutes % 977])
+
+    async def history(self, request):
+        self.requests += 1
+        if ":" not in request.headers.get("Authorization", ""):
+            self.unauthorized += 1
+            return web.json_response({"s": "error", "code": -16, "message": "Could not authenticate the user"})
+        wait = self._admit()
+        if wait:
+            self.rejected += 1
+            return web.json_response({"s": "error", "code": 429, "message": "request limit reached",
+                                      "retry_after": round(wait, 3)}, status=429)
+        await asyncio.sleep(self.latency)
+        q = request.query
+        candles = self.candles(q["symbol"], int(q["range_from"]), int(q["range_to"]))
+        body = {"s": "ok", "candles": candles} if len(candles) else {"s": "no_data", "candles": []}
+        return web.Response(body=orjson.dumps(body, option=orjson.OPT_SERIALIZE_NUMPY), content_type="application/json")
+
+    def app(self):
+        application = web.Application()
+        application.router.add_get("/data/history", self.history)
+        return application
+
+async def start(server, host="127.0.0.1", port=0):
+    """Run the stub in the current loop; returns (runner, base_url)."""
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Fyers history server.')
+    parser.add_argument('--port', type=int, default=8902)
+    parser.add_argument('--per-second', type=int, default=10)
+    parser.add_argument('--per-minute', type=int, default=200)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier on the 1s/60s windows')
+    parser.add_argument('--latency-ms', type=float, default=30.0)
+    args = parser.parse_args()
+    server = StubFyersServer(args.per_second, args.per_minute, args.scale, args.latency_ms)
+    web.run_app(server.app(), host="127.0.0.1", port=args.port)
+
+if __name__ == "__main__":
+    main()
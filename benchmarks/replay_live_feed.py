@@ -0,0 +1,211 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import orjson
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from services.data_lake.live_feed import LiveSpreadFeed, PriceSampler, parse_price, INPUT_MODES
+from services.data_lake.redis_writer import CoalescingWriter, FLUSH_INTERVAL_MS
+from services.data_lake.frame_log import FrameRecorder, read_frames
+from services.data_lake.live_bands import LiveBands
+from benchmarks.bench_input_modes import make_stream
+
+class NullRedis:
+    """Pipeline that only counts, for timing the tick path without a Redis server."""
+    def __init__(self):
+        self.commands = 0
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self.commands += 1
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.commands += 1
+
+    def execute(self):
+        return []
+
+def detect_mode(frames):
+    for _, frame in frames:
+        data = orjson.loads(frame)
+        if 'e' in data and data['e'] in INPUT_MODES:
+            return data['e']
+        if 'b' in data and 'a' in data:
+            return "bookTicker"
+    raise ValueError("No trade, aggTrade or bookTicker frames found")
+
+def make_pairs(symbols, per_symbol, rng):
+    symbols = sorted(symbols)
+    pairs = {}
+    for i, sym in enumerate(symbols):
+        for k in range(1, per_symbol // 2 + 1):
+            other = symbols[(i + k) % len(symbols)]
+            if other != sym:
+                pairs[f"{sym}_{other}"] = float(rng.uniform(0.5, 2.0))
+    return pairs
+
+def new_feed(redis_client, mode, pairs, sample_ms, bands_window=0, bands_std=2.0):
+    writer = CoalescingWriter(redis_client, "replay", max_pending=10**9)
+    bands = LiveBands(bands_window, bands_std) if bands_window else None
+    feed = LiveSpreadFeed(writer, lambda pair, price1, price2: pairs.get(pair), mode,
+                          PriceSampler() if sample_ms else None, bands,
+                          ltp_key="replay:binance_ltp", spread_key="replay:spreads_live", signal_key="replay:signals")
+    feed.set_pairs(list(pairs))
+    if bands is not None:
+        # Warm every pair so the band check runs from the first tick
+        bands.seed({pair: [0.0, 1.0] * bands_window for pair in pairs})
+    return feed, writer
+
+def replay(frames, feed, writer, sample_ms, flush_ms, max_pending):
+    """
+    Every frame through decode + LiveSpreadFeed at full speed. Sampler
+    drains and writer flushes happen when the recorded receive time crosses
+    their interval, as they would live; flushes are timed apart from the
+    tick path since they run off the event loop in production.
+    """
+    latencies = np.empty(len(frames), dtype=np.int64)
+    flush_ns = []
+    start_ns = frames[0][0]
+    next_drain = start_ns + sample_ms * 1_000_000 if sample_ms else None
+    next_flush = start_ns + flush_ms * 1_000_000
+    gc_before = gc.get_stats()[0]["collections"]
+    blocks_before = sys.getallocatedblocks()
+    began = time.perf_counter_ns()
+    for i, (received_ns, frame) in enumerate(frames):
+        t0 = time.perf_counter_ns()
+        if next_drain is not None and received_ns >= next_drain:
+            feed.drain()
+            next_drain = received_ns + sample_ms * 1_000_000
+        feed.handle_message(orjson.loads(frame))
+        t1 = time.perf_counter_ns()
+        latencies[i] = t1 - t0
+        if received_ns >= next_flush or writer.pending_fields >= max_pending:
+            writer.flush()
+            flush_ns.append(time.perf_counter_ns() - t1)
+            next_flush = received_ns + flush_ms * 1_000_000
+    writer.flush()
+    wall = (time.perf_counter_ns() - began) / 1e9
+    return {
+        "frames": len(frames),
+        "ticks_per_sec": len(frames) / (latencies.sum() / 1e9),
+        "ticks_per_sec_with_flush": len(frames) / wall,
+        "latency_us": {q: float(np.percentile(latencies, float(q[1:]))) / 1000 for q in ("p50", "p90", "p99", "p99.9")}
+                      | {"max": float(latencies.max()) / 1000},
+        "flushes": len(flush_ns),
+        "flush_ms_mean": float(np.mean(flush_ns)) / 1e6 if flush_ns else None,
+        "fields_written": writer.written,
+        "conflation_ratio": writer.updates / writer.written if writer.written else None,
+        "gen0_gc_per_10k": (gc.get_stats()[0]["collections"] - gc_before) * 10_000 / len(frames),
+        "retained_blocks": sys.getallocatedblocks() - blocks_before,
+    }
+
+def allocation_pass(frames, feed):
+    """tracemalloc over a slice of frames: bytes allocated per tick (transient peak) and kept."""
+    tracemalloc.start()
+    per_tick = np.empty(len(frames), dtype=np.int64)
+    start, _ = tracemalloc.get_traced_memory()
+    for i, (_, frame) in enumerate(frames):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        feed.handle_message(orjson.loads(frame))
+        _, peak = tracemalloc.get_traced_memory()
+        per_tick[i] = peak - before
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"bytes_per_tick_mean": float(per_tick.mean()), "bytes_per_tick_p99": float(np.percentile(per_tick, 99)),
+            "retained_bytes": end - start}
+
+def load_frames(args, rng):
+    if args.frames:
+        frames = [f for path in args.frames for f in read_frames(path)]
+        print(f"Loaded {len(frames)} recorded frames from {len(args.frames)} file(s)")
+        return frames
+    symbols = [f"sym{i:02d}usdt" for i in range(args.symbols)]
+    events = make_stream(args.mode or "trade", symbols, args.seconds, args.rate, rng)
+    frames = [(int(t * 1e9), frame) for t, frame in events]
+    if args.record:
+        recorder = FrameRecorder(args.record)
+        for received_ns, frame in frames:
+            recorder.write(frame, received_ns)
+        recorder.close()
+        frames = list(read_frames(args.record))
+        print(f"Recorded {len(frames)} synthetic frames to {args.record} ({os.path.getsize(args.record)} bytes)")
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded or synthetic Binance frames through the live spread feed.')
+    parser.add_argument('--frames', nargs='+', help='recordings made with BINANCE_RECORD_PATH')
+    parser.add_argument('--mode', choices=list(INPUT_MODES), help='default: detected from the frames')
+    parser.add_argument('--symbols', type=int, default=30, help='synthetic frames only')
+    parser.add_argument('--rate', type=float, default=300, help='synthetic messages per symbol per second')
+    parser.add_argument('--seconds', type=float, default=20, help='synthetic stream length')
+    parser.add_argument('--record', help='also write the synthetic frames to this recording and replay from it')
+    parser.add_argument('--pairs-per-symbol', type=int, default=4)
+    parser.add_argument('--sample-ms', type=float, default=0)
+    parser.add_argument('--flush-ms', type=float, default=FLUSH_INTERVAL_MS)
+    parser.add_argument('--max-pending', type=int, default=500)
+    parser.add_argument('--bands-window', type=int, default=0, help='evaluate live Bollinger bands of this many bars')
+    parser.add_argument('--bands-std', type=float, default=2.0)
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15', help="local Redis to write to; 'none' to skip")
+    parser.add_argument('--alloc-frames', type=int, default=20_000)
+    parser.add_argument('--json', help='write the results here')
+    parser.add_argument('--baseline', help='results JSON of an earlier run; exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed ticks/s drop or p99 rise vs baseline')
+    args = parser.parse_args()
+    rng = np.random.default_rng(22)
+
+    frames = load_frames(args, rng)
+    mode = args.mode or detect_mode(frames)
+    symbols = {tick[0] for tick in (parse_price(mode, orjson.loads(f)) for _, f in frames) if tick}
+    pairs = make_pairs(symbols, args.pairs_per_symbol, rng)
+    if args.redis_url == 'none':
+        redis_client = NullRedis()
+    else:
+        import redis
+        redis_client = redis.Redis.from_url(args.redis_url)
+        redis_client.ping()
+
+    print(f"mode={mode} symbols={len(symbols)} pairs={len(pairs)} sample_ms={args.sample_ms} redis={args.redis_url}")
+    feed, writer = new_feed(redis_client, mode, pairs, args.sample_ms, args.bands_window, args.bands_std)
+    results = replay(frames, feed, writer, args.sample_ms, args.flush_ms, args.max_pending)
+    results["signals"] = feed.signals
+    feed, _ = new_feed(NullRedis(), mode, pairs, args.sample_ms, args.bands_window, args.bands_std)
+    results["allocations"] = allocation_pass(frames[:args.alloc_frames], feed)
+
+    lat = results["latency_us"]
+    print(f"ticks/s {results['ticks_per_sec']:,.0f} (tick path)  {results['ticks_per_sec_with_flush']:,.0f} (with flushes)")
+    print(f"latency us  p50 {lat['p50']:.1f}  p90 {lat['p90']:.1f}  p99 {lat['p99']:.1f}  "
+          f"p99.9 {lat['p99.9']:.1f}  max {lat['max']:.1f}")
+    print(f"flushes {results['flushes']} (mean {results['flush_ms_mean'] or 0:.3f} ms)  fields written "
+          f"{results['fields_written']}  conflation {results['conflation_ratio'] or 0:.2f}x")
+    alloc = results["allocations"]
+    print(f"allocations  {alloc['bytes_per_tick_mean']:.0f} B/tick mean, {alloc['bytes_per_tick_p99']:.0f} B p99, "
+          f"{alloc['retained_bytes']} B retained over {min(len(frames), args.alloc_frames)} ticks;  "
+          f"gen0 GC {results['gen0_gc_per_10k']:.1f}/10k ticks")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        slower = results["ticks_per_sec"] < base["ticks_per_sec"] * (1 - args.tolerance)
+        p99_up = lat["p99"] > base["latency_us"]["p99"] * (1 + args.tolerance)
+        print(f"vs baseline: ticks/s {results['ticks_per_sec'] / base['ticks_per_sec'] - 1:+.1%}, "
+              f"p99 {lat['p99'] / base['latency_us']['p99'] - 1:+.1%}")
+        if slower or p99_up:
+            print("REGRESSION")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,16 @@ import redis
 import json
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from multiprocessing import Pool, cpu_count
-from services.data_lake.fyersdata import fyers_Symbol_gap_filler
+from services.data_lake.fyersdata import fyers_Symbol_gap_filler, fyers_Symbols_gap_repair, fyers_Symbols_backfill
 from services.data_lake.crypto_spreds import process_cripto_spreads
 from services.data_lake.nse_spreads import process_nse_spreads
+from services.data_lake.spread_batch import process_batch_spreads
+from services.data_lake.spreads_helper import get_spread_mode
+from services.data_lake.price_cache import get_price_cache, SPREAD_COLUMNS
+from services.data_lake.watermarks import get_watermarks
 from services.data_lake.crypto_ws import ws_runner
-from services.algo_signals.signal import process_symbol_signal
-from services.data_lake.binance import Binance_Symbol_gap_filler
+from services.algo_signals.signal import process_batch_signals
+from services.data_lake.binance import Binance_Symbol_gap_filler, Binance_Symbols_backfill, Binance_Symbols_gap_repair
 from services.broker_auth.main import Fyers_Auth
 from services.loger import logger
 from symbol_list import BINANCE_SYMBOLS, FYERS_SYMBOLS, DB_SYMBOLS, NSE_SYMBOLS, ETF_SYMBOLS,SNP_SYMBOLS
@@ -41,25 +45,38 @@ def auth_process():
         if EXCHANGE == 'nse':
             Fyers_Auth()
 
+def backfill_symbols(symbols):
+    # Legs of pairs added through /admin/user_pairs are filled even when not in the static lists
+    pairs = json.loads(redis_client.get(f'manual_symbols:user_pairs_{EXCHANGE}') or "[]")
+    legs = [leg.split(":")[1].split("-")[0] if ":" in leg else leg.upper() for pair in pairs for leg in pair]
+    return list(dict.fromkeys(list(symbols) + legs))
+
 def symbol_gap_filler():
     if EXCHANGE == 'binance':
-        for symbol in BINANCE_SYMBOLS:
-            Binance_Symbol_gap_filler(symbol)
+        Binance_Symbols_backfill(backfill_symbols(BINANCE_SYMBOLS))
 
     elif EXCHANGE == 'nse':
-        for full_symbol in FYERS_SYMBOLS:
-            symbol = full_symbol.split(":")[1].split("-")[0]
-            fyers_Symbol_gap_filler(symbol)
+        fyers_Symbols_backfill(backfill_symbols(full_symbol.split(":")[1].split("-")[0] for full_symbol in FYERS_SYMBOLS))
+
+def symbol_gap_repair():
+    # Holes inside the history, which the forward fillers never revisit
+    try:
+        if EXCHANGE == 'binance':
+            Binance_Symbols_gap_repair(BINANCE_SYMBOLS)
+        elif EXCHANGE == 'nse':
+            fyers_Symbols_gap_repair([full_symbol.split(":")[1].split("-")[0] for full_symbol in FYERS_SYMBOLS])
+    except Exception as e:
+        logger.error(f"Error in symbol_gap_repair: {e}")
 
 def symbol_1m_filler():
     if EXCHANGE == 'binance':
-        with Pool(processes=10) as pool:
-            pool.map(Binance_Symbol_gap_filler, BINANCE_SYMBOLS)
+        Binance_Symbols_backfill(backfill_symbols(BINANCE_SYMBOLS))
 
     elif EXCHANGE == 'nse':
-        symbols = [full_symbol.split(":")[1].split("-")[0] for full_symbol in FYERS_SYMBOLS]
-        with Pool(processes=10) as pool:
-            pool.map(fyers_Symbol_gap_filler, symbols)
+        symbols = backfill_symbols(full_symbol.split(":")[1].split("-")[0] for full_symbol in FYERS_SYMBOLS)
+        # Load every watermark in one query
+        get_watermarks("public.nse_stocks").get_many(symbols)
+        fyers_Symbols_backfill(symbols)
 
 def save_spreads_list():
     mapping = {
@@ -89,6 +106,13 @@ def Spreads_gap_filler(exchange):
     print(f"Spreads gap filler start {datetime.now()}")
     redis_key = f'manual_symbols:user_pairs_{exchange}'
     symbol_pairs = json.loads(redis_client.get(redis_key))
+    if get_spread_mode(redis_client) == "batch" and exchange in ('binance', 'nse'):
+        process_batch_spreads(exchange, symbol_pairs)
+        print("Spreads gap filler completed")
+        return
+    # Last spread row of every pair in one query instead of one connection per pair
+    get_watermarks(f"public.{exchange}_spreads").get_many(
+        f"{a.replace(':', '').lower()}_{b.replace(':', '').lower()}" for a, b in symbol_pairs)
     with ThreadPoolExecutor(max_workers=10) as pool:
         if exchange == 'nse':
             pool.map(lambda pair: process_nse_spreads(pair[0].upper(), pair[1].upper()), symbol_pairs)
@@ -99,10 +123,9 @@ def Spreads_gap_filler(exchange):
 def signal_proces():
     try:
         redis_key = f'spreads:{EXCHANGE}_spreads_name'
-        symbol_pairs = [p.decode() for p in redis_client.smembers(redis_key)]
-
-        with ThreadPoolExecutor(max_workers=10) as pool:
-            pool.map(lambda pair: process_symbol_signal(pair, EXCHANGE), symbol_pairs)
+        symbol_pairs = sorted(p.decode() for p in redis_client.smembers(redis_key))
+        # All pairs in one load and one kernel pass; only actionable pairs touch the DB again
+        process_batch_signals(symbol_pairs, EXCHANGE)
     except Exception as e:
         logger.error(f"Error in signal_proces: {e}")
 
@@ -152,7 +175,10 @@ def run_gap_fillers_loop():
 
         print(f"[{datetime.now()}] Starting cycle...")
         symbol_1m_filler()
+        # Pull the bars just written by the filler processes into this process's cache
+        get_price_cache(f"public.{EXCHANGE}_stocks").refresh()
         Spreads_gap_filler(EXCHANGE)
+        get_price_cache(f"public.{EXCHANGE}_spreads", SPREAD_COLUMNS).refresh()
         # view_refresh()
         threading.Thread(target=view_refresh, daemon=True, name="view_refresh").start()
         signal_proces()
@@ -168,6 +194,7 @@ if __name__ == "__main__":
 
     symbol_gap_filler()
     print('Symbol_gap_filler completed')
+    symbol_gap_repair()
 
     Spreads_gap_filler(EXCHANGE)
 
@@ -1,23 +1,7 @@
 import pandas as pd
 import numpy as np
-from numba import jit
 from services.config import redis_connection, config
-
-@jit(nopython=True)
-def bollinger_signals_fast(close_prices, std_vals, num_std):
-    n = len(close_prices)
-    signals = np.zeros(n)
-    # signals = np.ones(n)
-    long_bands = std_vals - (num_std * std_vals)
-    short_bands = std_vals + (num_std * std_vals)
-    
-    for i in range(n):
-        if close_prices[i] < long_bands[i]: 
-            signals[i] = 1
-        elif close_prices[i] > short_bands[i]: 
-            signals[i] = -1
-    
-    return signals, long_bands, short_bands, std_vals
+from services.algo_signals.band_kernel import bollinger_signals_fast
 
 class TradingStrategyEngine:
     def __init__(self):
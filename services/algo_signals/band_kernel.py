@@ -0,0 +1,57 @@
+import math
+import numpy as np
+from numba import jit
+
+@jit(nopython=True)
+def bollinger_signals_fast(close_prices, std_vals, num_std):
+    n = len(close_prices)
+    signals = np.zeros(n)
+    # signals = np.ones(n)
+    long_bands = std_vals - (num_std * std_vals)
+    short_bands = std_vals + (num_std * std_vals)
+
+    for i in range(n):
+        if close_prices[i] < long_bands[i]:
+            signals[i] = 1
+        elif close_prices[i] > short_bands[i]:
+            signals[i] = -1
+
+    return signals, long_bands, short_bands, std_vals
+
+@jit(nopython=True, cache=True)
+def bollinger_last_signals(closes, window, num_std):
+    """
+    Latest-bar Bollinger signal of every row of `closes` (pairs, bars), each
+    row's newest bar last and missing bars NaN. Equivalent to the last row of
+    rolling(window).std() + bollinger_signals_fast per pair: the std is the
+    sample std (ddof=1) of the newest `window` bars, NaN when any of them is
+    missing, and the bands are placed exactly as bollinger_signals_fast does.
+    Returns (signals, long_bands, short_bands, mean_vals), one value per pair.
+    """
+    pairs, bars = closes.shape
+    signals = np.zeros(pairs)
+    long_bands = np.full(pairs, np.nan)
+    short_bands = np.full(pairs, np.nan)
+    mean_vals = np.full(pairs, np.nan)
+    if window < 2 or bars < window:
+        return signals, long_bands, short_bands, mean_vals
+    for p in range(pairs):
+        total = 0.0
+        for i in range(bars - window, bars):
+            total += closes[p, i]
+        if total != total:
+            continue
+        mean = total / window
+        m2 = 0.0
+        for i in range(bars - window, bars):
+            m2 += (closes[p, i] - mean) ** 2
+        std = math.sqrt(m2 / (window - 1))
+        long_bands[p] = std - num_std * std
+        short_bands[p] = std + num_std * std
+        mean_vals[p] = std
+        close = closes[p, bars - 1]
+        if close < long_bands[p]:
+            signals[p] = 1
+        elif close > short_bands[p]:
+            signals[p] = -1
+    return signals, long_bands, short_bands, mean_vals
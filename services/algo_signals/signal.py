@@ -1,9 +1,14 @@
+import time
 import pandas as pd
+import numpy as np
 import json
 from datetime import datetime
 from services.config import redis_connection, config
 from services.db_config import get_db_connection
+from services.data_lake.price_cache import get_price_cache, SPREAD_COLUMNS
+from services.data_lake.minute_index import from_epoch_minutes
 from services.algo_signals.Strategy import TradingStrategyEngine
+from services.algo_signals.band_kernel import bollinger_last_signals
 from services.algo_signals.monitor import start_monitor
 
 class SignalProcessor:
@@ -20,32 +25,14 @@ class SignalProcessor:
         try:
             symbol_pairs = [symbol_pairs] if isinstance(symbol_pairs, str) else symbol_pairs
             lookback = int(self.account_data.get("lookback")) + 10
-            table = f"public.{exchange}_spreads"
-            placeholders = ','.join(['%s'] * len(symbol_pairs))
-            
-            query = f"""
-                WITH ranked AS (
-                    SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY timestamp DESC) rn
-                    FROM {table} WHERE symbol IN ({placeholders})
-                )
-                SELECT symbol, timestamp, open, high, low, close, volume, slope
-                FROM ranked WHERE rn <= %s ORDER BY symbol, timestamp DESC
-            """
+            cache = get_price_cache(f"public.{exchange}_spreads", SPREAD_COLUMNS)
+            frames = [cache.tail(pair, lookback) for pair in symbol_pairs]
+            frames = [df for df in frames if not df.empty]
+            if not frames:
+                return pd.DataFrame()
 
-            with get_db_connection() as conn, conn.cursor() as cur:
-                cur.execute(query, symbol_pairs + [lookback])
-                rows = cur.fetchall()
-                if not rows:
-                    return pd.DataFrame()
-                cols = [desc[0] for desc in cur.description]
-
-            df = pd.DataFrame(rows, columns=cols)
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'slope']
-            
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            df = df.sort_values('timestamp', ascending=True).reset_index(drop=True)
+            df = pd.concat(frames, ignore_index=True)
+            df = df.sort_values('timestamp', ascending=True, kind='stable').reset_index(drop=True)
             return df
         except Exception as e:
             print(f"fetch_spread_data error: {e}")
@@ -207,6 +194,14 @@ class SignalProcessor:
             print("Latest row:\n", latest)
             signal = int(latest['signal'])
             start_monitor(exchange)
+            return self.execute_signal(symbol_pair, latest, signal, exchange)
+        except Exception as e:
+            print(f"process_symbol error for {symbol_pair} on {exchange}: {e}")
+            return None
+
+    def execute_signal(self, symbol_pair, latest, signal, exchange):
+        """Open a trade for a pair's latest signal row unless it is flat or already traded."""
+        try:
             if signal == 0 or self.check_trade_exists(symbol_pair, signal, exchange):
                 print(f"No valid signal or trade already exists for {symbol_pair} on {exchange}.")
                 return None
@@ -230,9 +225,62 @@ class SignalProcessor:
             self.store_trade(trade_data, exchange)
             return trade_data
         except Exception as e:
-            print(f"process_symbol error for {symbol_pair} on {exchange}: {e}")
+            print(f"execute_signal error for {symbol_pair} on {exchange}: {e}")
             return None
 
+    def generate_batch_signals(self, symbol_pairs, exchange):
+        """
+        Latest-bar signal rows of every pair from one load of their last
+        lookback + 10 spread closes into a (pairs, bars) matrix and one kernel
+        pass over it. Same values as process_symbol's latest row, but only
+        the pairs with a non-zero signal are returned.
+        """
+        params = self.strategy_engine.strategy_params
+        if params['strategy'].lower() != 'bollinger':
+            print(f"generate_batch_signals error: Unknown strategy '{params['strategy']}'")
+            return []
+        lookback = int(self.account_data.get("lookback")) + 10
+        cache = get_price_cache(f"public.{exchange}_spreads", SPREAD_COLUMNS)
+        last_minutes, closes = cache.tails(symbol_pairs, lookback)
+        signals, long_bands, short_bands, mean_vals = bollinger_last_signals(closes, params['window'], params['std'])
+        actionable = np.flatnonzero(signals)
+        timestamps = from_epoch_minutes(last_minutes[actionable], cache.tz) if len(actionable) else []
+        return [{
+            "symbol": symbol_pairs[i],
+            "timestamp": timestamp,
+            "close": closes[i, -1],
+            "signal": signals[i],
+            "long_band": long_bands[i],
+            "short_band": short_bands[i],
+            "mean": mean_vals[i],
+        } for i, timestamp in zip(actionable, timestamps)]
+
+    def process_batch(self, symbol_pairs, exchange):
+        try:
+            started = time.perf_counter()
+            rows = self.generate_batch_signals(list(symbol_pairs), exchange)
+            print(f"Signals for {len(symbol_pairs)} pairs on {exchange} in {(time.perf_counter() - started) * 1000:.1f} ms, "
+                  f"{len(rows)} actionable")
+        except Exception as e:
+            print(f"process_batch error on {exchange}: {e}")
+            return []
+        start_monitor(exchange)
+        trades = []
+        for latest in rows:
+            print("Latest row:\n", latest)
+            trade_data = self.execute_signal(latest['symbol'], latest, int(latest['signal']), exchange)
+            if trade_data:
+                trades.append(trade_data)
+        return trades
+
+
+def process_batch_signals(symbol_pairs, exchange):
+    try:
+        processor = SignalProcessor(exchange)
+        return processor.process_batch(symbol_pairs, exchange)
+    except Exception as e:
+        print(f"process_batch_signals error on {exchange}: {e}")
+        return []
 
 def process_symbol_signal(symbol_pair, exchange):
     try:
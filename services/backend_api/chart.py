@@ -14,6 +14,7 @@ from services.db_config import DB_NAME_2, DB_PORT, DB_USER, DB_PASS, DB_HOST, DB
 from psycopg2 import sql
 from dateutil.parser import parse as parse_datetime
 from services.backend_api.services.ltp_ws import fetch_ltp
+from services.data_lake.price_cache import get_price_cache, OHLCV, SPREAD_COLUMNS
 eventlet.monkey_patch()
 from flask import request
 app = Flask(__name__)
@@ -50,6 +51,22 @@ def format_timestamp(timestamp):
         print(f"Error formatting timestamp {timestamp}: {e}")
         return str(timestamp)
 
+def fetch_cached_candles(table, db_symbol, limit, offset):
+    """1m candles of a raw bar table from the shared price cache, newest `limit` after `offset`."""
+    columns = SPREAD_COLUMNS if table.endswith('_spreads') else OHLCV
+    df = get_price_cache(f"{DB_SCHEMA}.{table}", columns).tail(db_symbol, limit + offset)
+    if df.empty:
+        return []
+    df = df.iloc[:len(df) - offset]
+    timestamps = df['timestamp']
+    if getattr(timestamps.dt, 'tz', None) is not None:
+        timestamps = timestamps.dt.tz_convert('Asia/Kolkata').dt.tz_localize(None)
+    return [
+        {'timestamp': ts, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for ts, o, h, l, c, v in zip(timestamps.dt.strftime("%Y-%m-%dT%H:%M:%S"), df['open'], df['high'],
+                                     df['low'], df['close'], df['volume'])
+    ]
+
 @chart_bp.route('/ohlcv')
 def get_ohlcv():
     symbol = request.args.get('symbol')
@@ -94,38 +111,46 @@ def get_ohlcv():
     if interval not in valid_intervals:
         return jsonify({"error": "Invalid interval"}), 400
 
-    # Fetch from PostgreSQL
+    # 1m candles are the raw table rows, served from the in-process price cache
     db_candles = []
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        query = sql.SQL("""
-            SELECT bucket, open, high, low, close, volume
-            FROM {view}
-            WHERE symbol = %s
-            ORDER BY bucket DESC
-            LIMIT %s OFFSET %s
-        """).format(view=sql.Identifier(materialized_view))
-
-        cur.execute(query, (db_symbol, limit, offset))
-        rows = cur.fetchall()
-        for row in rows:
-            db_candles.append({
-                'timestamp': format_timestamp(row[0]),
-                'open': float(row[1]),
-                'high': float(row[2]),
-                'low': float(row[3]),
-                'close': float(row[4]),
-                'volume': float(row[5])
-            })
-    except Exception as e:
-        print(f"Database query failed: {e}")
-        cur.close()
-        conn.close()
-        return jsonify({"error": f"Database query failed: {e}"}), 500
-    finally:
-        cur.close()
-        conn.close()
+    if interval == '1m':
+        try:
+            db_candles = fetch_cached_candles(materialized_view[:-len('_1m')], db_symbol, limit, offset)
+        except Exception as e:
+            print(f"Price cache read failed for {db_symbol}, using {materialized_view}: {e}")
+
+    # Fetch from PostgreSQL
+    if not db_candles:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            query = sql.SQL("""
+                SELECT bucket, open, high, low, close, volume
+                FROM {view}
+                WHERE symbol = %s
+                ORDER BY bucket DESC
+                LIMIT %s OFFSET %s
+            """).format(view=sql.Identifier(materialized_view))
+
+            cur.execute(query, (db_symbol, limit, offset))
+            rows = cur.fetchall()
+            for row in rows:
+                db_candles.append({
+                    'timestamp': format_timestamp(row[0]),
+                    'open': float(row[1]),
+                    'high': float(row[2]),
+                    'low': float(row[3]),
+                    'close': float(row[4]),
+                    'volume': float(row[5])
+                })
+        except Exception as e:
+            print(f"Database query failed: {e}")
+            cur.close()
+            conn.close()
+            return jsonify({"error": f"Database query failed: {e}"}), 500
+        finally:
+            cur.close()
+            conn.close()
 
     if not db_candles:
         print("No data found in database")
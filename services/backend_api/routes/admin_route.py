@@ -6,6 +6,10 @@ from services.loger import logger
 from services.backend_api.services.event_service import (
     AccountMatrixdata
 )
+from services.data_lake.backfill_scheduler import load_progress
+from services.data_lake.redis_writer import load_writer_metrics
+from services.data_lake.ws_manager import load_shard_metrics
+from services.data_lake.feed_latency import load_latency_metrics
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 @admin_bp.route('/dashboard')
@@ -100,6 +104,39 @@ def update_user_pairs():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@admin_bp.route('/backfill_progress/<symbol_type>', methods=['GET'])
+def backfill_progress(symbol_type):
+    try:
+        if symbol_type not in ['nse', 'binance']:
+            return jsonify({"success": False, "error": "Invalid 'symbol_type'"}), 400
+        return jsonify({"success": True, "data": load_progress(redis_client, symbol_type)}), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@admin_bp.route('/live_feed_metrics', methods=['GET'])
+def live_feed_metrics():
+    try:
+        data = {"writers": load_writer_metrics(redis_client), "shards": load_shard_metrics(redis_client)}
+        return jsonify({"success": True, "data": data}), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@admin_bp.route('/live_feed_latency', methods=['GET'])
+def live_feed_latency():
+    try:
+        exchange = request.args.get('exchange')
+        latency = load_latency_metrics(redis_client, exchange)
+        symbol = request.args.get('symbol')
+        if symbol:
+            latency = {name: {k: v for k, v in symbols.items() if k in (symbol.lower(), "_all")}
+                       for name, symbols in latency.items()}
+        return jsonify({"success": True, "data": latency}), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @admin_bp.route('/capital', methods=['POST'])
 def update_total_capital():
     try:
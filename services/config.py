@@ -24,12 +24,18 @@ account_data = {k.decode('utf-8'): v.decode('utf-8') for k, v in account_matrix.
 lookback = int(account_data.get("lookback"))
 std = int(account_data.get("std"))
 strategy_name = account_data.get("strategy_name")
+hedge_model = account_data.get("hedge_model", "rolling_ols")
 
 config = {
     'params': {
         'strategy': strategy_name, 
         'window': lookback,
-        'std': std
+        'std': std,
+        'hedge_model': hedge_model,
+        'hedge_params': {
+            'delta': float(account_data.get("kalman_delta", 1e-5)),
+            've': float(account_data.get("kalman_ve", 1e-3))
+        }
     },
     # Redis keys
     'redis_keys': {
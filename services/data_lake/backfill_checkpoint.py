@@ -0,0 +1,25 @@
+CHECKPOINT_KEY = "backfill_checkpoint:{exchange}"
+
+# One hash per exchange: symbol -> epoch ms a running backfill resumes from.
+# Everything before it has been written; the entry is removed once the
+# backfill reaches its end, after which MAX(timestamp) is the resume point.
+
+def load_checkpoints(redis_client, exchange, symbols):
+    """{symbol: resume epoch ms} for the symbols with an unfinished backfill."""
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    try:
+        values = redis_client.hmget(CHECKPOINT_KEY.format(exchange=exchange), symbols)
+    except Exception as e:
+        print(f"[CHECKPOINT] Could not load backfill checkpoints for {exchange}: {e}")
+        return {}
+    return {symbol: int(value) for symbol, value in zip(symbols, values) if value is not None}
+
+def save_checkpoint(redis_client, exchange, symbol, resume_ms):
+    redis_client.hset(CHECKPOINT_KEY.format(exchange=exchange), symbol, int(resume_ms))
+
+def clear_checkpoints(redis_client, exchange, symbols):
+    symbols = list(symbols)
+    if symbols:
+        redis_client.hdel(CHECKPOINT_KEY.format(exchange=exchange), *symbols)
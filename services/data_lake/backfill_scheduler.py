@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from services.data_lake.backfill_checkpoint import load_checkpoints, save_checkpoint, clear_checkpoints
+
+# Minutes beyond the OLS window fetched in the foreground of a new symbol's backfill
+RECENT_MARGIN_MINUTES = int(os.getenv("BACKFILL_RECENT_MARGIN_MINUTES", 120))
+PROGRESS_KEY = "backfill_progress:{exchange}"
+# Pairs whose legs got older history after their spreads were computed
+SPREAD_REBUILD_KEY = "spreads:history_rebuild:{exchange}"
+
+def split_recent(start, end, recent_start):
+    """
+    (history, recent) halves of a backfill of [start, end) around
+    recent_start: recent is fetched right away so spreads and signals can
+    start, history later in the background. history is None when the range
+    is already short enough.
+    """
+    recent_start = recent_start.replace(second=0, microsecond=0)
+    if recent_start <= start:
+        return None, (start, end)
+    return (start, recent_start), (recent_start, end)
+
+def publish_progress(redis_client, exchange, symbol, phase, **fields):
+    """Record a symbol's backfill phase (recent, history, done, failed) and counters."""
+    fields.update(phase=phase, updated=int(time.time()))
+    try:
+        redis_client.hset(PROGRESS_KEY.format(exchange=exchange), symbol, json.dumps(fields, default=str))
+    except Exception as e:
+        print(f"[BACKFILL] Could not publish progress for {symbol}: {e}")
+
+def flag_spread_rebuild(redis_client, exchange, symbols):
+    """
+    Mark every pair with a leg in `symbols` for a spread backfill: spreads
+    only move forward from their last row, so history written behind them
+    by the history lane is otherwise never turned into spreads.
+    """
+    legs = {sym.replace(':', '').lower() for sym in symbols}
+    pairs = [name.decode() for name in redis_client.smembers(f"spreads:{exchange}_spreads_name")]
+    flagged = [name for name in pairs if legs.intersection(name.split("_"))]
+    if flagged:
+        redis_client.sadd(SPREAD_REBUILD_KEY.format(exchange=exchange), *flagged)
+    return flagged
+
+def load_spread_rebuilds(redis_client, exchange):
+    return {name.decode() for name in redis_client.smembers(SPREAD_REBUILD_KEY.format(exchange=exchange))}
+
+def clear_spread_rebuild(redis_client, exchange, pair_names):
+    if pair_names:
+        redis_client.srem(SPREAD_REBUILD_KEY.format(exchange=exchange), *pair_names)
+
+def load_progress(redis_client, exchange):
+    mapping = redis_client.hgetall(PROGRESS_KEY.format(exchange=exchange))
+    return {k.decode(): json.loads(v) for k, v in mapping.items()}
+
+class HistoryScheduler:
+    """
+    Background lane for the older half of recent-first backfills. Ranges
+    submitted while a batch runs are collected and run together in the next
+    batch by run_batch({symbol: (start, end)}), which is expected to spend a
+    smaller request budget than the foreground fills. A symbol stays busy
+    until its batch returns; meanwhile foreground fills only move it forward.
+    """
+    def __init__(self, run_batch, name):
+        self.run_batch = run_batch
+        self.name = name
+        self._pending = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def busy(self, symbol):
+        with self._lock:
+            return symbol in self._active
+
+    def submit(self, symbol, start, end):
+        with self._lock:
+            if symbol in self._active:
+                return False
+            self._active.add(symbol)
+            self._pending[symbol] = (start, end)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name=f"{self.name}_history_backfill")
+                self._thread.start()
+        self._wake.set()
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                continue
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                print(f"[BACKFILL] {self.name} history batch failed: {e}")
+            finally:
+                with self._lock:
+                    self._active.difference_update(batch)
+
+def progress_fields(stats):
+    """The counters of a backfiller's per-symbol stats worth publishing."""
+    return {"chunks": stats["chunks"], "planned": stats["planned"], "rows": stats["rows"],
+            "failed": len(stats["failed"]), "resume_ms": stats["resume_ms"]}
+
+def recent_first_backfill(redis_client, exchange, symbols, backfiller, history, last_cached, now,
+                          lookback_start, recent_start):
+    """
+    Forward-fill symbols with a KlineBackfiller-style `backfiller`. Each
+    symbol resumes from its checkpoint, else from last_cached(symbol), else
+    from lookback_start; ranges reaching back before recent_start are split
+    and their older part is submitted to the `history` HistoryScheduler once
+    the recent part is written. Returns the backfiller's stats with the
+    number of handed-off symbols, or {} when there was nothing to fetch.
+    """
+    resume = load_checkpoints(redis_client, exchange, symbols)
+    ranges, handoff = {}, {}
+    for symbol in symbols:
+        last_ts = last_cached(symbol)
+        busy = history.busy(symbol)
+        if busy:
+            # The history lane owns the checkpoint; only move forward from here
+            start_time = last_ts + timedelta(minutes=1) if last_ts else recent_start
+        elif symbol in resume:
+            start_time = datetime.fromtimestamp(resume[symbol] / 1000, tz=now.tzinfo)
+        elif last_ts is None:
+            start_time = lookback_start
+        else:
+            start_time = last_ts + timedelta(minutes=1)
+        older, recent = (None, (start_time, now)) if busy else split_recent(start_time, now, recent_start)
+        if older:
+            handoff[symbol] = older
+        if recent[0] < now:
+            ranges[symbol] = recent
+    if not ranges:
+        return {}
+
+    for symbol, (start_time, end_time) in handoff.items():
+        # Until the history lane writes it, the resume point is the start of the history
+        save_checkpoint(redis_client, exchange, symbol, start_time.timestamp() * 1000)
+        publish_progress(redis_client, exchange, symbol, "recent", history_from=start_time, history_to=end_time)
+    foreground = {sym for sym in ranges if sym not in handoff and not history.busy(sym)}
+
+    def checkpoint(symbol, resume_ms):
+        if symbol in foreground:
+            save_checkpoint(redis_client, exchange, symbol, resume_ms)
+
+    backfiller.checkpoint = checkpoint
+    stats = backfiller.run_sync(ranges)
+    clear_checkpoints(redis_client, exchange, [sym for sym in foreground if stats["symbols"][sym]["complete"]])
+    for symbol, (start_time, end_time) in handoff.items():
+        # A failed recent half keeps the checkpoint at the history start and is retried next cycle
+        if stats["symbols"][symbol]["complete"] and history.submit(symbol, start_time, end_time):
+            publish_progress(redis_client, exchange, symbol, "history", history_from=start_time, history_to=end_time)
+    stats["handoff"] = len(handoff)
+    return stats
+
+def run_history(redis_client, exchange, backfiller, ranges):
+    """run_batch body of a history lane: checkpointed, with progress published per chunk."""
+    backfiller.checkpoint = lambda symbol, resume_ms: save_checkpoint(redis_client, exchange, symbol, resume_ms)
+    backfiller.progress = lambda symbol, s: publish_progress(redis_client, exchange, symbol, "history",
+                                                             **progress_fields(s))
+    stats = backfiller.run_sync(ranges)
+    done = [sym for sym, s in stats["symbols"].items() if s["complete"]]
+    clear_checkpoints(redis_client, exchange, done)
+    if done:
+        flagged = flag_spread_rebuild(redis_client, exchange, done)
+        print(f"[BACKFILL] {len(flagged)} {exchange} pairs flagged for a spread backfill")
+    for symbol, s in stats["symbols"].items():
+        publish_progress(redis_client, exchange, symbol, "done" if s["complete"] else "failed", **progress_fields(s))
+    print(f"History backfill of {len(ranges)} {exchange} symbols: {len(done)} complete,"
+          f" {stats['requests']} requests in {stats['seconds']:.1f}s")
+    return stats
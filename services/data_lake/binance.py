@@ -1,12 +1,14 @@
-import time
 import pandas as pd
 from datetime import datetime, timedelta
-import requests
 import pytz
-from services.config import redis_connection
+from services.config import redis_connection, config
 import json
-from psycopg2.extras import execute_batch
 import psycopg2
+from services.data_lake.binance_backfill import KlineBackfiller, WeightBucket, HISTORY_HEADROOM, HISTORY_IN_FLIGHT
+from services.data_lake.bulk_writer import bulk_upsert
+from services.data_lake.watermarks import get_watermarks
+from services.data_lake.gap_scan import scan_gaps, print_gap_report
+from services.data_lake.backfill_scheduler import HistoryScheduler, RECENT_MARGIN_MINUTES, recent_first_backfill, run_history
 IST = pytz.timezone("Asia/Kolkata")
 redis_client = redis_connection()
 redis_key = f"account_matrix:account"
@@ -28,20 +30,14 @@ end_date_dt = datetime.strptime(end_date, "%Y-%m-%d")
 # Calculate lookback
 DEFAULT_LOOKBACK_DAYS = (end_date_dt - start_date_dt).days
 
+stock_watermarks = get_watermarks("public.binance_stocks")
+# Enough recent candles for the OLS window, fetched before older history
+RECENT_MINUTES = config['params']['window'] + RECENT_MARGIN_MINUTES
+
 #now this is checking last row from the database
 def get_last_cached_timestamp(prefix, symbol):
-    query = """
-        SELECT MAX(timestamp)
-        FROM public.binance_stocks
-        WHERE symbol = %s;
-    """
-    with psycopg2.connect(**TRADING_SYSTEM_CONN_PARAMS) as conn:
-        with conn.cursor() as cur:
-            cur.execute(query, (symbol,))
-            result = cur.fetchone()
-            if result and result[0]:
-                return result[0].astimezone(IST)
-            return None
+    last_ts = stock_watermarks.get(symbol)
+    return last_ts.astimezone(IST) if last_ts else None
 
 TRADING_SYSTEM_CONN_PARAMS = {
     "dbname": "trading_system",
@@ -52,9 +48,10 @@ TRADING_SYSTEM_CONN_PARAMS = {
 }
 
 def cache_data_binance(df, symbol):
+    """Upsert complete candles; returns False only if the write failed."""
     if df is None or df.empty:
         print(f"No new data to insert for {symbol}.")
-        return
+        return True
 
     try:
         # Get current time in IST
@@ -67,119 +64,61 @@ def cache_data_binance(df, symbol):
 
         if df.empty:
             print(f"No complete candle data to insert for {symbol} after filtering.")
-            return
-
-        # Prepare data for insertion
-        rows = []
-        for record in df.to_dict(orient="records"):
-            ts = record["timestamp"]
-            if isinstance(ts, pd.Timestamp):
-                ts = ts.to_pydatetime()
-            ts = ts.astimezone(IST)
-            rows.append((
-                symbol,
-                ts,
-                record["open"],
-                record["high"],
-                record["low"],
-                record["close"],
-                record["volume"]
-            ))
-
-        # Insert data into the database
-        with psycopg2.connect(**TRADING_SYSTEM_CONN_PARAMS) as conn:
-            with conn.cursor() as cur:
-                upsert_query = """
-                    INSERT INTO public.binance_stocks (symbol, timestamp, open, high, low, close, volume)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (symbol, timestamp) DO UPDATE
-                    SET open = EXCLUDED.open,
-                        high = EXCLUDED.high,
-                        low = EXCLUDED.low,
-                        close = EXCLUDED.close,
-                        volume = EXCLUDED.volume;
-                """
-                execute_batch(cur, upsert_query, rows)
-            conn.commit()
-            print(f"✅ Upserted {len(rows)} rows into 'binance_stocks' for {symbol}.")
+            return True
+
+        written = bulk_upsert("public.binance_stocks", df.assign(symbol=symbol))
+        print(f"✅ Upserted {written} rows into 'binance_stocks' for {symbol}.")
+        return True
 
     except Exception as e:
         print(f"⚠️ Error upserting data for {symbol}: {str(e)}")
+        return False
 
-def fetch_data(symbol, start_time, end_time):
-    all_data = []
-    current_start = start_time
-    max_retries = 5
-    base_delay = 5
-
-    while current_start < end_time:
-        current_end = min(current_start + timedelta(minutes=1000), end_time)
-        start_ms = int(current_start.timestamp() * 1000)
-        end_ms = int(current_end.timestamp() * 1000)
-        url = f"https://api.binance.com/api/v3/klines?symbol={symbol}&interval=1m&startTime={start_ms}&endTime={end_ms}"
-
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url)
-                response.raise_for_status()
-
-                # Rate limit handling
-                if 'X-MBX-USED-WEIGHT-1M' in response.headers:
-                    used_weight = int(response.headers['X-MBX-USED-WEIGHT-1M'])
-                    if used_weight > 1000:
-                        sleep_time = min(base_delay * (2 ** attempt), 60)
-                        print(f"Rate limit ({used_weight}) for {symbol}, waiting {sleep_time}s")
-                        time.sleep(sleep_time)
-                        continue
-
-                data = response.json()
-                if not data:
-                    print(f" No data for {symbol} from {current_start} to {current_end}")
-                    break
-
-                # Process candles and convert timestamps from UTC to IST (GMT+5:30)
-                for candle in data:
-                    ts = datetime.fromtimestamp(candle[0] / 1000, tz=pytz.UTC).astimezone(IST)
-                    all_data.append({
-                        "symbol": symbol,
-                        "timestamp": ts,
-                        "open": float(candle[1]),
-                        "high": float(candle[2]),
-                        "low": float(candle[3]),
-                        "close": float(candle[4]),
-                        "volume": float(candle[5])
-                    })
-
-                last_ts = datetime.fromtimestamp(data[-1][0] / 1000, tz=pytz.UTC).astimezone(IST)
-                current_start = last_ts + timedelta(minutes=1)
-                time.sleep(0.2)  # Throttle requests
-                break
-            except requests.exceptions.RequestException as e:
-                sleep_time = base_delay * (2 ** attempt)
-                print(f" Attempt {attempt + 1} failed for {symbol}: {e} - waiting {sleep_time}s")
-                time.sleep(sleep_time)
-                if attempt == max_retries - 1:
-                    print(f" Failed final attempt for {symbol}")
-                    return pd.DataFrame(all_data)
-    return pd.DataFrame(all_data)
+def Binance_Symbol_gap_filler(symbol):
+    return Binance_Symbols_backfill([symbol])
 
+def _binance_history(ranges):
+    """Background lane: older history of recently added symbols on a smaller weight budget."""
+    backfiller = KlineBackfiller(cache_data_binance, concurrency=HISTORY_IN_FLIGHT,
+                                 bucket=WeightBucket(headroom=HISTORY_HEADROOM))
+    run_history(redis_client, "binance", backfiller, ranges)
 
-def Binance_Symbol_gap_filler(symbol):
-    # print(f"Filling missing data for {symbol}...")
-    prefix = "binance"
-    last_ts = get_last_cached_timestamp(prefix, symbol)
-    current_time = datetime.now(IST)
+history_backfill = HistoryScheduler(_binance_history, "binance")
 
-    if last_ts is None:
-        # Initial data load
-        start_time = current_time - timedelta(days=DEFAULT_LOOKBACK_DAYS)
-        df = fetch_data(symbol, start_time, current_time)
-        cache_data_binance(df, symbol)
-    else:
-        gap_start = last_ts + timedelta(minutes=1)
-        if gap_start > current_time:
-            return  # No gap to fill
-
-        # Fill missing data directly via API
-        df = fetch_data(symbol, gap_start, current_time)
-        cache_data_binance(df, symbol)
+def Binance_Symbols_backfill(symbols):
+    """
+    Gap-fill many symbols in one asyncio backfill: every 1000-minute chunk of
+    every symbol is fetched concurrently under one shared request-weight budget
+    and streamed to the database. An interrupted backfill resumes from its
+    checkpoint rather than from the newest stored candle, which may lie past
+    chunks that were never written.
+
+    Long ranges (new symbols, long outages) are filled recent-first: only the
+    last window + margin minutes are fetched here, so spreads can start this
+    cycle, and the rest is handed to the background history lane.
+    """
+    current_time = datetime.now(IST)
+    stock_watermarks.get_many(symbols)  # one query for every symbol's last candle
+    stats = recent_first_backfill(
+        redis_client, "binance", symbols, KlineBackfiller(cache_data_binance), history_backfill,
+        last_cached=lambda symbol: get_last_cached_timestamp("binance", symbol), now=current_time,
+        lookback_start=current_time - timedelta(days=DEFAULT_LOOKBACK_DAYS),
+        recent_start=current_time - timedelta(minutes=RECENT_MINUTES))
+    if not stats:
+        return stats
+    failed = {sym: s["failed"] for sym, s in stats["symbols"].items() if s["failed"]}
+    print(f"Backfilled {len(stats['symbols'])} symbols, {stats['requests']} requests in {stats['seconds']:.1f}s"
+          f" ({stats['rate_limited']} rate limited, {len(failed)} symbols with failed chunks,"
+          f" {stats['handoff']} handed to the history lane)")
+    return stats
+
+def Binance_Symbols_gap_repair(symbols, since=None):
+    """Re-fetch the interior gaps scan_gaps() finds, in the fewest kline requests."""
+    report = scan_gaps("binance", symbols, since)
+    chunks = [(symbol, start * 60_000, end * 60_000) for symbol, r in report.items() for start, end in r["requests"]]
+    repaired = {}
+    if chunks:
+        stats = KlineBackfiller(cache_data_binance).run_chunks_sync(chunks)
+        repaired = {symbol: s["rows"] for symbol, s in stats["symbols"].items()}
+    print_gap_report("binance", report, repaired)
+    return report
@@ -0,0 +1,256 @@
+import os
+import time
+import asyncio
+from collections import deque
+import numpy as np
+import aiohttp
+from services.data_lake.candle_parser import parse_binance_klines, concat_candles, candles_frame
+
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com")
+KLINES_PATH = "/api/v3/klines"
+KLINE_LIMIT = 1000
+KLINE_WEIGHT = 2
+MS_PER_MINUTE = 60_000
+
+# Request weight Binance allows per IP per minute, and the share of it we use
+WEIGHT_LIMIT_1M = int(os.getenv("BINANCE_WEIGHT_LIMIT", 6000))
+WEIGHT_HEADROOM = float(os.getenv("BINANCE_WEIGHT_HEADROOM", 0.9))
+MAX_IN_FLIGHT = int(os.getenv("BINANCE_BACKFILL_CONCURRENCY", 32))
+FLUSH_ROWS = int(os.getenv("BINANCE_BACKFILL_FLUSH_ROWS", 50_000))
+MAX_WRITERS = 4
+# fetch_chunk result asking for the chunk to go to the back of the queue (rate limited)
+RETRY_LATER = "retry_later"
+# Older history of new symbols runs in the background on a smaller share of the weight
+HISTORY_HEADROOM = float(os.getenv("BINANCE_HISTORY_HEADROOM", 0.5))
+HISTORY_IN_FLIGHT = int(os.getenv("BINANCE_HISTORY_CONCURRENCY", 8))
+
+class WeightBucket:
+    """
+    Token bucket over Binance request weight, shared by every request of a
+    backfill. Refills continuously at capacity per `period` seconds and is
+    pulled down to what the server reports in X-MBX-USED-WEIGHT-1M, so weight
+    spent by other processes on the same IP is accounted for. A 429/418
+    empties the bucket until the server's Retry-After has passed.
+    """
+    def __init__(self, limit=WEIGHT_LIMIT_1M, headroom=WEIGHT_HEADROOM, period=60.0):
+        self.capacity = limit * headroom
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight):
+        # One waiter at a time keeps requests in FIFO order
+        async with self._lock:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def observe(self, used_weight):
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used_weight)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+def plan_chunks(symbol, start_ms, end_ms):
+    """(symbol, start_ms, end_ms) requests of at most KLINE_LIMIT one-minute candles."""
+    step = KLINE_LIMIT * MS_PER_MINUTE
+    return [(symbol, int(s), int(min(s + step - 1, end_ms))) for s in np.arange(start_ms, end_ms, step)]
+
+class KlineBackfiller:
+    """
+    Fetches 1m klines for many symbols concurrently. All chunks of all
+    symbols go through one work queue served by `concurrency` workers that
+    share a WeightBucket; finished rows are buffered per symbol and handed to
+    sink(df, symbol) (e.g. cache_data_binance) in a worker thread every
+    flush_rows rows, so memory stays bounded and fetching never waits on the DB.
+
+    Chunks complete out of order, so a symbol's resume point is the end of its
+    longest prefix of written chunks; checkpoint(symbol, resume_ms) is called
+    with its start before anything is fetched and whenever it moves. A chunk
+    that failed, or whose sink call returned False, holds it back.
+    progress(symbol, stats) is called after every chunk.
+
+    Subclasses for other venues override plan() and fetch_chunk(); a
+    fetch_chunk that returns RETRY_LATER has its chunk re-queued, up to
+    `retries` times, instead of failing it.
+    """
+    def __init__(self, sink, base_url=BINANCE_API_URL, concurrency=MAX_IN_FLIGHT, bucket=None,
+                 flush_rows=FLUSH_ROWS, retries=5, base_delay=1.0, checkpoint=None, progress=None):
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.url = base_url.rstrip("/") + KLINES_PATH
+        self.concurrency = concurrency
+        self.bucket = bucket or WeightBucket()
+        self.flush_rows = flush_rows
+        self.retries = retries
+        self.base_delay = base_delay
+        self.headers = None
+
+    def plan(self, symbol, start_ms, end_ms):
+        return plan_chunks(symbol, start_ms, end_ms)
+
+    async def fetch_chunk(self, session, symbol, start_ms, end_ms):
+        params = {"symbol": symbol, "interval": "1m", "startTime": start_ms, "endTime": end_ms, "limit": KLINE_LIMIT}
+        for attempt in range(self.retries):
+            await self.bucket.acquire(KLINE_WEIGHT)
+            try:
+                async with session.get(self.url, params=params) as response:
+                    used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+                    if used is not None:
+                        self.bucket.observe(int(used))
+                    if response.status in (418, 429):
+                        retry_after = float(response.headers.get("Retry-After", 60))
+                        print(f"Rate limited ({response.status}) on {symbol}, pausing {retry_after}s")
+                        self.stats["rate_limited"] += 1
+                        self.bucket.pause(retry_after)
+                        continue
+                    response.raise_for_status()
+                    return parse_binance_klines(await response.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                sleep_time = min(self.base_delay * (2 ** attempt), 60)
+                print(f" Attempt {attempt + 1} failed for {symbol}: {e} - waiting {sleep_time}s")
+                await asyncio.sleep(sleep_time)
+        print(f" Failed final attempt for {symbol} chunk starting {start_ms}")
+        return None
+
+    async def _flush(self, symbol, force=False):
+        parts = self.buffers.get(symbol)
+        if not parts or (not force and sum(len(ms) for _, _, ms, _ in parts) < self.flush_rows):
+            return
+        self.buffers[symbol] = []
+        df = candles_frame(symbol, *concat_candles([(ms, values) for _, _, ms, values in parts]))
+        async with self.writers:
+            written = await asyncio.to_thread(self.sink, df, symbol)
+        if written is not False:
+            self._written(symbol, [(start_ms, end_ms) for start_ms, end_ms, _, _ in parts])
+
+    def _written(self, symbol, chunks):
+        plan = self.plans[symbol]
+        done = self.done[symbol]
+        done.update(chunks)
+        resume_ms = None
+        while plan and plan[0] in done:
+            done.discard(plan[0])
+            resume_ms = plan.popleft()[1] + 1
+        if resume_ms is not None:
+            self.stats["symbols"][symbol]["resume_ms"] = resume_ms
+            if self.checkpoint and plan:
+                self.checkpoint(symbol, resume_ms)
+
+    async def _worker(self, session, queue):
+        while True:
+            chunk = await queue.get()
+            try:
+                if chunk is None:
+                    return
+                await self._fetch(session, queue, *chunk)
+            finally:
+                queue.task_done()
+
+    async def _fetch(self, session, queue, symbol, start_ms, end_ms):
+        klines = await self.fetch_chunk(session, symbol, start_ms, end_ms)
+        if klines is RETRY_LATER:
+            chunk = (symbol, start_ms, end_ms)
+            self.requeues[chunk] = self.requeues.get(chunk, 0) + 1
+            if self.requeues[chunk] <= self.retries:
+                self.stats["requeued"] += 1
+                queue.put_nowait(chunk)
+                return
+            print(f" Giving up on {symbol} chunk starting {start_ms} after {self.retries} rate-limited attempts")
+            klines = None
+        per_symbol = self.stats["symbols"][symbol]
+        if klines is None:
+            per_symbol["failed"].append((start_ms, end_ms))
+        else:
+            per_symbol["chunks"] += 1
+            per_symbol["rows"] += len(klines[0])
+            if len(klines[0]):
+                self.buffers[symbol].append((start_ms, end_ms, *klines))
+                await self._flush(symbol)
+            else:
+                self._written(symbol, [(start_ms, end_ms)])
+        if self.progress:
+            self.progress(symbol, per_symbol)
+
+    async def run(self, ranges):
+        """
+        ranges: {symbol: (start, end)} tz-aware datetimes. Returns per-symbol
+        stats (chunks, rows, failed chunk ranges, resume point and whether
+        every chunk was written) plus request totals.
+        """
+        chunks = []
+        for symbol, (start, end) in ranges.items():
+            chunks += self.plan(symbol, int(start.timestamp() * 1000), int(end.timestamp() * 1000))
+        stats = await self.run_chunks(chunks)
+        for symbol in ranges:
+            # Nothing to fetch (e.g. no trading minutes in the range) counts as done
+            stats["symbols"].setdefault(symbol, {"chunks": 0, "planned": 0, "rows": 0, "failed": [],
+                                                 "resume_ms": None, "complete": True})
+        return stats
+
+    async def run_chunks(self, chunks):
+        """Fetch already planned (symbol, start_ms, end_ms) requests; same stats as run()."""
+        queue = asyncio.Queue()
+        for chunk in chunks:
+            queue.put_nowait(chunk)
+        symbols = list(dict.fromkeys(symbol for symbol, _, _ in chunks))
+        self.plans = {symbol: deque() for symbol in symbols}
+        for symbol, start_ms, end_ms in chunks:
+            self.plans[symbol].append((start_ms, end_ms))
+        self.done = {symbol: set() for symbol in symbols}
+        self.buffers = {symbol: [] for symbol in symbols}
+        self.requeues = {}
+        self.writers = asyncio.Semaphore(MAX_WRITERS)
+        self.stats = {
+            "symbols": {symbol: {"chunks": 0, "planned": len(self.plans[symbol]), "rows": 0, "failed": [],
+                                 "resume_ms": None} for symbol in symbols},
+            "requests": queue.qsize(),
+            "rate_limited": 0,
+            "requeued": 0,
+        }
+        if self.checkpoint:
+            # Resume from the start until the first chunks land: later chunks may be written first
+            for symbol, plan in self.plans.items():
+                if len(plan) > 1:
+                    self.checkpoint(symbol, plan[0][0])
+        started = time.perf_counter()
+        timeout = aiohttp.ClientTimeout(total=30)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=self.headers) as session:
+            # Workers stay up until every chunk, re-queued ones included, is done
+            workers = [asyncio.create_task(self._worker(session, queue)) for _ in range(self.concurrency)]
+            joined = asyncio.ensure_future(queue.join())
+            await asyncio.wait([joined, *workers], return_when=asyncio.FIRST_COMPLETED)
+            joined.cancel()
+            for _ in workers:
+                queue.put_nowait(None)
+            await asyncio.gather(*workers)
+        await asyncio.gather(*(self._flush(symbol, force=True) for symbol in symbols))
+        for symbol in symbols:
+            self.stats["symbols"][symbol]["complete"] = not self.plans[symbol]
+        self.stats["seconds"] = time.perf_counter() - started
+        return self.stats
+
+    def run_sync(self, ranges):
+        return asyncio.run(self.run(ranges))
+
+    def run_chunks_sync(self, chunks):
+        return asyncio.run(self.run_chunks(chunks))
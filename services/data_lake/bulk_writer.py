@@ -0,0 +1,140 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from services.db_config import get_db_connection
+from services.data_lake.minute_index import LOCAL_TZ
+from services.data_lake.watermarks import get_watermarks
+from services.data_lake.price_cache import invalidate_written, publish_rewritten
+
+STOCK_COLUMNS = ('symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume')
+SPREAD_TABLE_COLUMNS = STOCK_COLUMNS + ('slope',)
+COPY_CHUNK_ROWS = int(os.getenv("BULK_COPY_CHUNK_ROWS", 200_000))
+
+# Per table: columns written, whether a conflicting row is overwritten (candles)
+# or kept (spreads), and the zone naive timestamp columns hold wall-clock time in
+TABLES = {
+    "public.binance_stocks": {"columns": STOCK_COLUMNS, "update": True, "naive_tz": None},
+    "public.nse_stocks": {"columns": STOCK_COLUMNS, "update": True, "naive_tz": LOCAL_TZ},
+    "public.binance_spreads": {"columns": SPREAD_TABLE_COLUMNS, "update": False, "naive_tz": None},
+    "public.nse_spreads": {"columns": SPREAD_TABLE_COLUMNS, "update": False, "naive_tz": LOCAL_TZ},
+}
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + np.array([0, 0], dtype=">i4").tobytes()
+PGCOPY_TRAILER = np.array([-1], dtype=">i2").tobytes()
+# Binary timestamps count microseconds from 2000-01-01
+PG_EPOCH_US = np.datetime64('2000-01-01T00:00:00', 'us').astype(np.int64)
+
+def _stored_timestamps(timestamps, naive_tz=None):
+    """
+    A timestamp column as the table stores it. With naive_tz the table holds
+    naive wall-clock time, so aware values are converted to it; otherwise the
+    column is timestamptz and naive values are read as IST.
+    """
+    ts = pd.Series(timestamps if pd.api.types.is_datetime64_any_dtype(timestamps) else pd.to_datetime(timestamps))
+    if naive_tz is not None and ts.dt.tz is not None:
+        ts = ts.dt.tz_convert(naive_tz).dt.tz_localize(None)
+    elif naive_tz is None and ts.dt.tz is None:
+        ts = ts.dt.tz_localize(LOCAL_TZ)
+    return ts
+
+def _pg_microseconds(timestamps, naive_tz=None):
+    """int64 binary COPY value of a timestamp column."""
+    # .values of a tz-aware series is the UTC instant
+    return _stored_timestamps(timestamps, naive_tz).values.astype('datetime64[us]').astype(np.int64) - PG_EPOCH_US
+
+def encode_copy_binary(df, columns, naive_tz=None):
+    """
+    PGCOPY binary body for rows of (symbol, timestamp, float columns...),
+    built with numpy structured arrays instead of per-row Python. Rows are
+    grouped by symbol length since every tuple of a group has the same layout.
+    """
+    float_cols = columns[2:]
+    # Few distinct symbols per write: encode each once
+    codes, uniques = pd.factorize(df['symbol'], sort=False)
+    encoded = np.array([str(sym).encode('utf-8') for sym in uniques], dtype=object)
+    lengths = np.array([len(sym) for sym in encoded], dtype=np.int64)[codes]
+    micros = _pg_microseconds(df['timestamp'], naive_tz)
+    values = {col: df[col].to_numpy(dtype=np.float64) for col in float_cols}
+
+    parts = []
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        dtype = [('fields', '>i2'), ('symbol_len', '>i4'), ('symbol', f'S{int(length)}'),
+                 ('ts_len', '>i4'), ('ts', '>i8')]
+        dtype += [item for col in float_cols for item in ((f'{col}_len', '>i4'), (col, '>f8'))]
+        block = np.empty(len(rows), dtype=dtype)
+        block['fields'] = len(columns)
+        block['symbol_len'] = length
+        block['symbol'] = encoded[codes[rows]].astype(f'S{int(length)}')
+        block['ts_len'] = 8
+        block['ts'] = micros[rows]
+        for col in float_cols:
+            block[f'{col}_len'] = 8
+            block[col] = values[col][rows]
+        parts.append(block.tobytes())
+    return b"".join(parts)
+
+def bulk_upsert(table, data, conn=None, chunk_rows=COPY_CHUNK_ROWS):
+    """
+    Write a DataFrame (or dict of columns) into one of the TABLES: rows are
+    streamed with binary COPY into a temp staging table in chunks of
+    chunk_rows, then merged with a single INSERT ... ON CONFLICT (symbol,
+    timestamp). The table's watermarks advance once the rows are committed
+    and cached history the rows land inside is dropped, here and (through
+    the rewrite versions) in other processes; with a caller-supplied conn
+    the caller commits and does all of it.
+    Returns the number of rows inserted or updated.
+    """
+    spec = TABLES[table]
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    if df.empty:
+        return 0
+
+    columns = spec["columns"]
+    col_list = ", ".join(columns)
+    stage = "_stage_" + table.split(".")[-1]
+    ts_type = "timestamp" if spec["naive_tz"] else "timestamptz"
+    stage_cols = ", ".join(["symbol text", f"timestamp {ts_type}"] + [f"{col} float8" for col in columns[2:]])
+    if spec["update"]:
+        conflict = "DO UPDATE SET " + ", ".join(f"{col} = EXCLUDED.{col}" for col in columns[2:])
+    else:
+        conflict = "DO NOTHING"
+
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} ({stage_cols}) ON COMMIT DROP")
+            cur.execute(f"TRUNCATE {stage}")
+            for start in range(0, len(df), chunk_rows):
+                body = encode_copy_binary(df.iloc[start:start + chunk_rows], columns, spec["naive_tz"])
+                cur.copy_expert(f"COPY {stage} ({col_list}) FROM STDIN WITH (FORMAT binary)",
+                                io.BytesIO(PGCOPY_HEADER + body + PGCOPY_TRAILER))
+            # DISTINCT ON: one command may not touch the same key twice
+            cur.execute(f"""
+                INSERT INTO {table} ({col_list})
+                SELECT DISTINCT ON (symbol, timestamp) {col_list} FROM {stage}
+                ORDER BY symbol, timestamp
+                ON CONFLICT (symbol, timestamp) {conflict}
+            """)
+            written = cur.rowcount
+        if own_conn:
+            conn.commit()
+            stored = _stored_timestamps(df['timestamp'], spec["naive_tz"])
+            written_rows = pd.DataFrame({'symbol': df['symbol'].to_numpy(), 'timestamp': stored.array})
+            watermarks = get_watermarks(table)
+            rewritten = watermarks.behind(written_rows)
+            watermarks.advance_from(written_rows)
+            # Backfill and repair write behind the cached watermark; refresh() would never see those rows
+            invalidate_written(table, df['symbol'].to_numpy(), stored)
+            if rewritten:
+                publish_rewritten(table, rewritten)
+        return written
+    except Exception:
+        if own_conn:
+            conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import orjson
+from services.data_lake.minute_index import LOCAL_TZ
+
+CANDLE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+def _empty():
+    return np.empty(0, dtype=np.int64), np.empty((len(CANDLE_FIELDS), 0), dtype=np.float64)
+
+def _decode(payload):
+    if isinstance(payload, (bytes, bytearray, memoryview, str)):
+        return orjson.loads(payload)
+    return payload
+
+def parse_binance_klines(payload):
+    """
+    (epoch ms int64, OHLCV float64 shaped (5, n)) from a /api/v3/klines body
+    (raw bytes or already decoded). Columns are transposed once and the price
+    strings converted by numpy, with no per-candle Python objects kept.
+    """
+    rows = _decode(payload)
+    if not rows:
+        return _empty()
+    columns = list(zip(*rows))
+    return np.array(columns[0], dtype=np.int64), np.array(columns[1:6], dtype=np.float64)
+
+def parse_fyers_candles(payload):
+    """Same layout from Fyers history candles ([epoch s, o, h, l, c, v] rows)."""
+    candles = _decode(payload)
+    if not candles:
+        return _empty()
+    block = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+    return block[:, 0].astype(np.int64) * 1000, np.ascontiguousarray(block[:, 1:].T)
+
+def concat_candles(parts):
+    """Join (ms, values) chunks into one series sorted by time, one row per ms."""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return _empty()
+    ms = np.concatenate([p[0] for p in parts])
+    values = np.concatenate([p[1] for p in parts], axis=1)
+    ms, first = np.unique(ms, return_index=True)
+    return ms, values[:, first]
+
+def candles_frame(symbol, ms, values, tz=LOCAL_TZ):
+    """
+    The symbol/timestamp/OHLCV DataFrame the writers take. This is the edge
+    where epoch milliseconds become tz-aware timestamps, in one vectorized call.
+    """
+    if not len(ms):
+        return pd.DataFrame()
+    df = pd.DataFrame({
+        "symbol": symbol,
+        "timestamp": pd.to_datetime(ms, unit="ms", utc=True).tz_convert(tz),
+    })
+    for i, col in enumerate(CANDLE_FIELDS):
+        df[col] = values[i]
+    return df
@@ -1,153 +1,178 @@
+import os
 import json
 import asyncio
-import websockets
-import threading
-from datetime import datetime
-import pytz
-from collections import deque
 import psycopg2
-from psycopg2 import sql
-import pandas as pd
-import numpy as np
-from services.config import redis_connection
+from services.config import redis_connection, config
+from services.data_lake.live_feed import LiveSpreadFeed, PriceSampler, INPUT_MODES
+from services.data_lake.redis_writer import CoalescingWriter
+from services.data_lake.live_hedges import LiveHedges
+from services.data_lake.ws_manager import StreamManager, SHARD_METRICS_KEY
+from services.data_lake.frame_log import FrameRecorder
+from services.data_lake.feed_latency import FeedLatency, LATENCY_METRICS_KEY
+from services.data_lake.live_bands import LiveBands, SIGNAL_STREAM_KEY
 
 redis_client = redis_connection()
-ACCOUNT_KEY = "account_matrix:account"
-window_raw = redis_client.hget(ACCOUNT_KEY, "window")
-window = int(window_raw) if window_raw is not None else None
 
 # Fetch pair list from Redis set
 SPREADS_SET_KEY = "spreads:binance_spreads_name"
-pair_list = list(redis_client.smembers(SPREADS_SET_KEY))
-pair_list = [pair.decode("utf-8") for pair in pair_list]
+# How often the pair set is re-read; added/removed pairs are (un)subscribed live
+PAIR_RELOAD_SECONDS = 30
+METRICS_INTERVAL_SECONDS = 5
+
+def _load_pair_list():
+    return sorted(pair.decode("utf-8") for pair in redis_client.smembers(SPREADS_SET_KEY))
 
-IST = pytz.timezone("Asia/Kolkata")
-WINDOW_SIZE = window
 EXCHANGE = "binance"
-PAIRS = {pair: [pair.split('_')[0], pair.split('_')[1]] for pair in pair_list}
-UNIQUE_SYMBOLS = list(set([sym for pair in PAIRS.values() for sym in pair]))
 URI = "wss://stream.binance.com:9443/ws"
 
-# Initialize data structures
-real_time_data = {sym: deque(maxlen=WINDOW_SIZE) for sym in UNIQUE_SYMBOLS}
-data_lock = threading.Lock()
-latest_prices = {}
-historical_slopes = {pair: None for pair in pair_list}
-
-SPREAD_DATA_KEY = "spreads:live_data"
-LTP_DATA_KEY = "binance_ltp:stocks"
-
-def _fetch_latest_slope_from_db(symbol: str) -> float:
-    """Fetch latest slope from database"""
-    symbol = symbol.lower()
-    conn_params = {
-        "dbname": "trading_system",
-        "user": "postgres", 
-        "password": "onealpha12345",
-        "host": "localhost",
-        "port": 5432
-    }
-    with psycopg2.connect(**conn_params) as conn:
+# Input stream (trade, aggTrade or bookTicker mid) and optional conflation:
+# with BINANCE_SAMPLE_MS > 0 each symbol is processed at most once per
+# interval, capped at BINANCE_MAX_STALENESS_MS so the LTP is never older
+INPUT_MODE = os.getenv("BINANCE_INPUT_MODE", "trade")
+if INPUT_MODE not in INPUT_MODES:
+    raise ValueError(f"Unknown BINANCE_INPUT_MODE '{INPUT_MODE}', expected one of {list(INPUT_MODES)}")
+MAX_STALENESS_MS = float(os.getenv("BINANCE_MAX_STALENESS_MS", 500))
+SAMPLE_MS = min(float(os.getenv("BINANCE_SAMPLE_MS", 0)), MAX_STALENESS_MS)
+sampler = PriceSampler() if SAMPLE_MS > 0 else None
+
+# Exchange -> receive -> Redis commit latency of every written LTP and spread, per symbol
+feed_latency = FeedLatency()
+# LTP and spread fields are conflated and written in pipelined batches off the event loop
+live_writer = CoalescingWriter(redis_client, EXCHANGE, on_commit=feed_latency.record_commit)
+# Raw frames are appended here when set, for replay with benchmarks/replay_live_feed.py
+RECORD_PATH = os.getenv("BINANCE_RECORD_PATH")
+
+DB_CONN_PARAMS = {
+    "dbname": "trading_system",
+    "user": "postgres", 
+    "password": "onealpha12345",
+    "host": "localhost",
+    "port": 5432
+}
+
+def _fetch_latest_slopes(pairs):
+    """Latest stored slope of every pair in one DISTINCT ON query."""
+    with psycopg2.connect(**DB_CONN_PARAMS) as conn:
         with conn.cursor() as cur:
             query = """
-                SELECT slope
+                SELECT DISTINCT ON (symbol) symbol, slope
                 FROM public.binance_spreads
-                WHERE symbol = %s
-                ORDER BY timestamp DESC
-                LIMIT 1
+                WHERE symbol = ANY(%s)
+                ORDER BY symbol, timestamp DESC
+            """
+            cur.execute(query, ([pair.lower() for pair in pairs],))
+            return {symbol: float(slope) for symbol, slope in cur.fetchall() if slope is not None}
+
+def _fetch_recent_closes(pairs, count):
+    """{pair: last `count` closed spread bars, oldest first}, one index range scan per pair."""
+    with psycopg2.connect(**DB_CONN_PARAMS) as conn:
+        with conn.cursor() as cur:
+            query = """
+                SELECT p.symbol, c.close
+                FROM unnest(%s::text[]) AS p(symbol)
+                CROSS JOIN LATERAL (
+                    SELECT close, timestamp FROM public.binance_spreads s
+                    WHERE s.symbol = p.symbol
+                    ORDER BY timestamp DESC
+                    LIMIT %s
+                ) c
+                ORDER BY p.symbol, c.timestamp
             """
-            cur.execute(query, (symbol,))
-            row = cur.fetchone()
-            if row:
-                return float(row[0])
-            return None
-
-def calculate_live_spread(price1: float, price2: float, slope: float) -> dict:
-    """Calculate live spread using current prices and historical slope"""
-    current_time = datetime.now(IST)
-    live_spread = price1 - (slope * price2)
-
-    return {
-        "timestamp": current_time,
-        "close": live_spread,
-        "slope": slope
-    }
+            cur.execute(query, ([pair.lower() for pair in pairs], count))
+            closes = {}
+            for symbol, close in cur.fetchall():
+                if close is not None:
+                    closes.setdefault(symbol, []).append(float(close))
+            return closes
+
+# Hedge models persisted by the spread job (or the DB slope), re-evaluated per tick
+live_hedges = LiveHedges(redis_client, EXCHANGE, _fetch_latest_slopes)
+# Tick-level Bollinger bands of the strategy's window; crossings go to the signal stream
+live_bands = LiveBands(config['params']['window'], config['params']['std'])
+
+feed = LiveSpreadFeed(live_writer, live_hedges.slope, INPUT_MODE, sampler, live_bands,
+                      signal_key=f"{SIGNAL_STREAM_KEY}:{EXCHANGE}")
+feed.set_pairs(_load_pair_list())
+
+def _seed_bands(pairs):
+    try:
+        closes = _fetch_recent_closes(pairs, live_bands.window - 1)
+    except Exception as e:
+        print(f"[BANDS] Could not seed bands, warming up from live bars: {e}")
+        return
+    live_bands.seed(closes)
+    print(f"[BANDS] Seeded {len(closes)}/{len(pairs)} pairs with up to {live_bands.window - 1} closed bars")
+
+async def _run_sampler():
+    while True:
+        await asyncio.sleep(SAMPLE_MS / 1000.0)
+        feed.drain()
+
+async def _publish_shard_metrics(manager):
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL_SECONDS)
+        for shard_id, metrics in manager.metrics().items():
+            live_writer.hset(SHARD_METRICS_KEY, f"{EXCHANGE}:{shard_id}", json.dumps(metrics))
+
+async def _publish_latency():
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL_SECONDS)
+        summary = feed_latency.summary()
+        overall = summary["_all"]
+        if overall["degraded"]:
+            print(f"[LATENCY] {EXCHANGE} feed degraded: exchange->commit p99 "
+                  f"{overall['exchange_to_commit']['p99_ms']} ms, receive->commit p99 "
+                  f"{overall['receive_to_commit']['p99_ms']} ms (alert at {overall['alert_ms']:.0f} ms)")
+        for symbol, stats in summary.items():
+            live_writer.hset(LATENCY_METRICS_KEY, f"{EXCHANGE}:{symbol}", json.dumps(stats))
+
+async def _watch_pairs(manager):
+    """Pick up pairs added to or removed from SPREADS_SET_KEY without a restart."""
+    while True:
+        await asyncio.sleep(PAIR_RELOAD_SECONDS)
+        try:
+            pairs = await asyncio.to_thread(_load_pair_list)
+        except Exception as e:
+            print(f"[WS] Could not reload pairs: {e}")
+            continue
+        if pairs == feed.pair_list:
+            continue
+        added = set(pairs) - set(feed.pair_list)
+        print(f"[WS] Pairs changed: +{len(added)} -{len(set(feed.pair_list) - set(pairs))}")
+        # Hedges first, so the new pairs have a ratio by the time their ticks arrive
+        await asyncio.to_thread(live_hedges.refresh, pairs)
+        feed.set_pairs(pairs)
+        if added:
+            await asyncio.to_thread(_seed_bands, sorted(added))
+        await manager.set_symbols(feed.symbols)
 
 async def binance_ws_handler():
-    global historical_slopes, latest_prices
-    
-    # Timer for fetching slope from DB every minute
-    last_db_fetch = datetime.now()
-
-    # Initialize slopes from database
-    for pair in pair_list:
-        slope = _fetch_latest_slope_from_db(pair)
-        if slope is not None:
-            historical_slopes[pair] = slope
+    # Initialize hedge models / slopes
+    await asyncio.to_thread(live_hedges.refresh, feed.pair_list)
+    await asyncio.to_thread(_seed_bands, feed.pair_list)
+    for pair in feed.pair_list:
+        state, slope = live_hedges.hedges[pair]
+        if state is not None:
+            print(f"[INIT] {pair}: {state.name} hedge={state.hedge_ratio():.6f}")
+        elif slope is not None:
             print(f"[INIT] {pair}: slope={slope:.6f}")
 
-    async with websockets.connect(URI) as websocket:
-        subscribe_msg = {
-            "method": "SUBSCRIBE",
-            "params": [f"{s}@trade" for s in UNIQUE_SYMBOLS],
-            "id": 1
-        }
-        await websocket.send(json.dumps(subscribe_msg))
-        print(f"[WS] Subscribed to {len(UNIQUE_SYMBOLS)} symbols")
-
-        while True:
-            message = await websocket.recv()
-            data = json.loads(message)
-
-            # Update slopes from DB every minute
-            current_time = datetime.now()
-            if (current_time - last_db_fetch).seconds >= 60:
-                for pair in pair_list:
-                    slope = _fetch_latest_slope_from_db(pair)
-                    if slope is not None:
-                        historical_slopes[pair] = slope
-                last_db_fetch = current_time
-                print("last_db_fetch", last_db_fetch)
-                print("[DB] Updated slopes from database")
-
-            if 'e' in data and data['e'] == 'trade' and 's' in data and 'p' in data:
-                symbol = data['s'].lower()
-                price = float(data['p'])
-
-                with data_lock:
-                    if symbol in real_time_data:
-                        latest_prices[symbol] = price
-                        # Store LTP in Redis
-                        ltp_data = {
-                            "symbol": symbol,
-                            "price": str(price),
-                            "timestamp": datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
-                        }
-                        redis_client.hset(LTP_DATA_KEY, symbol, json.dumps(ltp_data))
-
-                # Calculate live spread for relevant pairs
-                for pair, symbols in PAIRS.items():
-                    sym1, sym2 = symbols
-                    if (symbol in [sym1, sym2] and
-                            historical_slopes[pair] is not None and
-                            sym1 in latest_prices and
-                            sym2 in latest_prices):
-                        
-                        live_spread = calculate_live_spread(
-                            latest_prices[sym1],
-                            latest_prices[sym2],
-                            historical_slopes[pair]
-                        )
-
-                        spread_data = {
-                            "close": str(live_spread["close"]),
-                            "slope": str(live_spread["slope"]),
-                            "timestamp": live_spread["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
-                            "symbol1": sym1,
-                            "symbol2": sym2
-                        }
-                        # print(spread_data)
-                        redis_client.hset(SPREAD_DATA_KEY, pair, json.dumps(spread_data))
+    # Keep references so the background tasks are not garbage collected
+    writer_task = asyncio.create_task(live_writer.run())
+    # Changed hedge models and DB slopes are reloaded off the event loop
+    hedge_task = asyncio.create_task(live_hedges.run(lambda: feed.pair_list))
+
+    if sampler is not None:
+        sampler_task = asyncio.create_task(_run_sampler())
+    print(f"[WS] Input mode {INPUT_MODE}" + (f", sampled every {SAMPLE_MS:.0f} ms" if sampler is not None else ""))
+    recorder = FrameRecorder(RECORD_PATH) if RECORD_PATH else None
+    if recorder is not None:
+        print(f"[WS] Recording raw frames to {RECORD_PATH}")
+    manager = StreamManager(URI, feed.handle_message, stream_suffix=INPUT_MODES[INPUT_MODE], recorder=recorder)
+    await manager.set_symbols(feed.symbols)
+    metrics_task = asyncio.create_task(_publish_shard_metrics(manager))
+    latency_task = asyncio.create_task(_publish_latency())
+    await _watch_pairs(manager)
 
 def ws_runner():
     asyncio.run(binance_ws_handler())
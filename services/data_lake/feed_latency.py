@@ -0,0 +1,159 @@
+import os
+import json
+import time
+from collections import deque
+
+LATENCY_METRICS_KEY = "live_feed:latency"
+# Rolling window the published percentiles cover, kept as fixed slots
+LATENCY_WINDOW_S = float(os.getenv("LIVE_FEED_LATENCY_WINDOW_S", 60))
+LATENCY_SLOT_S = 5.0
+# End-to-end p99 (exchange event -> Redis commit) above which the feed is flagged degraded
+LATENCY_ALERT_MS = float(os.getenv("LIVE_FEED_LATENCY_ALERT_MS", 1000))
+# exchange_to_receive: exchange event time (E, else T) to frame receipt (includes clock skew)
+# receive_to_commit: frame receipt to the Redis pipeline carrying the value returning
+# exchange_to_commit: the two together, i.e. how stale a value is when it becomes readable
+STAGES = ("exchange_to_receive", "receive_to_commit", "exchange_to_commit")
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Log-linear buckets as in HdrHistogram: exact below 2*SUB_BUCKETS us, then
+# SUB_BUCKETS buckets per power of two, i.e. under 1/SUB_BUCKETS relative error
+SUB_BITS = 6
+SUB_BUCKETS = 1 << SUB_BITS
+
+def bucket_of(us):
+    if us < 2 * SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - SUB_BITS - 1
+    return SUB_BUCKETS * shift + (us >> shift)
+
+def bucket_value(bucket):
+    """Midpoint in microseconds of the values falling into `bucket`."""
+    if bucket < 2 * SUB_BUCKETS:
+        return bucket
+    shift = bucket // SUB_BUCKETS - 1
+    low = (bucket - SUB_BUCKETS * shift) << shift
+    return low + ((1 << shift) - 1) / 2
+
+class LatencyHistogram:
+    """Sparse {bucket: count} over microsecond latencies, with the exact max."""
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+
+    def record(self, us):
+        bucket = bucket_of(us)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        if us > self.max:
+            self.max = us
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        if not self.total:
+            return None
+        rank = q / 100.0 * self.total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(bucket_value(bucket), self.max)
+        return self.max
+
+    def stats(self):
+        ms = lambda us: round(us / 1000.0, 3) if us is not None else None
+        stats = {"count": self.total, "max_ms": ms(self.max if self.total else None)}
+        for q in PERCENTILES:
+            stats[f"p{q:g}_ms"] = ms(self.percentile(q))
+        return stats
+
+class FeedLatency:
+    """
+    Per-symbol latency of live feed values, measured when they are committed
+    to Redis. record_commit() is the CoalescingWriter's on_commit hook and
+    receives the (symbol, exchange_ms, received_ns) origin of every field
+    the flush wrote. Only committed values are measured: a value overwritten
+    before its flush was never readable, so it has no staleness to report.
+
+    Samples go into the current LATENCY_SLOT_S slot; summary() merges the
+    slots of the last window_s seconds into percentiles per symbol and over
+    all symbols ("_all"), the latter flagged degraded when its end-to-end
+    p99 exceeds alert_ms.
+    """
+    def __init__(self, window_s=LATENCY_WINDOW_S, slot_s=LATENCY_SLOT_S, alert_ms=LATENCY_ALERT_MS):
+        self.slot_s = slot_s
+        self.alert_ms = alert_ms
+        self.slots = deque(maxlen=max(1, int(round(window_s / slot_s))))
+        self.slot_start = None
+        self.skewed = 0
+
+    def _slot(self, now):
+        if self.slot_start is None or now - self.slot_start >= self.slot_s:
+            self.slot_start = now
+            self.slots.append({})
+        return self.slots[-1]
+
+    def _histogram(self, slot, symbol, stage):
+        stages = slot.get(symbol)
+        if stages is None:
+            stages = slot[symbol] = {name: LatencyHistogram() for name in STAGES}
+        return stages[stage]
+
+    def record_commit(self, origins, committed_ns):
+        slot = self._slot(time.monotonic())
+        committed_us = committed_ns // 1000
+        for symbol, exchange_ms, received_ns in origins:
+            received_us = received_ns // 1000
+            self._histogram(slot, symbol, "receive_to_commit").record(max(0, committed_us - received_us))
+            if not exchange_ms:
+                continue
+            exchange_us = exchange_ms * 1000
+            if received_us < exchange_us:
+                # Local clock behind the exchange's; counted, not recorded
+                self.skewed += 1
+                continue
+            self._histogram(slot, symbol, "exchange_to_receive").record(received_us - exchange_us)
+            self._histogram(slot, symbol, "exchange_to_commit").record(committed_us - exchange_us)
+
+    def summary(self):
+        self._slot(time.monotonic())
+        merged = {}
+        for slot in self.slots:
+            for symbol, stages in slot.items():
+                target = merged.setdefault(symbol, {name: LatencyHistogram() for name in STAGES})
+                for name, histogram in stages.items():
+                    target[name].merge(histogram)
+        overall = {name: LatencyHistogram() for name in STAGES}
+        for stages in merged.values():
+            for name, histogram in stages.items():
+                overall[name].merge(histogram)
+        updated = int(time.time())
+        summary = {symbol: {name: h.stats() for name, h in stages.items()} | {"updated": updated}
+                   for symbol, stages in merged.items()}
+        summary["_all"] = {name: h.stats() for name, h in overall.items()}
+        p99 = summary["_all"]["exchange_to_commit"]["p99_ms"]
+        if p99 is None:
+            p99 = summary["_all"]["receive_to_commit"]["p99_ms"]
+        summary["_all"].update({
+            "symbols": len(merged),
+            "window_s": len(self.slots) * self.slot_s,
+            "clock_skewed": self.skewed,
+            "alert_ms": self.alert_ms,
+            "degraded": p99 is not None and p99 > self.alert_ms,
+            "updated": updated,
+        })
+        return summary
+
+def load_latency_metrics(redis_client, exchange=None):
+    """{exchange: {symbol: stats}} as published by the live feeds, optionally for one exchange."""
+    latency = {}
+    for field, value in redis_client.hgetall(LATENCY_METRICS_KEY).items():
+        name, symbol = field.decode().split(":", 1)
+        if exchange is None or name == exchange:
+            latency.setdefault(name, {})[symbol] = json.loads(value)
+    return latency
@@ -0,0 +1,59 @@
+import os
+import gzip
+import time
+import struct
+
+MAGIC = b"LFRAMES1"
+# Per frame: receive time (epoch ns) and payload length, then the raw payload
+RECORD = struct.Struct("<qI")
+# Frames between flushes, so a crashed process loses at most this many
+FLUSH_FRAMES = 10_000
+
+def _open(path, mode):
+    return gzip.open(path, mode, compresslevel=1) if path.endswith(".gz") else open(path, mode)
+
+class FrameRecorder:
+    """
+    Appends raw websocket frames with their receive time to a compact
+    length-prefixed file (gzip when the path ends in .gz) for later replay.
+    Writes are buffered; nothing here touches the network.
+    """
+    def __init__(self, path):
+        self.path = path
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = _open(path, "ab")
+        if fresh:
+            self.file.write(MAGIC)
+        self.frames = 0
+
+    def write(self, frame, received_ns=None):
+        payload = frame.encode() if isinstance(frame, str) else frame
+        self.file.write(RECORD.pack(received_ns or time.time_ns(), len(payload)))
+        self.file.write(payload)
+        self.frames += 1
+        if self.frames % FLUSH_FRAMES == 0:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_frames(path):
+    """
+    Yields (received_ns, payload bytes) in recorded order. A recording cut
+    short by a crash ends at its last complete frame.
+    """
+    with _open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        while True:
+            try:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    return
+                received_ns, length = RECORD.unpack(header)
+                payload = f.read(length)
+            except EOFError:
+                return
+            if len(payload) < length:
+                return
+            yield received_ns, payload
@@ -0,0 +1,104 @@
+import os
+import asyncio
+import numpy as np
+import aiohttp
+import orjson
+from services.data_lake.binance_backfill import KlineBackfiller, WeightBucket, RETRY_LATER, MS_PER_MINUTE
+from services.data_lake.candle_parser import parse_fyers_candles
+from services.data_lake.trading_calendar import NSE_CALENDAR, IST_OFFSET_MINUTES
+
+FYERS_DATA_URL = os.getenv("FYERS_DATA_URL", "https://api-t1.fyers.in")
+HISTORY_PATH = "/data/history"
+CHUNK_DAYS = 100
+
+# Data API limits as (requests, seconds). The foreground and history lanes
+# run in separate event loops with their own limiters, so their shares of
+# the limits must add up to less than one.
+RATE_LIMITS = ((10, 1.0), (200, 60.0))
+FYERS_HEADROOM = float(os.getenv("FYERS_HEADROOM", 0.6))
+FYERS_HISTORY_HEADROOM = float(os.getenv("FYERS_HISTORY_HEADROOM", 0.3))
+FYERS_IN_FLIGHT = int(os.getenv("FYERS_BACKFILL_CONCURRENCY", 8))
+FYERS_HISTORY_IN_FLIGHT = 2
+DEFAULT_RETRY_AFTER = 60
+
+class RateLimiter:
+    """
+    One WeightBucket per limit window; a request waits until every window
+    admits it, and a retry_after pauses them all.
+    """
+    def __init__(self, limits=RATE_LIMITS, headroom=FYERS_HEADROOM):
+        self.buckets = [WeightBucket(limit, headroom, period) for limit, period in limits]
+
+    async def acquire(self, weight=1):
+        for bucket in self.buckets:
+            await bucket.acquire(weight)
+
+    def pause(self, seconds):
+        for bucket in self.buckets:
+            bucket.pause(seconds)
+
+def plan_fyers_chunks(symbol, start_ms, end_ms, calendar=NSE_CALENDAR):
+    """
+    (symbol, start_ms, end_ms) history requests of at most CHUNK_DAYS,
+    trimmed to the calendar's first and last trading minute in the range
+    and skipping chunks with none (weekends, holidays, off-hours fills).
+    """
+    # Calendar minutes are wall-clock IST, the bounds UTC epoch ms
+    first = -(-start_ms // MS_PER_MINUTE) + IST_OFFSET_MINUTES
+    last = (end_ms + 1) // MS_PER_MINUTE - 1 + IST_OFFSET_MINUTES
+    if calendar.count(first, last) == 0:
+        return []
+    first = calendar.shift(first - 1, 1)
+    last = calendar.shift(last, 0)
+    step = CHUNK_DAYS * 1440
+    chunks = []
+    for chunk_first in np.arange(first, last + 1, step):
+        chunk_last = min(chunk_first + step - 1, last)
+        if calendar.count(chunk_first, chunk_last):
+            chunks.append((symbol, int(max(start_ms, (chunk_first - IST_OFFSET_MINUTES) * MS_PER_MINUTE)),
+                           int(min(end_ms, (chunk_last - IST_OFFSET_MINUTES + 1) * MS_PER_MINUTE - 1))))
+    return chunks
+
+class FyersHistoryClient(KlineBackfiller):
+    """
+    Concurrent Fyers 1m history backfill for NSE cash symbols. One aiohttp
+    session carrying the access token serves every request of a run, all
+    workers share one RateLimiter, and a 429 (HTTP status or JSON code)
+    pauses the limiter for its retry_after and sends the chunk to the back
+    of the queue instead of sleeping in the worker or skipping the chunk.
+    Buffering, checkpoints and stats are KlineBackfiller's.
+    """
+    def __init__(self, sink, client_id, token, base_url=FYERS_DATA_URL, concurrency=FYERS_IN_FLIGHT,
+                 limiter=None, **kwargs):
+        super().__init__(sink, concurrency=concurrency, bucket=limiter or RateLimiter(), **kwargs)
+        self.url = base_url.rstrip("/") + HISTORY_PATH
+        self.headers = {"Authorization": f"{client_id}:{token}"}
+
+    def plan(self, symbol, start_ms, end_ms):
+        return plan_fyers_chunks(symbol, start_ms, end_ms)
+
+    async def fetch_chunk(self, session, symbol, start_ms, end_ms):
+        params = {"symbol": f"NSE:{symbol}-EQ", "resolution": "1", "date_format": "0",
+                  "range_from": str(start_ms // 1000), "range_to": str(end_ms // 1000), "cont_flag": "1"}
+        for attempt in range(self.retries):
+            await self.bucket.acquire(1)
+            try:
+                async with session.get(self.url, params=params) as response:
+                    body = orjson.loads(await response.read())
+                    if response.status == 429 or body.get("code") == 429:
+                        retry_after = float(body.get("retry_after") or response.headers.get("Retry-After")
+                                            or DEFAULT_RETRY_AFTER)
+                        print(f"Rate limited on {symbol}, pausing {retry_after}s and re-queueing the chunk")
+                        self.stats["rate_limited"] += 1
+                        self.bucket.pause(retry_after)
+                        return RETRY_LATER
+                    if body.get("s") == "error":
+                        print(f" Fyers history error for {symbol}: {body.get('code')} {body.get('message')}")
+                        return None
+                    return parse_fyers_candles(body.get("candles") or [])
+            except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+                sleep_time = min(self.base_delay * (2 ** attempt), 60)
+                print(f" Attempt {attempt + 1} failed for {symbol}: {e} - waiting {sleep_time}s")
+                await asyncio.sleep(sleep_time)
+        print(f" Failed final attempt for {symbol} chunk starting {start_ms}")
+        return None
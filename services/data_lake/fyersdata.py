@@ -247,7 +247,6 @@ import pandas as pd
 import requests
 import pytz
 from datetime import datetime, timedelta
-from fyers_apiv3 import fyersModel
 from services.config import redis_connection
 from services.loger import logger
 try:
@@ -267,6 +266,14 @@ except ImportError as e:
         from psycopg2.extras import execute_batch
         import psycopg2
 import json
+from services.data_lake.bulk_writer import bulk_upsert
+from services.data_lake.watermarks import get_watermarks
+from services.data_lake.gap_scan import scan_gaps, print_gap_report
+from services.data_lake.minute_index import from_epoch_minutes
+from services.data_lake.backfill_scheduler import HistoryScheduler, RECENT_MARGIN_MINUTES, recent_first_backfill, run_history
+from services.data_lake.fyers_history import FyersHistoryClient, RateLimiter, FYERS_HISTORY_HEADROOM, FYERS_HISTORY_IN_FLIGHT
+from services.data_lake.trading_calendar import NSE_CALENDAR
+from services.config import config
 
 # ----------------- CONFIGURATION ----------------- #
 TRADING_SYSTEM_CONN_PARAMS = {
@@ -322,108 +329,86 @@ except Exception as e:
     print(f"Redis connection error: {e}")
     DEFAULT_LOOKBACK_DAYS = 30
 
+stock_watermarks = get_watermarks("public.nse_stocks")
+# Enough recent trading minutes for the OLS window, fetched before older history
+RECENT_MINUTES = config['params']['window'] + RECENT_MARGIN_MINUTES
+
 def get_last_cached_timestamp(prefix, symbol):
-    if not conn:
-        print("No database connection for timestamp check")
-        return None
     try:
-        query = """SELECT MAX(timestamp) FROM public.nse_stocks WHERE symbol = %s;"""
-        with conn.cursor() as cur:
-            cur.execute(query, (symbol,))
-            result = cur.fetchone()
-            if result and result[0]:
-                return result[0].astimezone(IST)
+        last_ts = stock_watermarks.get(symbol)
+        if last_ts:
+            return last_ts.astimezone(IST)
     except Exception as e:
         print(f"Error getting timestamp for {symbol}: {e}")
     return None
 
 def cache_data_fyers(df, symbol):
+    """Upsert complete candles; returns False only if the write failed."""
     if df is None or df.empty:
-        return
+        return True
     try:
         current_time = datetime.now(IST)
         last_complete_minute = current_time.replace(second=0, microsecond=0) - timedelta(minutes=1)
         df = df[df['timestamp'] <= last_complete_minute]
         if df.empty:
-            return
-        
-        rows = []
-        for record in df.to_dict(orient="records"):
-            ts = record["timestamp"]
-            if isinstance(ts, pd.Timestamp):
-                ts = ts.to_pydatetime()
-            ts = ts.astimezone(IST).replace(tzinfo=None)
-            rows.append((symbol, ts, record["open"], record["high"], record["low"], record["close"], record["volume"]))
-
-        with psycopg2.connect(**TRADING_SYSTEM_CONN_PARAMS) as temp_conn:
-            with temp_conn.cursor() as cur:
-                upsert_query = """INSERT INTO public.nse_stocks (symbol, timestamp, open, high, low, close, volume)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s) ON CONFLICT (symbol, timestamp) DO UPDATE
-                    SET open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = EXCLUDED.close, volume = EXCLUDED.volume;"""
-                execute_batch(cur, upsert_query, rows)
-            temp_conn.commit()
+            return True
+
+        # nse_stocks holds naive IST; bulk_upsert converts aware timestamps
+        bulk_upsert("public.nse_stocks", df.assign(symbol=symbol))
+        return True
     except Exception as e:
         print(f"Error upserting data for {symbol}: {e}")
+        return False
 
-def fetch_fyers_data(symbol: str, start_dt: datetime, end_dt: datetime):
-    all_data = []
-    chunk_start = start_dt
-    while chunk_start < end_dt:
-        chunk_end = min(chunk_start + timedelta(days=100), end_dt)
-        from_sec = int(chunk_start.timestamp())
-        to_sec = int(chunk_end.timestamp())
-        
-        data = {"symbol": f"NSE:{symbol}-EQ", "resolution": "1", "date_format": "0", 
-                "range_from": str(from_sec), "range_to": str(to_sec), "cont_flag": "1"}
-
-        fyers = fyersModel.FyersModel(client_id=CLIENT_ID, is_async=False, token=TOKEN, log_path="")
-        retries = 5
-        wait_time = 10
-        response = None
-
-        while retries:
-            try:
-                response = fyers.history(data=data)
-                if response.get("code") == 429:
-                    wait_time = int(response.get("retry_after", wait_time))
-                    time.sleep(wait_time)
-                    retries -= 1
-                    wait_time *= 2
-                    continue
-                break
-            except requests.exceptions.RequestException as e:
-                print(f"Request error for {symbol}: {e}")
-                break
-
-        if response is None or response.get("code") == 429:
-            chunk_start = chunk_end + timedelta(minutes=1)
-            continue
-
-        candles = response.get("candles", [])
-        if candles:
-            for c in candles:
-                ts_ist = datetime.fromtimestamp(c[0], tz=IST)
-                all_data.append({"symbol": symbol, "timestamp": ts_ist, "open": float(c[1]), 
-                               "high": float(c[2]), "low": float(c[3]), "close": float(c[4]), "volume": float(c[5])})
-
-        chunk_start = chunk_end + timedelta(minutes=1)
-
-    return pd.DataFrame(all_data) if all_data else pd.DataFrame()
+def new_history_client(**kwargs):
+    return FyersHistoryClient(cache_data_fyers, CLIENT_ID, TOKEN, **kwargs)
 
-def fill_and_cache_fyers(symbol: str):
-    prefix = "nse"
-    last_ts = get_last_cached_timestamp(prefix, symbol)
+def _fyers_history(ranges):
+    """Background lane: older history of recently added symbols on a smaller share of the rate limit."""
+    client = new_history_client(concurrency=FYERS_HISTORY_IN_FLIGHT, limiter=RateLimiter(headroom=FYERS_HISTORY_HEADROOM))
+    run_history(redis_client, "nse", client, ranges)
+
+history_backfill = HistoryScheduler(_fyers_history, "nse")
+
+def fyers_Symbols_backfill(symbols):
+    """
+    Gap-fill many symbols with one concurrent history client: every 100-day
+    chunk of every symbol shares one session and one rate limiter, chunks are
+    streamed to the database, and long ranges are filled recent-first with
+    the older history handed to the background lane.
+    """
     now_ist = datetime.now(IST)
-    if last_ts is None:
-        start_dt = now_ist - timedelta(days=DEFAULT_LOOKBACK_DAYS)
-    else:
-        start_dt = last_ts + timedelta(minutes=1)
-        if start_dt >= now_ist:
-            return
+    stats = recent_first_backfill(
+        redis_client, "nse", symbols, new_history_client(), history_backfill,
+        last_cached=lambda symbol: get_last_cached_timestamp("nse", symbol), now=now_ist,
+        lookback_start=now_ist - timedelta(days=DEFAULT_LOOKBACK_DAYS),
+        recent_start=NSE_CALENDAR.subtract(now_ist, RECENT_MINUTES))
+    if not stats:
+        return stats
+    failed = {sym: s["failed"] for sym, s in stats["symbols"].items() if s["failed"]}
+    print(f"Backfilled {len(stats['symbols'])} NSE symbols, {stats['requests']} requests in {stats['seconds']:.1f}s"
+          f" ({stats['rate_limited']} rate limited, {stats['requeued']} re-queued, {len(failed)} symbols with"
+          f" failed chunks, {stats['handoff']} handed to the history lane)")
+    return stats
 
-    df = fetch_fyers_data(symbol, start_dt, now_ist)
-    if not df.empty:
-        cache_data_fyers(df, symbol)
+def fill_and_cache_fyers(symbol: str):
+    return fyers_Symbols_backfill([symbol])
 
 def fyers_Symbol_gap_filler(symbol: str):
-    fill_and_cache_fyers(symbol)
\ No newline at end of file
+    fill_and_cache_fyers(symbol)
+
+def fyers_Symbols_gap_repair(symbols, since=None):
+    """Re-fetch the interior gaps scan_gaps() finds, one history call per planned request."""
+    report = scan_gaps("nse", symbols, since)
+    chunks = []
+    for symbol, r in report.items():
+        for start, end in r["requests"]:
+            # Gap minutes are wall-clock IST
+            start_dt, end_dt = from_epoch_minutes([start, end + 1]).tz_localize(IST)
+            chunks.append((symbol, int(start_dt.timestamp() * 1000), int(end_dt.timestamp() * 1000) - 1))
+    repaired = {}
+    if chunks:
+        stats = new_history_client().run_chunks_sync(chunks)
+        repaired = {symbol: s["rows"] for symbol, s in stats["symbols"].items()}
+    print_gap_report("nse", report, repaired)
+    return report
@@ -0,0 +1,113 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from services.db_config import get_db_connection
+from services.data_lake.bulk_writer import TABLES
+from services.data_lake.binance_backfill import KLINE_LIMIT
+from services.data_lake.minute_index import LOCAL_TZ
+from services.data_lake.trading_calendar import NSE_CALENDAR
+
+GAP_SCAN_LOOKBACK_DAYS = int(os.getenv("GAP_SCAN_LOOKBACK_DAYS", 30))
+MINUTES_PER_DAY = 1440
+
+# Per exchange: candle table, the TradingCalendar (None = every minute) and
+# the most minutes one history request can cover
+EXCHANGES = {
+    "binance": {"table": "public.binance_stocks", "calendar": None, "request_minutes": KLINE_LIMIT},
+    "nse": {"table": "public.nse_stocks", "calendar": NSE_CALENDAR, "request_minutes": 100 * MINUTES_PER_DAY},
+}
+
+def find_holes(table, symbols, since):
+    """
+    {symbol: [(prev_minute, next_minute), ...]} for consecutive stored candles
+    more than a minute apart, found for every symbol in one window-function
+    pass. Minutes follow to_epoch_minutes(): UTC for timestamptz tables,
+    wall-clock for naive ones.
+    """
+    query = f"""
+        SELECT symbol, prev_minute, minute FROM (
+            SELECT symbol,
+                   floor(extract(epoch FROM timestamp) / 60)::bigint AS minute,
+                   floor(extract(epoch FROM LAG(timestamp) OVER w) / 60)::bigint AS prev_minute
+            FROM {table}
+            WHERE symbol = ANY(%s) AND timestamp >= %s
+            WINDOW w AS (PARTITION BY symbol ORDER BY timestamp)
+        ) t
+        WHERE minute - prev_minute > 1
+        ORDER BY symbol, minute
+    """
+    holes = {symbol: [] for symbol in symbols}
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, (list(symbols), since))
+        for symbol, prev_minute, minute in cur.fetchall():
+            holes[symbol].append((int(prev_minute), int(minute)))
+    return holes
+
+def expected_gaps(prev_minute, next_minute, calendar=None):
+    """
+    Inclusive (start, end) minute ranges strictly between two stored candles
+    that the calendar expects to trade: all of them for a 24/7 market,
+    otherwise the calendar's session stretches (holidays skipped).
+    """
+    first, last = prev_minute + 1, next_minute - 1
+    if first > last:
+        return []
+    if calendar is None:
+        return [(first, last)]
+    return calendar.runs(first, last)
+
+def plan_requests(gaps, max_minutes):
+    """
+    Fewest (start, end) requests of at most max_minutes that cover every gap:
+    each request starts at the first uncovered gap minute and absorbs every
+    later gap it can reach, re-fetching the stored candles in between.
+    """
+    requests = []
+    for start, end in sorted(gaps):
+        if requests and start < requests[-1][0] + max_minutes:
+            req_start, req_end = requests[-1]
+            requests[-1] = (req_start, max(req_end, min(end, req_start + max_minutes - 1)))
+            start = max(start, requests[-1][1] + 1)
+        while start <= end:
+            requests.append((start, min(end, start + max_minutes - 1)))
+            start = requests[-1][1] + 1
+    return requests
+
+def scan_gaps(exchange, symbols, since=None):
+    """
+    Per-symbol report of interior gaps in an exchange's candle table since
+    `since` (default GAP_SCAN_LOOKBACK_DAYS ago): the missing ranges, the
+    requests that repair them, and totals. The tail after the last candle is
+    left to the forward gap fillers.
+    """
+    spec = EXCHANGES[exchange]
+    since = since or datetime.now(timezone.utc) - timedelta(days=GAP_SCAN_LOOKBACK_DAYS)
+    bound = pd.Timestamp(since)
+    bound = bound.tz_localize(LOCAL_TZ) if bound.tzinfo is None else bound
+    if TABLES[spec["table"]]["naive_tz"]:
+        bound = bound.tz_convert(TABLES[spec["table"]]["naive_tz"]).tz_localize(None)
+
+    report = {}
+    for symbol, holes in find_holes(spec["table"], symbols, bound.to_pydatetime()).items():
+        gaps = [gap for prev, nxt in holes for gap in expected_gaps(prev, nxt, spec["calendar"])]
+        sizes = [end - start + 1 for start, end in gaps]
+        report[symbol] = {
+            "gaps": gaps,
+            "requests": plan_requests(gaps, spec["request_minutes"]),
+            "missing_minutes": sum(sizes),
+            "largest_gap": max(sizes, default=0),
+        }
+    return report
+
+def print_gap_report(exchange, report, repaired=None):
+    """One line per symbol with gaps; `repaired` maps symbol -> candles fetched."""
+    with_gaps = {s: r for s, r in report.items() if r["gaps"]}
+    print(f"Gap scan {exchange}: {len(with_gaps)}/{len(report)} symbols with gaps, "
+          f"{sum(r['missing_minutes'] for r in report.values())} missing minutes, "
+          f"{sum(len(r['requests']) for r in report.values())} requests")
+    for symbol, r in sorted(with_gaps.items(), key=lambda item: -item[1]["missing_minutes"]):
+        line = (f"  {symbol:<16} gaps={len(r['gaps']):<5} missing={r['missing_minutes']:<7} "
+                f"largest={r['largest_gap']:<6} requests={len(r['requests'])}")
+        if repaired is not None:
+            line += f" fetched={repaired.get(symbol, 0)}"
+        print(line)
@@ -0,0 +1,129 @@
+import numpy as np
+from numba import jit
+
+# Window sums are rebuilt from scratch every REANCHOR_INTERVAL rows so the
+# float error from adding/removing squared prices does not accumulate.
+REANCHOR_INTERVAL = 10_000
+
+def _as_array(values):
+    return np.asarray(getattr(values, "values", values), dtype=np.float64)
+
+def vectorized_ols(y, x, window):
+    n = len(y)
+    hedge_ratio = np.full(n, np.nan)
+
+    y_vals = _as_array(y)
+    x_vals = _as_array(x)
+
+    for i in range(window-1, n):
+        y_window = y_vals[i-window+1:i+1]
+        x_window = x_vals[i-window+1:i+1]
+        denominator = np.sum(x_window ** 2)
+        if denominator != 0:
+            hedge_ratio[i] = np.sum(x_window * y_window) / denominator
+
+    return hedge_ratio
+
+def rolling_window_sum(values, window, reanchor=REANCHOR_INTERVAL):
+    """
+    Sum of the trailing `window` rows for every row (axis 0), NaN until the
+    first full window. Works on 1D series and on 2D (time x pairs) matrices.
+    Each block starts from an exact sum and is extended with the running
+    difference values[i] - values[i - window], so the cost is O(n).
+    """
+    values = _as_array(values)
+    n = values.shape[0]
+    out = np.full(values.shape, np.nan)
+    if window <= 0 or n < window:
+        return out
+
+    step = values.copy()
+    step[window:] -= values[:-window]
+    reanchor = max(int(reanchor), 1)
+
+    for anchor in range(window - 1, n, reanchor):
+        stop = min(anchor + reanchor, n)
+        out[anchor] = values[anchor - window + 1:anchor + 1].sum(axis=0)
+        if stop > anchor + 1:
+            out[anchor + 1:stop] = out[anchor] + np.cumsum(step[anchor + 1:stop], axis=0)
+    return out
+
+def rolling_ols(y, x, window, reanchor=REANCHOR_INTERVAL):
+    """
+    No-intercept rolling OLS hedge ratio (sum(x*y) / sum(x**2)) using sliding
+    sums. Same output as vectorized_ols in O(n) instead of O(n * window).
+    """
+    y_vals = _as_array(y)
+    x_vals = _as_array(x)
+    sum_xx = rolling_window_sum(x_vals * x_vals, window, reanchor)
+    sum_xy = rolling_window_sum(x_vals * y_vals, window, reanchor)
+
+    hedge_ratio = np.full(sum_xx.shape, np.nan)
+    valid = sum_xx != 0
+    np.divide(sum_xy, sum_xx, out=hedge_ratio, where=valid)
+    return hedge_ratio
+
+def rolling_ols_intercept(y, x, window, reanchor=REANCHOR_INTERVAL):
+    """
+    Rolling OLS of y on x with an intercept, cov(x, y) / var(x) over the
+    trailing window, from sliding sums. Prices are shifted by their mean
+    first (the slope is shift invariant) so the sums of squares stay small.
+    Returns (hedge_ratio, intercept); 1D or 2D (time x pairs) like rolling_ols.
+    """
+    y_vals = _as_array(y)
+    x_vals = _as_array(x)
+    y0 = np.nanmean(y_vals, axis=0) if np.isfinite(y_vals).any() else 0.0
+    x0 = np.nanmean(x_vals, axis=0) if np.isfinite(x_vals).any() else 0.0
+    u, v = x_vals - x0, y_vals - y0
+    sum_u = rolling_window_sum(u, window, reanchor)
+    sum_v = rolling_window_sum(v, window, reanchor)
+    sum_uu = rolling_window_sum(u * u, window, reanchor)
+    sum_uv = rolling_window_sum(u * v, window, reanchor)
+
+    denominator = window * sum_uu - sum_u * sum_u
+    hedge_ratio = np.full(denominator.shape, np.nan)
+    valid = denominator > 0
+    np.divide(window * sum_uv - sum_u * sum_v, denominator, out=hedge_ratio, where=valid)
+    intercept = (y0 + sum_v / window) - hedge_ratio * (x0 + sum_u / window)
+    return hedge_ratio, intercept
+
+@jit(nopython=True, cache=True)
+def kalman_filter(y, x, delta, ve, theta, P, warmup):
+    """
+    Kalman filter of y = beta * x + alpha with a random-walk state.
+    theta ([beta, alpha]) and the 2x2 covariance P are updated in place so the
+    filter can resume where this call stops; NaN observations are skipped.
+    Returns (beta, alpha, observations) with NaN for the first `warmup` steps.
+    """
+    n = len(y)
+    beta = np.full(n, np.nan)
+    alpha = np.full(n, np.nan)
+    q = delta / (1.0 - delta)
+    seen = 0
+    for i in range(n):
+        if np.isnan(y[i]) or np.isnan(x[i]):
+            continue
+        P[0, 0] += q
+        P[1, 1] += q
+        ph0 = P[0, 0] * x[i] + P[0, 1]
+        ph1 = P[1, 0] * x[i] + P[1, 1]
+        s = x[i] * ph0 + ph1 + ve
+        k0 = ph0 / s
+        k1 = ph1 / s
+        e = y[i] - (theta[0] * x[i] + theta[1])
+        theta[0] += k0 * e
+        theta[1] += k1 * e
+        P[0, 0] -= k0 * ph0
+        P[0, 1] -= k0 * ph1
+        P[1, 0] -= k1 * ph0
+        P[1, 1] -= k1 * ph1
+        seen += 1
+        if seen > warmup:
+            beta[i] = theta[0]
+            alpha[i] = theta[1]
+    return beta, alpha, seen
+
+OLS_ENGINES = {
+    "loop": vectorized_ols,
+    "rolling": rolling_ols,
+}
@@ -0,0 +1,139 @@
+import os
+import math
+import time
+from collections import deque
+
+SIGNAL_STREAM_KEY = "signals:live_bands"
+# Approximate cap on the stream; consumers are expected to keep up well within it
+SIGNAL_STREAM_MAXLEN = int(os.getenv("LIVE_SIGNAL_STREAM_MAXLEN", 10000))
+
+class RollingStats:
+    """
+    Mean and sample variance (ddof=1, as pandas' rolling std) of the last
+    `size` values, kept with Welford's update and its inverse so a new bar
+    costs O(1). Recomputed exactly every `size` additions so the running
+    sums cannot drift over days of bars.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.added = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def _recompute(self):
+        n = len(self.values)
+        self.mean = sum(self.values) / n if n else 0.0
+        self.m2 = sum((v - self.mean) ** 2 for v in self.values)
+
+    def add(self, x):
+        if self.size <= 0:
+            return
+        if len(self.values) == self.size:
+            oldest = self.values.popleft()
+            n = len(self.values)
+            if n:
+                delta = oldest - self.mean
+                self.mean -= delta / n
+                self.m2 -= delta * (oldest - self.mean)
+            else:
+                self.mean = self.m2 = 0.0
+        self.values.append(x)
+        delta = x - self.mean
+        self.mean += delta / len(self.values)
+        self.m2 += delta * (x - self.mean)
+        self.added += 1
+        if self.added % self.size == 0:
+            self._recompute()
+
+    def with_value(self, x):
+        """(mean, std) of the window plus `x`, without keeping x."""
+        n = len(self.values) + 1
+        delta = x - self.mean
+        mean = self.mean + delta / n
+        if n < 2:
+            return mean, math.nan
+        m2 = self.m2 + delta * (x - mean)
+        return mean, math.sqrt(max(m2, 0.0) / (n - 1))
+
+class PairBands:
+    """
+    Bollinger state of one pair: the closed bars of the window and the live
+    bar's latest close. `side` is the band the spread was last outside of
+    (1 below the long band, -1 above the short band, 0 inside).
+    """
+    def __init__(self, window, closes=()):
+        self.stats = RollingStats(window - 1)
+        for close in closes[-(window - 1):] if window > 1 else ():
+            self.stats.add(close)
+        self.bar_minute = None
+        self.last = None
+        self.side = 0
+
+class LiveBands:
+    """
+    Tick-level Bollinger bands per pair, evaluated on every live spread:
+    the `window` bars are the window-1 last closed one-minute bars (seeded
+    from the spread table, then closed from the live spread itself at each
+    minute rollover) plus the live partial bar. Bands are placed exactly as
+    the minute strategy's (band_kernel.bollinger_signals_fast): centred on
+    the window's standard deviation, which is also its trade target, at
+    std -/+ num_std * std. update() returns a signal when the spread crosses
+    out of them, once per crossing, and nothing until the window is full.
+    """
+    def __init__(self, window, num_std):
+        self.window = window
+        self.num_std = num_std
+        self.pairs = {}
+
+    def seed(self, closes_by_pair):
+        """Warm pairs from {pair: closed bar closes, oldest first}; live bar and side are kept."""
+        for pair, closes in closes_by_pair.items():
+            bands = PairBands(self.window, list(closes))
+            current = self.pairs.get(pair)
+            if current is not None:
+                bands.bar_minute, bands.last, bands.side = current.bar_minute, current.last, current.side
+            self.pairs[pair] = bands
+
+    def set_pairs(self, pairs):
+        self.pairs = {pair: self.pairs.get(pair) or PairBands(self.window) for pair in pairs}
+
+    def update(self, pair, close, minute=None):
+        """`minute`: epoch minute of the tick, shared by all pairs of one tick."""
+        bands = self.pairs.get(pair)
+        if bands is None:
+            return None
+        if minute is None:
+            minute = int(time.time() // 60)
+        if bands.bar_minute is None:
+            bands.bar_minute = minute
+        elif minute > bands.bar_minute:
+            bands.stats.add(bands.last)
+            bands.bar_minute = minute
+        bands.last = close
+        if len(bands.stats.values) < bands.stats.size:
+            return None
+        _, std = bands.stats.with_value(close)
+        if math.isnan(std):
+            return None
+        long_band = std - self.num_std * std
+        short_band = std + self.num_std * std
+        side = 1 if close < long_band else -1 if close > short_band else 0
+        crossed = side != 0 and side != bands.side
+        bands.side = side
+        if not crossed:
+            return None
+        return {
+            "pair": pair,
+            "signal": side,
+            "action": "BUY" if side == 1 else "SELL",
+            "close": close,
+            "mean": std,
+            "std": std,
+            "long_band": long_band,
+            "short_band": short_band,
+            "bars": len(bands.stats) + 1,
+        }
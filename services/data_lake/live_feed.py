@@ -0,0 +1,177 @@
+import json
+import time
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from services.data_lake.minute_index import LOCAL_TZ
+from services.data_lake.live_bands import SIGNAL_STREAM_KEY, SIGNAL_STREAM_MAXLEN
+
+LTP_DATA_KEY = "binance_ltp:stocks"
+SPREAD_DATA_KEY = "spreads:live_data"
+
+# Binance stream subscribed per input mode
+INPUT_MODES = {"trade": "@trade", "aggTrade": "@aggTrade", "bookTicker": "@bookTicker"}
+
+def parse_price(mode, data):
+    """
+    (symbol, price) from a message of the mode's stream, or None for
+    anything else (subscription replies). bookTicker prices are the mid of
+    the best bid and ask.
+    """
+    if mode == "bookTicker":
+        if 'b' not in data or 'a' not in data or 's' not in data:
+            return None
+        return data['s'].lower(), (float(data['b']) + float(data['a'])) / 2
+    if data.get('e') != mode or 's' not in data or 'p' not in data:
+        return None
+    return data['s'].lower(), float(data['p'])
+
+class PriceSampler:
+    """
+    Conflates prices between drains: offer() keeps only the latest price per
+    symbol and drain() hands over the symbols that moved since the last one,
+    so downstream work runs once per symbol per interval however fast the
+    stream is. A price waits at most one drain interval.
+    """
+    def __init__(self):
+        self.latest = {}
+        self.offered = 0
+        self.drained = 0
+
+    def offer(self, symbol, price):
+        self.latest[symbol] = price
+        self.offered += 1
+
+    def drain(self):
+        latest, self.latest = self.latest, {}
+        self.drained += len(latest)
+        return latest
+
+def build_pair_index(pairs):
+    """
+    {symbol: [(pair, sym1, sym2), ...]} from {pair: [sym1, sym2]}, so a tick
+    only visits the pairs it is a leg of, with both legs already resolved.
+    """
+    index = {}
+    for pair, (sym1, sym2) in pairs.items():
+        for symbol in dict.fromkeys((sym1, sym2)):
+            index.setdefault(symbol, []).append((pair, sym1, sym2))
+    return index
+
+def spread_updates(symbol, index, latest_prices, live_slope, timestamp):
+    """
+    (pair, spread_data) for every pair of `symbol` whose legs both have a
+    price and whose live_slope(pair, price1, price2) is known. timestamp is
+    the already formatted tick time shared by all of the tick's pairs.
+    """
+    updates = []
+    for pair, sym1, sym2 in index.get(symbol, ()):
+        price1 = latest_prices.get(sym1)
+        price2 = latest_prices.get(sym2)
+        if price1 is None or price2 is None:
+            continue
+        slope = live_slope(pair, price1, price2)
+        if slope is None:
+            continue
+        updates.append((pair, {
+            "close": str(price1 - slope * price2),
+            "slope": str(slope),
+            "timestamp": timestamp,
+            "symbol1": sym1,
+            "symbol2": sym2
+        }))
+    return updates
+
+class LiveSpreadFeed:
+    """
+    The live tick path, independent of where frames come from: a stream
+    message is parsed, the symbol's LTP stored and its pairs' spreads
+    recomputed, both written through `writer` (a CoalescingWriter).
+    crypto_ws drives it from the websocket, the replay harness from
+    recorded or synthetic frames. With a sampler, messages only update it
+    and drain() does the work once per moved symbol.
+
+    Every write carries the origin (symbol, exchange event ms, receive ns)
+    of the symbol's latest message, for the writer's on_commit latency hook.
+
+    With `bands` (a LiveBands) every new spread is also checked against the
+    pair's tick-level Bollinger bands and a crossing is appended to the
+    signal_key stream right away.
+    """
+    def __init__(self, writer, live_slope, mode="trade", sampler=None, bands=None,
+                 ltp_key=LTP_DATA_KEY, spread_key=SPREAD_DATA_KEY, signal_key=SIGNAL_STREAM_KEY):
+        self.writer = writer
+        self.live_slope = live_slope
+        self.mode = mode
+        self.sampler = sampler
+        self.bands = bands
+        self.ltp_key = ltp_key
+        self.spread_key = spread_key
+        self.signal_key = signal_key
+        self.tz = ZoneInfo(LOCAL_TZ)
+        self.data_lock = threading.Lock()
+        self.latest_prices = {}
+        self.origins = {}
+        self.signals = 0
+        self.set_pairs([])
+
+    def set_pairs(self, pairs):
+        """Rebuild the pair tables; each is swapped whole so the tick path never sees a partial update."""
+        pairs_map = {pair: [pair.split('_')[0], pair.split('_')[1]] for pair in pairs}
+        symbols = list(set([sym for pair in pairs_map.values() for sym in pair]))
+        if self.bands is not None:
+            self.bands.set_pairs(pairs_map)
+        # symbol -> the pairs it is a leg of
+        self.index = build_pair_index(pairs_map)
+        self.pairs, self.symbols, self.pair_list = pairs_map, symbols, list(pairs)
+        self.symbol_set = frozenset(symbols)
+
+    def on_price(self, symbol, price):
+        now = datetime.now(self.tz)
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        origin = self.origins.get(symbol)
+        with self.data_lock:
+            if symbol in self.symbol_set:
+                self.latest_prices[symbol] = price
+                # Store LTP in Redis
+                ltp_data = {
+                    "symbol": symbol,
+                    "price": str(price),
+                    "timestamp": timestamp
+                }
+                self.writer.hset(self.ltp_key, symbol, json.dumps(ltp_data), origin)
+
+        minute = int(now.timestamp() // 60)
+        # Calculate live spread for the pairs this symbol is a leg of
+        for pair, spread_data in spread_updates(symbol, self.index, self.latest_prices, self.live_slope, timestamp):
+            self.writer.hset(self.spread_key, pair, json.dumps(spread_data), origin)
+            if self.bands is not None:
+                signal = self.bands.update(pair, float(spread_data["close"]), minute)
+                if signal is not None:
+                    self._emit(signal, spread_data, origin)
+
+    def _emit(self, signal, spread_data, origin):
+        signal.update({"slope": spread_data["slope"], "timestamp": spread_data["timestamp"],
+                       "symbol1": spread_data["symbol1"], "symbol2": spread_data["symbol2"]})
+        if origin is not None:
+            signal["received_ns"] = origin[2]
+        self.writer.xadd(self.signal_key, signal, SIGNAL_STREAM_MAXLEN)
+        self.signals += 1
+        print(f"[SIGNAL] {signal['pair']} {signal['action']} spread {signal['close']:.6f} outside "
+              f"[{signal['long_band']:.6f}, {signal['short_band']:.6f}]")
+
+    def handle_message(self, data):
+        received_ns = time.time_ns()
+        tick = parse_price(self.mode, data)
+        if tick is None:
+            return
+        # bookTicker carries no exchange time
+        self.origins[tick[0]] = (tick[0], data.get('E') or data.get('T'), received_ns)
+        if self.sampler is not None:
+            self.sampler.offer(*tick)
+        else:
+            self.on_price(*tick)
+
+    def drain(self):
+        for symbol, price in self.sampler.drain().items():
+            self.on_price(symbol, price)
@@ -0,0 +1,75 @@
+import os
+import time
+import asyncio
+import threading
+import numpy as np
+from services.data_lake.spread_state import load_state_versions, load_rolling_states
+
+HEDGE_POLL_SECONDS = float(os.getenv("LIVE_HEDGE_POLL_SECONDS", 5))
+SLOPE_REFRESH_SECONDS = float(os.getenv("LIVE_SLOPE_REFRESH_SECONDS", 60))
+
+class LiveHedges:
+    """
+    Hedge ratios for the live spread feed, refreshed without blocking it.
+    Each pair maps to one (hedge model, fallback slope) tuple that refresh()
+    replaces whole, so a tick sees either the old or the new ratio, never a
+    mix. refresh() is blocking and runs in a worker thread from run(): it
+    reads the spread job's state version counters (one HGETALL) and reloads
+    only the states whose version moved (one pipeline); pairs without a
+    ready model get their last stored slope from fetch_slopes(pairs), one
+    batched query every SLOPE_REFRESH_SECONDS.
+    """
+    def __init__(self, redis_client, exchange, fetch_slopes):
+        self.redis = redis_client
+        self.exchange = exchange
+        self.fetch_slopes = fetch_slopes
+        self.hedges = {}
+        self.versions = {}
+        self.slopes_fetched = 0.0
+        self._lock = threading.Lock()
+
+    def slope(self, pair, price1, price2):
+        state, fallback = self.hedges.get(pair, (None, None))
+        if state is not None:
+            slope = state.live_hedge_ratio(price1, price2)
+            if not np.isnan(slope):
+                return slope
+        return fallback
+
+    def refresh(self, pairs):
+        # The poll loop and a pair reload may refresh at the same time
+        with self._lock:
+            return self._refresh(pairs)
+
+    def _refresh(self, pairs):
+        versions = load_state_versions(self.redis, self.exchange)
+        changed = [p for p in pairs if p not in self.hedges or versions.get(p) != self.versions.get(p)]
+        states = {p: self.hedges[p][0] for p in pairs if p in self.hedges}
+        loaded = load_rolling_states(self.redis, self.exchange, changed) if changed else {}
+        for pair, state in loaded.items():
+            states[pair] = state if state is not None and state.is_ready() else None
+            self.versions[pair] = versions.get(pair)
+
+        slopes = {}
+        fallback_pairs = [p for p in pairs if states.get(p) is None]
+        if fallback_pairs and (changed or time.monotonic() - self.slopes_fetched >= SLOPE_REFRESH_SECONDS):
+            try:
+                slopes = self.fetch_slopes(fallback_pairs)
+                self.slopes_fetched = time.monotonic()
+            except Exception as e:
+                print(f"[HEDGE] Could not fetch {self.exchange} slopes: {e}")
+        for pair in pairs:
+            fallback = self.hedges.get(pair, (None, None))[1]
+            self.hedges[pair] = (states.get(pair), slopes.get(pair, fallback))
+        return changed
+
+    async def run(self, pairs):
+        """Refresh loop; pairs() returns the current pair list."""
+        while True:
+            await asyncio.sleep(HEDGE_POLL_SECONDS)
+            try:
+                changed = await asyncio.to_thread(self.refresh, list(pairs()))
+                if changed:
+                    print(f"[HEDGE] Reloaded {len(changed)} {self.exchange} hedge models")
+            except Exception as e:
+                print(f"[HEDGE] {self.exchange} hedge refresh failed: {e}")
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Naive datetimes passed as query bounds are wall-clock IST throughout the pipeline
+LOCAL_TZ = "Asia/Kolkata"
+NS_PER_MINUTE = 60_000_000_000
+
+def to_epoch_minutes(timestamps):
+    """
+    int64 minutes since the Unix epoch plus the timezone needed to rebuild the
+    timestamps. tz-aware values are keyed on their UTC instant; naive values
+    (nse_stocks stores naive IST) are keyed on their wall-clock minute.
+    """
+    ts = timestamps if isinstance(timestamps, pd.Series) else pd.Series(timestamps)
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts)
+    # .values of a tz-aware series is already the UTC instant
+    return ts.values.astype('datetime64[m]').astype(np.int64), getattr(ts.dt, 'tz', None)
+
+def from_epoch_minutes(minutes, tz=None):
+    index = pd.DatetimeIndex(np.asarray(minutes, dtype=np.int64).astype('datetime64[m]'))
+    if tz is not None:
+        index = index.tz_localize('UTC').tz_convert(tz)
+    return index
+
+def to_epoch_minute(value, tz=None, ceil=False):
+    """
+    Epoch minute of a single query bound, keyed the same way as
+    to_epoch_minutes() keys data stored with timezone `tz`.
+    """
+    ts = pd.Timestamp(value)
+    if tz is not None:
+        ts = (ts.tz_localize(LOCAL_TZ) if ts.tzinfo is None else ts).tz_convert('UTC').tz_localize(None)
+    elif ts.tzinfo is not None:
+        ts = ts.tz_convert(LOCAL_TZ).tz_localize(None)
+    return -(-ts.value // NS_PER_MINUTE) if ceil else ts.value // NS_PER_MINUTE
+
+def align_asof(minutes1, minutes2, tolerance=5):
+    """
+    Row indices pairing each leg-1 bar with the leg-2 bar merge_asof(direction=
+    'backward', tolerance) picks, with ffill for bars that miss the tolerance
+    and leading unmatched bars dropped - the same rows _merge_dataframes keeps.
+    Both inputs are sorted int64 epoch minutes. Returns (rows1, rows2).
+    """
+    minutes1 = np.asarray(minutes1, dtype=np.int64)
+    minutes2 = np.asarray(minutes2, dtype=np.int64)
+    asof = np.searchsorted(minutes2, minutes1, side='right') - 1
+    found = asof >= 0
+    matched = np.where(found, asof, -1)
+    matched[found & (minutes1 - minutes2[np.maximum(asof, 0)] > tolerance)] = -1
+    # Matched rows only move forward, so a running max is a forward fill
+    effective = np.maximum.accumulate(matched) if len(matched) else matched
+    keep = effective >= 0
+    return np.flatnonzero(keep), effective[keep]
+
+def align_legs(df1, df2, tolerance=5):
+    """
+    Aligned leg columns of two bar frames as arrays keyed like the merged
+    frame (timestamp, open_1 ... volume_1, open_2 ... volume_2, plus the
+    scalar symbol_x/symbol_y), without building intermediate DataFrames.
+    """
+    if not df1['timestamp'].is_monotonic_increasing:
+        df1 = df1.sort_values('timestamp')
+    if not df2['timestamp'].is_monotonic_increasing:
+        df2 = df2.sort_values('timestamp')
+    minutes1, _ = to_epoch_minutes(df1['timestamp'])
+    minutes2, _ = to_epoch_minutes(df2['timestamp'])
+    rows1, rows2 = align_asof(minutes1, minutes2, tolerance)
+    # Only leading leg-1 rows are ever dropped, so leg 1 is a plain slice (no copy)
+    kept = slice(len(df1) - len(rows1), None)
+
+    # Each frame holds a single symbol, kept as a scalar that DataFrame() broadcasts
+    aligned = {
+        'symbol_x': df1['symbol'].iloc[0] if len(df1) else '',
+        'timestamp': df1['timestamp'].array[kept],
+    }
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        aligned[f'{col}_1'] = df1[col].to_numpy(dtype=np.float64)[kept]
+    aligned['symbol_y'] = df2['symbol'].iloc[0] if len(df2) else ''
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        aligned[f'{col}_2'] = df2[col].to_numpy(dtype=np.float64)[rows2]
+    return aligned
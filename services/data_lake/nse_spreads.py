@@ -2,11 +2,18 @@ import pandas as pd
 import numpy as np
 import psycopg2
 from datetime import datetime, timedelta
-from services.data_lake.spreads_helper import SpreadCalculator
+from services.data_lake.spreads_helper import SpreadCalculator, get_spread_mode
+from services.data_lake.spread_state import load_rolling_state, save_rolling_state, delete_rolling_state
+from services.data_lake.price_cache import get_price_cache
 from services.config import redis_connection
-from psycopg2.extras import execute_values
+from services.data_lake.bulk_writer import bulk_upsert
+from services.data_lake.watermarks import get_watermarks
+from services.data_lake.backfill_scheduler import load_spread_rebuilds, clear_spread_rebuild
+from services.data_lake.trading_calendar import NSE_CALENDAR
 
 redis_client = redis_connection()
+price_cache = get_price_cache("public.nse_stocks")
+spread_watermarks = get_watermarks("public.nse_spreads")
 
 def get_db_connection():
     return psycopg2.connect(dbname="trading_system", user="postgres", password="onealpha12345", host="localhost", port=5432)
@@ -18,51 +25,13 @@ def get_cached_ohlc_data(symbol, start=None, end=None):
     symbol = symbol.upper()
     start_time = start or datetime(2016, 1, 1)
     end_time = end or now_ist()
-    query = """
-        SELECT symbol, timestamp, open, high, low, close, volume
-        FROM public.nse_stocks
-        WHERE symbol = %s AND timestamp >= %s AND timestamp < %s
-        ORDER BY timestamp ASC
-    """
-    with get_db_connection() as conn, conn.cursor() as cur:
-        cur.execute(query, (symbol, start_time, end_time))
-        df = pd.DataFrame(cur.fetchall(), columns=['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    if df.empty:
-        return df
-    df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df.sort_values("timestamp")
+    return price_cache.frame(symbol, start_time, end_time)
 
 def get_last_spread_timestamp(pair_name):
-    query = """
-        SELECT timestamp FROM public.nse_spreads
-        WHERE symbol = %s ORDER BY timestamp DESC LIMIT 1
-    """
-    with get_db_connection() as conn, conn.cursor() as cur:
-        cur.execute(query, (pair_name,))
-        result = cur.fetchone()
-    return result[0] if result else None
+    return spread_watermarks.get(pair_name)
 
 def subtract_nse_minutes(start_datetime, minutes):
-    current = start_datetime
-    remaining_minutes = minutes
-    while remaining_minutes > 0:
-        # Check if current time is within NSE market hours (Monday to Friday, 9:15 AM to 3:30 PM)
-        is_weekday = current.weekday() < 5  # Monday=0, Sunday=6
-        is_market_hours = current.time() >= datetime.strptime("09:15", "%H:%M").time() and current.time() <= datetime.strptime("15:30", "%H:%M").time()
-        
-        if is_weekday and is_market_hours:
-            remaining_minutes -= 1
-        current -= timedelta(minutes=1)
-        
-        # Skip to previous market day if outside market hours
-        if not is_weekday or current.time() < datetime.strptime("09:15", "%H:%M").time():
-            current = current.replace(hour=15, minute=30, second=0, microsecond=0)
-            if current.weekday() >= 5:  # If Saturday/Sunday, move to Friday
-                current -= timedelta(days=current.weekday() - 4)
-            else:
-                current -= timedelta(days=1)
-    return current
+    return NSE_CALENDAR.subtract(start_datetime, minutes)
 
 def ensure_window_data_availability(sym1, sym2, pair_name, window):
     last_spread = get_last_spread_timestamp(pair_name)
@@ -82,16 +51,7 @@ def insert_spread_data_to_db(spread_df, pair_name):
         return
         
     spread_df['symbol'] = pair_name.lower()
-    
-    insert_query = """
-        INSERT INTO public.nse_spreads (symbol, timestamp, open, high, low, close, volume, slope)
-        VALUES %s ON CONFLICT (symbol, timestamp) DO NOTHING
-    """
-    data_tuples = spread_df[['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'slope']].values.tolist()
-    
-    with get_db_connection() as conn, conn.cursor() as cur:
-        execute_values(cur, insert_query, data_tuples)
-        conn.commit()
+    bulk_upsert("public.nse_spreads", spread_df)
 
 def delete_spreads_name():
     redis_client.delete('spreads:nse_spreads_name')
@@ -101,32 +61,75 @@ def save_spread_symbol_to_db(spread_symbols):
         cleaned = np.array([symbol.replace(':', '').lower() for symbol in ([spread_symbols] if isinstance(spread_symbols, str) else spread_symbols)])
         redis_client.sadd('spreads:nse_spreads_name', *cleaned)
 
-def fill_historical_gaps(pair_name):
+def fill_historical_gaps(pair_name, state=None, rebuild=False):
+    """
+    Spreads after the pair's last stored one, or with rebuild the ones up to
+    it, recomputed from the start of the lookback so history added behind
+    the table is covered (existing rows are kept as they are).
+    """
     calculator = SpreadCalculator("nse")
     sym1, sym2 = pair_name.split("_")
     window = int(redis_client.hget("account_matrix:account", "window"))
-    lookback_start = ensure_window_data_availability(sym1, sym2, pair_name, window + 5000)
     last_spread = get_last_spread_timestamp(pair_name)
+    if rebuild and last_spread is not None:
+        lookback_start = datetime(2023, 1, 1)
+    else:
+        rebuild = False
+        lookback_start = ensure_window_data_availability(sym1, sym2, pair_name, window + 5000)
     new_start = last_spread + timedelta(minutes=1) if last_spread else lookback_start
     df1 = get_cached_ohlc_data(sym1, start=lookback_start)
     df2 = get_cached_ohlc_data(sym2, start=lookback_start)
     if df1.empty or df2.empty:
         return
-    spread_data = calculator.calculate_historical_spread(df1, df2, window)
+    spread_data = calculator.calculate_historical_spread(df1, df2, window, state=state)
     spread_data = spread_data.iloc[2:] # Skip the first row to useless data
     # print(f"Historical gaps filled for {pair_name} with {len(spread_data)} records")
     print(spread_data.tail())
+    stored_until = last_spread
     if not spread_data.empty:
-        if last_spread:
+        if rebuild:
+            spread_data = spread_data[spread_data['timestamp'] <= last_spread]
+        elif last_spread:
             spread_data = spread_data[spread_data['timestamp'] > last_spread]
         if not spread_data.empty:
             pass
             insert_spread_data_to_db(spread_data, pair_name)
+            if not rebuild:
+                stored_until = spread_data['timestamp'].iloc[-1]
+    # Only keep the rolling state if it ends where the table now ends
+    if state is not None and state.is_continuation_of(stored_until, calculator.window, calculator.hedge_model):
+        save_rolling_state(redis_client, "nse", pair_name, state)
+    elif stored_until != last_spread:
+        # Spreads moved on without the state: drop it so the live feed stops hedging with it
+        delete_rolling_state(redis_client, "nse", pair_name)
+
+def fill_incremental_gaps(pair_name):
+    calculator = SpreadCalculator("nse")
+    sym1, sym2 = pair_name.split("_")
+    last_spread = get_last_spread_timestamp(pair_name)
+    state = load_rolling_state(redis_client, "nse", pair_name)
+    if state is None or not state.is_continuation_of(last_spread, calculator.window, calculator.hedge_model):
+        # No usable state: recompute once from history and persist the state
+        return fill_historical_gaps(pair_name, state=calculator.new_hedge_model(sym1.upper(), sym2.upper()))
+
+    start = state.last_timestamp.to_pydatetime() + timedelta(minutes=1)
+    df1 = get_cached_ohlc_data(sym1, start=start)
+    df2 = get_cached_ohlc_data(sym2, start=start)
+    spread_data = calculator.calculate_incremental_spread(state, df1, df2)
+    if not spread_data.empty:
+        insert_spread_data_to_db(spread_data, pair_name)
+    save_rolling_state(redis_client, "nse", pair_name, state)
 
 def process_nse_spreads(sym1, sym2):
     print(f"Processing NSE spreads for {sym1} and {sym2}")
     calculator = SpreadCalculator("nse")
     pair_name = calculator.generate_pair_name(sym1, sym2)
     save_spread_symbol_to_db(pair_name)
-    fill_historical_gaps(pair_name)
+    if pair_name in load_spread_rebuilds(redis_client, "nse"):
+        fill_historical_gaps(pair_name, rebuild=True)
+        clear_spread_rebuild(redis_client, "nse", [pair_name])
+    if get_spread_mode(redis_client) == "incremental":
+        fill_incremental_gaps(pair_name)
+    else:
+        fill_historical_gaps(pair_name)
     return True
\ No newline at end of file
@@ -0,0 +1,419 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from services.db_config import get_db_connection
+from services.config import redis_connection
+from services.data_lake.minute_index import to_epoch_minutes, from_epoch_minutes, to_epoch_minute
+
+OHLCV = ('open', 'high', 'low', 'close', 'volume')
+SPREAD_COLUMNS = OHLCV + ('slope',)
+
+MAX_AGE_MINUTES = int(os.getenv("PRICE_CACHE_MAX_AGE_MINUTES", 60 * 24 * 30))
+MAX_BYTES = int(os.getenv("PRICE_CACHE_MAX_MB", 512)) * 1024 * 1024
+REFRESH_TTL_SECONDS = float(os.getenv("PRICE_CACHE_REFRESH_TTL", 15))
+# Per-symbol counters bumped by writes at or behind a symbol's last row, so the
+# caches of other processes (the chart's) drop history refresh() cannot fix
+REWRITE_VERSION_KEY = "price_cache:rewrites:{table}"
+
+redis_client = redis_connection()
+
+class SymbolSeries:
+    """
+    Append-only columnar history of one symbol: an int64 epoch-minute index and
+    a (columns, rows) float64 block, both backed by buffers that grow by
+    doubling so a new bar per minute does not copy the whole history.
+    """
+    def __init__(self, width):
+        self._minutes = np.empty(0, dtype=np.int64)
+        self._values = np.empty((width, 0), dtype=np.float64)
+        self._start = 0
+        self._stop = 0
+        self.loaded_from = None
+        self.refreshed_at = 0.0
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @property
+    def minutes(self):
+        return self._minutes[self._start:self._stop]
+
+    @property
+    def values(self):
+        return self._values[:, self._start:self._stop]
+
+    @property
+    def watermark(self):
+        return int(self._minutes[self._stop - 1]) if len(self) else None
+
+    @property
+    def nbytes(self):
+        return self._minutes.nbytes + self._values.nbytes
+
+    def append(self, minutes, values):
+        if self.watermark is not None:
+            newer = minutes > self.watermark
+            minutes, values = minutes[newer], values[:, newer]
+        count = len(minutes)
+        if not count:
+            return
+        if self._stop + count > len(self._minutes):
+            live = len(self)
+            capacity = max(2 * (live + count), 1024)
+            grown_minutes = np.empty(capacity, dtype=np.int64)
+            grown_values = np.empty((self._values.shape[0], capacity), dtype=np.float64)
+            grown_minutes[:live] = self.minutes
+            grown_values[:, :live] = self.values
+            self._minutes, self._values = grown_minutes, grown_values
+            self._start, self._stop = 0, live
+        self._minutes[self._stop:self._stop + count] = minutes
+        self._values[:, self._stop:self._stop + count] = values
+        self._stop += count
+
+    def prepend(self, minutes, values):
+        if len(self):
+            older = minutes < self.minutes[0]
+            minutes, values = minutes[older], values[:, older]
+        if not len(minutes):
+            return
+        merged_minutes = np.concatenate([minutes, self.minutes])
+        merged_values = np.concatenate([values, self.values], axis=1)
+        self._minutes, self._values = merged_minutes, np.ascontiguousarray(merged_values)
+        self._start, self._stop = 0, len(merged_minutes)
+
+    def trim(self, oldest):
+        self._start += int(np.searchsorted(self.minutes, oldest, side='left'))
+        if self.loaded_from is not None:
+            self.loaded_from = max(self.loaded_from, oldest)
+
+    def slice(self, lo, hi):
+        minutes = self.minutes
+        i, j = np.searchsorted(minutes, [lo, hi], side='left')
+        return minutes[i:j].copy(), self.values[:, i:j].copy()
+
+class PriceCache:
+    """
+    Process-wide cache of one bar table (binance_stocks, nse_spreads, ...)
+    keyed by symbol. A symbol's history is loaded once from the requested
+    start; after that only rows newer than its watermark are pulled, for all
+    cached symbols in a single query. History older than max_age_minutes is
+    never cached and symbols are evicted least-recently-used past max_bytes.
+    Rows written behind the watermark are picked up by dropping the symbol:
+    in this process through invalidate_written(), from other processes
+    through the rewrite versions read at most once per refresh_ttl.
+    """
+    def __init__(self, table, columns=OHLCV, max_age_minutes=MAX_AGE_MINUTES, max_bytes=MAX_BYTES,
+                 refresh_ttl=REFRESH_TTL_SECONDS):
+        self.table = table
+        self.columns = tuple(columns)
+        self.max_age_minutes = max_age_minutes
+        self.max_bytes = max_bytes
+        self.refresh_ttl = refresh_ttl
+        self.tz = None
+        self._tz_known = False
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = None
+        self._versions_checked = 0.0
+
+    def _query(self, symbols, start=None, end=None, newest=None):
+        """Rows for `symbols` as (symbols, minutes, values); bounds are datetimes."""
+        cols = ", ".join(self.columns)
+        clauses, params = ["symbol = ANY(%s)"], [list(symbols)]
+        if start is not None:
+            clauses.append("timestamp >= %s")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp < %s")
+            params.append(end)
+        query = f"SELECT symbol, timestamp, {cols} FROM {self.table} WHERE {' AND '.join(clauses)}"
+        if newest is not None:
+            query += " ORDER BY timestamp DESC LIMIT %s"
+            params.append(newest)
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        return self._parse(rows)
+
+    def _query_tails(self, symbols, count):
+        """The newest `count` rows of each of `symbols` in one query, shaped like _query's result."""
+        cols = ", ".join(self.columns)
+        query = f"""
+            SELECT s.symbol, t.timestamp, {", ".join(f"t.{c}" for c in self.columns)}
+            FROM unnest(%s::text[]) AS s(symbol)
+            CROSS JOIN LATERAL (
+                SELECT timestamp, {cols} FROM {self.table}
+                WHERE symbol = s.symbol
+                ORDER BY timestamp DESC
+                LIMIT %s
+            ) t
+        """
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(query, (list(symbols), count))
+            rows = cur.fetchall()
+        return self._parse(rows)
+
+    def _parse(self, rows):
+        if not rows:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.int64), np.empty((len(self.columns), 0))
+        symbol_col, ts_col, *value_cols = zip(*rows)
+        minutes, tz = to_epoch_minutes(ts_col)
+        if not self._tz_known:
+            self.tz, self._tz_known = tz, True
+        values = np.array(value_cols, dtype=np.float64)
+        order = np.lexsort((minutes, np.asarray(symbol_col)))
+        return np.asarray(symbol_col)[order], minutes[order], values[:, order]
+
+    def _bound(self, minute):
+        """Query parameter for an epoch minute in the table's own timezone convention."""
+        return from_epoch_minutes([minute], self.tz)[0].to_pydatetime()
+
+    def _now_minute(self):
+        return to_epoch_minute(datetime.now(), self.tz)
+
+    def _touch(self, symbol):
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = SymbolSeries(len(self.columns))
+        self._series.move_to_end(symbol)
+        return series
+
+    def _check_rewrites(self):
+        """Drop symbols whose rewrite version moved since the last check (one HGETALL)."""
+        now = time.monotonic()
+        if now - self._versions_checked < self.refresh_ttl:
+            return
+        self._versions_checked = now
+        try:
+            versions = load_rewrite_versions(redis_client, self.table)
+        except Exception as e:
+            print(f"[CACHE] Could not read {self.table} rewrite versions: {e}")
+            return
+        with self._lock:
+            if self._versions is not None:
+                for symbol, version in versions.items():
+                    if version != self._versions.get(symbol):
+                        self._series.pop(symbol, None)
+            self._versions = versions
+
+    def refresh(self, symbols=None):
+        """Pull rows newer than each symbol's watermark, one query for all of them."""
+        self._check_rewrites()
+        with self._lock:
+            symbols = [s for s in (symbols or list(self._series)) if s in self._series]
+            since = [self._series[s].watermark + 1 if self._series[s].watermark is not None else self._series[s].loaded_from
+                     for s in symbols]
+            since = [m for m in since if m is not None]
+        if not symbols or not since:
+            return
+        sym_col, minutes, values = self._query(symbols, start=self._bound(min(since)))
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                series = self._series.get(symbol)
+                if series is None:
+                    continue
+                mask = sym_col == symbol
+                series.append(minutes[mask], values[:, mask])
+                series.refreshed_at = now
+            self._evict()
+
+    def arrays(self, symbol, start, end=None):
+        """(minutes, values) for start <= timestamp < end, values shaped (columns, rows)."""
+        if not self._tz_known:
+            self._query([symbol], newest=1)
+        self._check_rewrites()
+        lo = to_epoch_minute(start, self.tz, ceil=True)
+        hi = to_epoch_minute(end, self.tz, ceil=True) if end is not None else np.iinfo(np.int64).max
+
+        if lo < self._now_minute() - self.max_age_minutes:
+            # Too old to keep resident; serve straight from the table
+            _, minutes, values = self._query([symbol], start=start, end=end)
+            return minutes, values
+
+        with self._lock:
+            series = self._touch(symbol)
+            missing_from = series.loaded_from
+        if missing_from is None or lo < missing_from:
+            _, minutes, values = self._query([symbol], start=self._bound(lo),
+                                             end=self._bound(missing_from) if missing_from is not None else None)
+            with self._lock:
+                series = self._touch(symbol)
+                if series.loaded_from is None:
+                    series.append(minutes, values)
+                    series.refreshed_at = time.monotonic()
+                else:
+                    series.prepend(minutes, values)
+                # An empty answer proves nothing about the range: ask again next time
+                if len(minutes):
+                    series.loaded_from = lo if series.loaded_from is None else min(series.loaded_from, lo)
+                self._evict()
+        elif time.monotonic() - series.refreshed_at > self.refresh_ttl:
+            self.refresh([symbol])
+
+        with self._lock:
+            return self._touch(symbol).slice(lo, hi)
+
+    def _to_frame(self, symbol, minutes, values):
+        if not len(minutes):
+            return pd.DataFrame()
+        df = pd.DataFrame({'symbol': symbol, 'timestamp': from_epoch_minutes(minutes, self.tz)})
+        for i, col in enumerate(self.columns):
+            df[col] = values[i]
+        return df
+
+    def frame(self, symbol, start, end=None):
+        """Same shape as the get_cached_ohlc_data DataFrames, served from the cache."""
+        return self._to_frame(symbol, *self.arrays(symbol, start, end))
+
+    def tail(self, symbol, count):
+        """The newest `count` rows of a symbol as a DataFrame."""
+        self._check_rewrites()
+        with self._lock:
+            series = self._series.get(symbol)
+            enough = series is not None and len(series) >= count
+        if not enough:
+            _, minutes, values = self._query([symbol], newest=count)
+            resident = False
+            if len(minutes):
+                with self._lock:
+                    series = self._touch(symbol)
+                    resident = series.watermark is not None
+                    if resident:
+                        series.prepend(minutes, values)
+                    else:
+                        series.append(minutes, values)
+                        series.refreshed_at = time.monotonic()
+                    series.loaded_from = int(minutes[0]) if series.loaded_from is None else min(series.loaded_from, int(minutes[0]))
+                    self._evict()
+            if resident:
+                # Rows past the resident watermark come from refresh(), which leaves no hole before them
+                self.refresh([symbol])
+        else:
+            with self._lock:
+                stale = time.monotonic() - self._touch(symbol).refreshed_at > self.refresh_ttl
+            if stale:
+                self.refresh([symbol])
+
+        with self._lock:
+            series = self._series.get(symbol)
+            if series is None:
+                return self._to_frame(symbol, np.empty(0, dtype=np.int64), np.empty((len(self.columns), 0)))
+            return self._to_frame(symbol, series.minutes[-count:].copy(), series.values[:, -count:].copy())
+
+    def tails(self, symbols, count, column='close'):
+        """
+        (last_minutes, matrix): the newest `count` values of `column` of every
+        symbol as a (symbols, count) float64 matrix, newest bar last and
+        NaN-padded on the left, plus each symbol's newest epoch minute (-1
+        when it has no rows). Symbols not resident with `count` rows are loaded
+        in one query and stale ones refreshed in one query, whatever their number.
+        """
+        self._check_rewrites()
+        now = time.monotonic()
+        with self._lock:
+            short = [s for s in symbols if s not in self._series or len(self._series[s]) < count]
+            stale = [s for s in symbols if s in self._series and s not in short
+                     and now - self._series[s].refreshed_at > self.refresh_ttl]
+        if short:
+            sym_col, minutes, values = self._query_tails(short, count)
+            with self._lock:
+                for symbol in short:
+                    mask = sym_col == symbol
+                    if not mask.any():
+                        continue
+                    series = self._touch(symbol)
+                    if series.watermark is not None:
+                        # Newer rows than the resident ones are left to refresh(), as in tail()
+                        series.prepend(minutes[mask], values[:, mask])
+                        stale.append(symbol)
+                    else:
+                        series.append(minutes[mask], values[:, mask])
+                        series.refreshed_at = now
+                    oldest = int(minutes[mask][0])
+                    series.loaded_from = oldest if series.loaded_from is None else min(series.loaded_from, oldest)
+                self._evict()
+        if stale:
+            self.refresh(stale)
+
+        row = self.columns.index(column)
+        matrix = np.full((len(symbols), count), np.nan)
+        last_minutes = np.full(len(symbols), -1, dtype=np.int64)
+        with self._lock:
+            for i, symbol in enumerate(symbols):
+                series = self._series.get(symbol)
+                if series is None or not len(series):
+                    continue
+                tail = series.values[row, -count:]
+                matrix[i, count - len(tail):] = tail
+                last_minutes[i] = series.watermark
+        return last_minutes, matrix
+
+    def invalidate_written(self, symbols, minutes):
+        """
+        Drop the resident history of every symbol that rows were just written
+        inside of (at or behind its watermark), so the next read reloads it
+        from the table. Rows past the watermark are left to refresh().
+        """
+        written = pd.DataFrame({'symbol': symbols, 'minute': minutes}).groupby('symbol')['minute'].agg(['min', 'max'])
+        with self._lock:
+            for symbol, (oldest, newest) in written.iterrows():
+                series = self._series.get(symbol)
+                if series is None or series.watermark is None:
+                    continue
+                first = series.loaded_from if series.loaded_from is not None else int(series.minutes[0])
+                if oldest <= series.watermark and newest >= first:
+                    del self._series[symbol]
+
+    def _evict(self):
+        oldest = self._now_minute() - self.max_age_minutes
+        for series in self._series.values():
+            series.trim(oldest)
+        while len(self._series) > 1 and sum(s.nbytes for s in self._series.values()) > self.max_bytes:
+            self._series.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "table": self.table,
+                "symbols": len(self._series),
+                "rows": sum(len(s) for s in self._series.values()),
+                "bytes": sum(s.nbytes for s in self._series.values()),
+            }
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def invalidate_written(table, symbols, timestamps):
+    """Tell the table's cache, if this process has one, which rows were written."""
+    with _caches_lock:
+        cache = _caches.get(table)
+    if cache is not None:
+        minutes, _ = to_epoch_minutes(timestamps)
+        cache.invalidate_written(np.asarray(symbols), minutes)
+
+def publish_rewritten(table, symbols):
+    """Bump the rewrite version of symbols that rows were written at or behind the last row of."""
+    try:
+        pipe = redis_client.pipeline()
+        for symbol in symbols:
+            pipe.hincrby(REWRITE_VERSION_KEY.format(table=table), symbol, 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"[CACHE] Could not publish {table} rewrites: {e}")
+
+def load_rewrite_versions(redis_client, table):
+    mapping = redis_client.hgetall(REWRITE_VERSION_KEY.format(table=table))
+    return {k.decode('utf-8'): int(v) for k, v in mapping.items()}
+
+def get_price_cache(table, columns=OHLCV):
+    """The process-wide PriceCache for a table, created on first use."""
+    with _caches_lock:
+        cache = _caches.get(table)
+        if cache is None:
+            cache = _caches[table] = PriceCache(table, columns)
+        return cache
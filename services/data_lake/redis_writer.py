@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+import numpy as np
+
+FLUSH_INTERVAL_MS = float(os.getenv("LIVE_FEED_FLUSH_MS", 5))
+FLUSH_MAX_PENDING = int(os.getenv("LIVE_FEED_FLUSH_MAX_PENDING", 500))
+METRICS_KEY = "live_feed:writer_metrics"
+METRICS_INTERVAL_S = 5.0
+LATENCY_SAMPLES = 1000
+
+class CoalescingWriter:
+    """
+    Write-behind for hot Redis hash fields (live LTPs and spreads). hset()
+    only records the value, so a field updated many times between flushes is
+    written once with its last value. run() flushes everything pending as one
+    pipeline of multi-field HSETs every interval_ms, or as soon as max_pending
+    fields are waiting, in a worker thread so the event loop never waits on
+    Redis. A failed flush puts its fields back unless newer values arrived.
+
+    metrics(): updates received, fields written, conflation ratio (updates
+    per written field), flush count and flush latency (ms, last/mean/p99/max
+    over recent flushes); published to METRICS_KEY under `name`.
+
+    xadd() queues a stream entry instead; entries are never conflated, go
+    out in the next pipeline in order and wake the flush loop at once.
+
+    An update may carry an `origin` describing where its value came from;
+    after a successful flush on_commit(origins, committed_ns) gets the
+    origins of the values that flush wrote and the epoch ns it returned.
+    """
+    def __init__(self, redis_client, name, interval_ms=FLUSH_INTERVAL_MS, max_pending=FLUSH_MAX_PENDING,
+                 on_commit=None):
+        self.redis = redis_client
+        self.name = name
+        self.on_commit = on_commit
+        self.interval = interval_ms / 1000.0
+        self.max_pending = max_pending
+        self.pending = {}
+        self.pending_fields = 0
+        self.origins = {}
+        self.entries = []
+        self.updates = 0
+        self.written = 0
+        self.stream_entries = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.published = 0.0
+        self._wake = None
+
+    def hset(self, key, field, value, origin=None):
+        fields = self.pending.setdefault(key, {})
+        if field not in fields:
+            self.pending_fields += 1
+        fields[field] = value
+        if origin is not None:
+            self.origins[(key, field)] = origin
+        self.updates += 1
+        if self.pending_fields >= self.max_pending and self._wake is not None:
+            self._wake.set()
+
+    def xadd(self, key, fields, maxlen=None):
+        self.entries.append((key, fields, maxlen))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _take(self):
+        batch, self.pending, self.pending_fields = self.pending, {}, 0
+        origins, self.origins = self.origins, {}
+        entries, self.entries = self.entries, []
+        return batch, origins, entries
+
+    def _restore(self, batch, origins, entries):
+        self.entries[:0] = entries
+        for key, fields in batch.items():
+            newer = self.pending.get(key, {})
+            for field, value in fields.items():
+                if field not in newer:
+                    newer[field] = value
+                    self.pending_fields += 1
+                    if (key, field) in origins:
+                        self.origins[(key, field)] = origins[(key, field)]
+            self.pending[key] = newer
+
+    def _write(self, batch, metrics=None, entries=()):
+        started = time.perf_counter()
+        pipe = self.redis.pipeline(transaction=False)
+        for key, fields, maxlen in entries:
+            pipe.xadd(key, fields, maxlen=maxlen, approximate=True)
+        for key, fields in batch.items():
+            pipe.hset(key, mapping=fields)
+        if metrics is not None:
+            pipe.hset(METRICS_KEY, self.name, json.dumps(metrics))
+        pipe.execute()
+        return time.perf_counter() - started, time.time_ns()
+
+    def _record(self, batch, seconds, committed_ns, origins, entries):
+        self.flushes += 1
+        self.written += sum(len(fields) for fields in batch.values())
+        self.stream_entries += len(entries)
+        self.latencies.append(seconds * 1000.0)
+        if self.on_commit is not None and origins:
+            try:
+                self.on_commit(origins.values(), committed_ns)
+            except Exception as e:
+                print(f"[REDIS] {self.name} on_commit failed: {e}")
+
+    def _due_metrics(self):
+        now = time.monotonic()
+        if now - self.published < METRICS_INTERVAL_S:
+            return None
+        self.published = now
+        return self.metrics()
+
+    def flush(self):
+        """Write everything pending now, from the calling thread."""
+        batch, origins, entries = self._take()
+        if batch or entries:
+            seconds, committed_ns = self._write(batch, entries=entries)
+            self._record(batch, seconds, committed_ns, origins, entries)
+
+    async def _flush_async(self):
+        batch, origins, entries = self._take()
+        metrics = self._due_metrics()
+        if not batch and not entries and metrics is None:
+            return
+        try:
+            seconds, committed_ns = await asyncio.to_thread(self._write, batch, metrics, entries)
+        except Exception as e:
+            self.failed_flushes += 1
+            print(f"[REDIS] {self.name} flush of {sum(len(f) for f in batch.values())} fields "
+                  f"and {len(entries)} stream entries failed: {e}")
+            self._restore(batch, origins, entries)
+            return
+        if batch or entries:
+            self._record(batch, seconds, committed_ns, origins, entries)
+
+    async def run(self):
+        """Flush loop; start it as a task on the loop that calls hset()."""
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush_async()
+
+    def metrics(self):
+        latencies = np.fromiter(self.latencies, dtype=np.float64)
+        stat = lambda f: round(float(f(latencies)), 3) if len(latencies) else None
+        return {
+            "updates": self.updates,
+            "written": self.written,
+            "conflation_ratio": round(self.updates / self.written, 3) if self.written else None,
+            "stream_entries": self.stream_entries,
+            "pending": self.pending_fields,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flush_ms_last": stat(lambda x: x[-1]),
+            "flush_ms_mean": stat(np.mean),
+            "flush_ms_p99": stat(lambda x: np.percentile(x, 99)),
+            "flush_ms_max": stat(np.max),
+            "updated": int(time.time()),
+        }
+
+def load_writer_metrics(redis_client):
+    mapping = redis_client.hgetall(METRICS_KEY)
+    return {k.decode(): json.loads(v) for k, v in mapping.items()}
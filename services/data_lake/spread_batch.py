@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from services.config import redis_connection, config
+from services.data_lake.minute_index import to_epoch_minutes, from_epoch_minutes
+from services.data_lake.price_cache import get_price_cache
+from services.data_lake.bulk_writer import bulk_upsert
+from services.data_lake.watermarks import get_watermarks
+from services.data_lake.spread_state import delete_rolling_states
+from services.data_lake.backfill_scheduler import load_spread_rebuilds, clear_spread_rebuild
+from services.data_lake.spread_matrix import OHLC, build_price_matrix, align_pairs, batch_spread_ohlc
+from services.data_lake import crypto_spreds, nse_spreads
+
+redis_client = redis_connection()
+
+EXCHANGES = {
+    "binance": {"stocks": "public.binance_stocks", "spreads": "public.binance_spreads", "module": crypto_spreds},
+    "nse": {"stocks": "public.nse_stocks", "spreads": "public.nse_spreads", "module": nse_spreads},
+}
+
+def get_last_spread_timestamps(exchange, pair_names):
+    return get_watermarks(EXCHANGES[exchange]['spreads']).get_many(pair_names)
+
+def load_symbol_bars(exchange, symbols, start):
+    """Long-format OHLC of all symbols from start, read through the shared price cache."""
+    cache = get_price_cache(EXCHANGES[exchange]['stocks'])
+    end = datetime.now().replace(second=0, microsecond=0)
+    cache.refresh(symbols)
+    parts = [(sym, *cache.arrays(sym, start, end)) for sym in symbols]
+    parts = [(sym, minutes, values) for sym, minutes, values in parts if len(minutes)]
+    if not parts:
+        return None
+    symbol_col = np.concatenate([np.full(len(minutes), sym, dtype=object) for sym, minutes, _ in parts])
+    minutes = np.concatenate([minutes for _, minutes, _ in parts])
+    values = np.concatenate([values[:4] for _, _, values in parts], axis=1).T
+    return symbol_col, minutes, values, cache.tz
+
+def compute_batch_spreads(pairs, grid, matrix, universe, tz, last_spreads, window, min_periods, skip=2,
+                          model="rolling_ols", model_params=None):
+    """
+    Spread rows for every pair in one pass over the shared price matrix.
+    Mirrors fill_historical_gaps: drops pairs with fewer than min_periods
+    merged rows, skips the first `skip` hedged rows and keeps only rows newer
+    than each pair's last stored spread.
+    """
+    position = {sym: i for i, sym in enumerate(universe)}
+    leg1 = [position[a] for a, _, _ in pairs]
+    leg2 = [position[b] for _, b, _ in pairs]
+    rows, count, leg1_ohlc, leg2_ohlc = align_pairs(grid, matrix, leg1, leg2)
+    hedge, spread = batch_spread_ohlc(leg1_ohlc, leg2_ohlc, window, model, **(model_params or {}))
+
+    minutes = grid[rows]
+    hedged = ~np.isnan(hedge) & ~np.isnan(spread).any(axis=0)
+    keep = hedged & (np.cumsum(hedged, axis=0) > skip) & (count >= min_periods)[None, :]
+    cutoff = np.array([
+        to_epoch_minutes([last_spreads[name]])[0][0] if last_spreads.get(name) is not None else np.iinfo(np.int64).min
+        for _, _, name in pairs
+    ])
+    keep &= minutes > cutoff[None, :]
+
+    t_sel, p_sel = np.nonzero(keep)
+    if len(t_sel) == 0:
+        return pd.DataFrame()
+    result = pd.DataFrame({
+        "symbol": np.array([name for _, _, name in pairs])[p_sel],
+        "timestamp": from_epoch_minutes(minutes[t_sel, p_sel], tz),
+        **{col: spread[i, t_sel, p_sel] for i, col in enumerate(OHLC)},
+        "volume": 0,
+        "slope": hedge[t_sel, p_sel],
+    })
+    return result.sort_values(["symbol", "timestamp"]).reset_index(drop=True)
+
+def insert_batch_spreads(exchange, spread_df):
+    print(f"Inserting {len(spread_df)} batched spread records into {EXCHANGES[exchange]['spreads']}")
+    if spread_df.empty:
+        return
+    bulk_upsert(EXCHANGES[exchange]['spreads'], spread_df)
+    # Batch spreads do not continue any persisted hedge state; drop it so it is not used live
+    delete_rolling_states(redis_client, exchange, spread_df['symbol'].unique().tolist())
+
+def process_batch_spreads(exchange, symbol_pairs):
+    """
+    Spreads for all pairs of an exchange from one load of the union of their
+    symbols. Pairs without any stored spread yet need their full history and
+    go through the per-pair path once, as do pairs whose legs' history lane
+    completed since (to backfill spreads behind their first stored one) and
+    pairs lagging more than the lookback behind the freshest, so the shared
+    load spans at most two lookbacks.
+    """
+    module = EXCHANGES[exchange]["module"]
+    pairs = [(a.upper(), b.upper(), f"{a.replace(':', '').lower()}_{b.replace(':', '').lower()}") for a, b in symbol_pairs]
+    if not pairs:
+        return
+    module.save_spread_symbol_to_db([name for _, _, name in pairs])
+
+    ols_window = config['params']['window']
+    window = int(redis_client.hget("account_matrix:account", "window"))
+    last_spreads = get_last_spread_timestamps(exchange, [name for _, _, name in pairs])
+
+    cold = [p for p in pairs if last_spreads.get(p[2]) is None]
+    warm = [p for p in pairs if last_spreads.get(p[2]) is not None]
+    for _, _, name in cold:
+        module.fill_historical_gaps(name)
+    flagged = load_spread_rebuilds(redis_client, exchange)
+    for _, _, name in warm:
+        if name in flagged:
+            module.fill_historical_gaps(name, rebuild=True)
+    # Cold pairs were just computed from the start of the lookback
+    clear_spread_rebuild(redis_client, exchange, [name for _, _, name in pairs if name in flagged])
+    if not warm:
+        return
+
+    subtract = module.subtract_crypto_minutes if exchange == "binance" else module.subtract_nse_minutes
+    # A pair far behind the rest (a leg delisted or halted) would widen the shared
+    # load for every symbol: it goes through the per-pair path on its two legs instead
+    behind = subtract(max(last_spreads[name] for _, _, name in warm), window + 5000)
+    lagging = [p for p in warm if last_spreads[p[2]] < behind]
+    for _, _, name in lagging:
+        module.fill_historical_gaps(name)
+    warm = [p for p in warm if last_spreads[p[2]] >= behind]
+    start = min(subtract(last_spreads[name], window + 5000 + 10) for _, _, name in warm)
+    universe = sorted({sym for a, b, _ in warm for sym in (a, b)})
+    bars = load_symbol_bars(exchange, universe, start)
+    if bars is None:
+        return
+    symbols, minutes, values, tz = bars
+    grid, matrix = build_price_matrix(symbols, minutes, values, universe)
+
+    spread_df = compute_batch_spreads(warm, grid, matrix, universe, tz, last_spreads, ols_window, max(1, window // 2),
+                                      model=config['params']['hedge_model'], model_params=config['params']['hedge_params'])
+    insert_batch_spreads(exchange, spread_df)
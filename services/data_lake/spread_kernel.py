@@ -0,0 +1,60 @@
+import numpy as np
+from numba import jit
+
+# Row order of the kernel output buffer
+SPREAD_FIELDS = ['slope', 'open', 'high', 'low', 'close']
+
+@jit(nopython=True, cache=True)
+def _emit(leg1, leg2, hedge, i, out, keep, count):
+    """Write row i's spread OHLC at out[:, count] unless anything is NaN (dropna)."""
+    if hedge != hedge:
+        return count
+    for f in range(4):
+        value = leg1[f, i] - hedge * leg2[f, i]
+        if value != value:
+            return count
+        out[f + 1, count] = value
+    out[0, count] = hedge
+    keep[count] = i
+    return count + 1
+
+@jit(nopython=True, cache=True)
+def rolling_spread_ohlc(leg1, leg2, window, reanchor, out, keep):
+    """
+    No-intercept rolling OLS hedge ratio and spread OHLC in one pass.
+    leg1/leg2: (4, n) aligned open/high/low/close. Rows with a valid spread are
+    packed into out (5, n: slope, open, high, low, close) and their source row
+    numbers into keep; returns how many rows were written. The window sums are
+    rebuilt exactly every `reanchor` rows, like hedge_ratio.rolling_window_sum.
+    """
+    n = leg1.shape[1]
+    sum_xx = 0.0
+    sum_xy = 0.0
+    count = 0
+    for i in range(window - 1, n):
+        if (i - window + 1) % reanchor == 0:
+            sum_xx = 0.0
+            sum_xy = 0.0
+            for j in range(i - window + 1, i + 1):
+                sum_xx += leg2[3, j] * leg2[3, j]
+                sum_xy += leg2[3, j] * leg1[3, j]
+        else:
+            x, y = leg2[3, i], leg1[3, i]
+            old_x, old_y = leg2[3, i - window], leg1[3, i - window]
+            sum_xx += x * x - old_x * old_x
+            sum_xy += x * y - old_x * old_y
+        hedge = sum_xy / sum_xx if sum_xx != 0 else np.nan
+        count = _emit(leg1, leg2, hedge, i, out, keep, count)
+    return count
+
+@jit(nopython=True, cache=True)
+def hedge_spread_ohlc(leg1, leg2, hedge, out, keep):
+    """Spread OHLC for a precomputed hedge ratio; same output layout as rolling_spread_ohlc."""
+    count = 0
+    for i in range(leg1.shape[1]):
+        count = _emit(leg1, leg2, hedge[i], i, out, keep, count)
+    return count
+
+def spread_buffers(n):
+    """Preallocated (out, keep) buffers for the kernels."""
+    return np.empty((len(SPREAD_FIELDS), n)), np.empty(n, dtype=np.int64)
@@ -0,0 +1,71 @@
+import numpy as np
+from services.data_lake.hedge_ratio import rolling_ols, rolling_ols_intercept, kalman_filter
+
+OHLC = ['open', 'high', 'low', 'close']
+
+def build_price_matrix(symbols, minutes, values, universe):
+    """
+    Scatter long-format bars into a (4, time, symbol) float64 matrix on the
+    union minute grid. Missing bars are NaN.
+    symbols/minutes: per-row symbol name and epoch minute, values: (rows, 4) OHLC.
+    """
+    grid, t_idx = np.unique(np.asarray(minutes, dtype=np.int64), return_inverse=True)
+    position = {sym: i for i, sym in enumerate(universe)}
+    s_idx = np.fromiter((position[s] for s in symbols), dtype=np.int64, count=len(symbols))
+    matrix = np.full((len(OHLC), len(grid), len(universe)), np.nan)
+    matrix[:, t_idx, s_idx] = np.asarray(values, dtype=np.float64).T
+    return grid, matrix
+
+def align_pairs(grid, matrix, leg1, leg2, tolerance=5):
+    """
+    Vectorized equivalent of SpreadCalculator._merge_dataframes for many pairs:
+    rows are the first leg's bars, the second leg is taken backward-asof within
+    `tolerance` minutes and forward-filled after that, leading unmatched rows are
+    dropped. Each pair's surviving rows are packed to the top of the time axis so
+    rolling windows count merged rows exactly like the per-pair path.
+    Returns (rows, count, leg1_ohlc, leg2_ohlc) with rows/leg arrays shaped
+    (time, pairs) / (4, time, pairs); rows past count[p] are padding (NaN).
+    """
+    leg1 = np.asarray(leg1, dtype=np.int64)
+    leg2 = np.asarray(leg2, dtype=np.int64)
+    n = len(grid)
+    observed = ~np.isnan(matrix[3])
+    time_idx = np.arange(n)[:, None]
+
+    last_seen = np.maximum.accumulate(np.where(observed, time_idx, -1), axis=0)
+    asof = last_seen[:, leg2]
+    leg1_rows = observed[:, leg1]
+    age = grid[:, None] - grid[np.maximum(asof, 0)]
+    matched = np.where(leg1_rows & (asof >= 0) & (age <= tolerance), asof, -1)
+    # Matched second-leg rows only move forward in time, so a running max is a ffill
+    effective = np.maximum.accumulate(matched, axis=0)
+    valid = leg1_rows & (effective >= 0)
+
+    rows = np.argsort(~valid, axis=0, kind='stable')
+    count = valid.sum(axis=0)
+    padding = time_idx >= count[None, :]
+
+    leg1_ohlc = matrix[:, rows, leg1[None, :]]
+    leg2_ohlc = matrix[:, np.take_along_axis(effective, rows, axis=0).clip(0), leg2[None, :]]
+    leg1_ohlc[:, padding] = np.nan
+    leg2_ohlc[:, padding] = np.nan
+    return rows, count, leg1_ohlc, leg2_ohlc
+
+def batch_hedge_ratio(y, x, window, model="rolling_ols", delta=1e-5, ve=1e-3):
+    """Hedge ratio of every (time, pairs) column under one of the spread_state hedge models."""
+    if model == "rolling_ols":
+        return rolling_ols(y, x, window)
+    if model == "rolling_ols_intercept":
+        return rolling_ols_intercept(y, x, window)[0]
+    if model == "kalman":
+        hedge = np.full(y.shape, np.nan)
+        for p in range(y.shape[1]):
+            hedge[:, p] = kalman_filter(np.ascontiguousarray(y[:, p]), np.ascontiguousarray(x[:, p]),
+                                        delta, ve, np.zeros(2), np.eye(2), window - 1)[0]
+        return hedge
+    raise ValueError(f"Unknown hedge model '{model}'")
+
+def batch_spread_ohlc(leg1_ohlc, leg2_ohlc, window, model="rolling_ols", **params):
+    """Hedge ratio for every pair column and the spread OHLC, (4, time, pairs)."""
+    hedge = batch_hedge_ratio(leg1_ohlc[3], leg2_ohlc[3], window, model, **params)
+    return hedge, leg1_ohlc - hedge[None, :, :] * leg2_ohlc
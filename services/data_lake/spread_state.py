@@ -0,0 +1,442 @@
+import numpy as np
+import pandas as pd
+from services.data_lake.hedge_ratio import REANCHOR_INTERVAL, rolling_ols, rolling_ols_intercept, kalman_filter, _as_array
+from services.data_lake.spread_kernel import rolling_spread_ohlc, hedge_spread_ohlc
+
+STATE_KEY = "spread_state:{exchange}:{pair}"
+# pair -> counter bumped on every save/delete, so readers reload only changed states
+STATE_VERSION_KEY = "spread_state_version:{exchange}"
+
+# Order of the leg OHLC values kept in HedgeModel.last_bar
+BAR_FIELDS = ['open_1', 'high_1', 'low_1', 'close_1', 'open_2', 'high_2', 'low_2', 'close_2']
+
+DEFAULT_HEDGE_MODEL = "rolling_ols"
+
+def _decode(mapping):
+    return {(k.decode('utf-8') if isinstance(k, bytes) else k): v for k, v in mapping.items()}
+
+def _text(data, key):
+    return data[key].decode('utf-8') if isinstance(data[key], bytes) else str(data[key])
+
+class HedgeModel:
+    """
+    Per-pair hedge ratio model with a batch API (hedge ratio for a whole
+    aligned history, leaving the model positioned after its last bar) and a
+    streaming API (update() per closed bar, peek() for a bar still forming).
+    Also keeps the last merged bar so the next minute can be aligned
+    (merge_asof + ffill) without reloading history.
+    Subclasses set `name`, PARAMS (constructor keywords taken from config) and
+    `recursive` when the model is cheap and meaningful to re-evaluate per tick.
+    """
+    name = None
+    PARAMS = ()
+    recursive = False
+
+    def __init__(self, window, symbols=("", "")):
+        self.window = int(window)
+        self.symbols = tuple(symbols)
+        self.count = 0
+        self.last_timestamp = None
+        self.last_bar = None
+
+    def update(self, y, x):
+        raise NotImplementedError
+
+    def peek(self, y, x):
+        raise NotImplementedError
+
+    def batch(self, y, x):
+        raise NotImplementedError
+
+    def hedge_ratio(self):
+        raise NotImplementedError
+
+    def batch_spread(self, leg1, leg2, out, keep):
+        """
+        batch() plus the spread OHLC of (4, n) leg arrays, written into the
+        spread_kernel buffers. Returns the number of rows kept.
+        """
+        hedge = self.batch(leg1[3], leg2[3])
+        return hedge_spread_ohlc(leg1, leg2, hedge, out, keep)
+
+    def live_hedge_ratio(self, y, x):
+        """Hedge ratio for a live tick: re-estimated for recursive models, else the last closed bar's."""
+        return self.peek(y, x) if self.recursive else self.hedge_ratio()
+
+    def mark(self, row):
+        self.last_timestamp = pd.Timestamp(row["timestamp"])
+        self.last_bar = np.array([float(row[f]) for f in BAR_FIELDS])
+
+    def is_ready(self):
+        return self.count >= self.window and self.last_timestamp is not None
+
+    def is_continuation_of(self, last_spread, window, model=None):
+        """True when this state ends exactly at the last stored spread row."""
+        if not self.is_ready() or last_spread is None or self.window != int(window):
+            return False
+        if model is not None and model != self.name:
+            return False
+        last_spread = pd.Timestamp(last_spread)
+        if (last_spread.tzinfo is None) != (self.last_timestamp.tzinfo is None):
+            return False
+        return last_spread == self.last_timestamp
+
+    def _model_mapping(self):
+        return {}
+
+    def _load_model(self, data):
+        pass
+
+    def to_mapping(self):
+        mapping = {
+            "model": self.name,
+            "window": self.window,
+            "symbols": "_".join(self.symbols),
+            "count": self.count,
+            "last_timestamp": self.last_timestamp.isoformat() if self.last_timestamp is not None else "",
+            "last_bar": self.last_bar.astype(np.float64).tobytes() if self.last_bar is not None else b"",
+        }
+        mapping.update(self._model_mapping())
+        return mapping
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        data = _decode(mapping)
+        # States written before hedge models were pluggable carry no model field
+        model_cls = HEDGE_MODELS[_text(data, "model")] if data.get("model") else RollingOLSState
+        state = model_cls(int(_text(data, "window")), tuple(_text(data, "symbols").split("_", 1)))
+        state.count = int(_text(data, "count"))
+        if _text(data, "last_timestamp"):
+            state.last_timestamp = pd.Timestamp(_text(data, "last_timestamp"))
+        if data.get("last_bar"):
+            state.last_bar = np.frombuffer(data["last_bar"], dtype=np.float64).copy()
+        state._load_model(data)
+        return state
+
+class RollingOLSState(HedgeModel):
+    """
+    Rolling no-intercept OLS: a ring buffer of the last `window` (x, y)
+    closes plus the running sums of x**2 and x*y.
+    """
+    name = "rolling_ols"
+    PARAMS = ("engine",)
+
+    def __init__(self, window, symbols=("", ""), engine=rolling_ols):
+        super().__init__(window, symbols)
+        self.engine = engine
+        self.x = np.zeros(self.window)
+        self.y = np.zeros(self.window)
+        self.pos = 0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+        self.updates = 0
+
+    def update(self, y, x):
+        if self.count == self.window:
+            old_x, old_y = self.x[self.pos], self.y[self.pos]
+            self.sum_xx -= old_x * old_x
+            self.sum_xy -= old_x * old_y
+        else:
+            self.count += 1
+        self.x[self.pos] = x
+        self.y[self.pos] = y
+        self.sum_xx += x * x
+        self.sum_xy += x * y
+        self.pos = (self.pos + 1) % self.window
+        self.updates += 1
+        # Rebuild the sums once per window so float drift can't build up
+        if self.updates % self.window == 0:
+            self.reanchor()
+        return self.hedge_ratio()
+
+    def peek(self, y, x):
+        if self.count + 1 < self.window:
+            return np.nan
+        sum_xx, sum_xy = self.sum_xx + x * x, self.sum_xy + x * y
+        if self.count == self.window:
+            sum_xx -= self.x[self.pos] * self.x[self.pos]
+            sum_xy -= self.x[self.pos] * self.y[self.pos]
+        return sum_xy / sum_xx if sum_xx != 0 else np.nan
+
+    def _seed(self, y, x):
+        self.__init__(self.window, self.symbols, self.engine)
+        for y_i, x_i in zip(_as_array(y)[-self.window:], _as_array(x)[-self.window:]):
+            self.update(float(y_i), float(x_i))
+        self.reanchor()
+
+    def batch(self, y, x):
+        hedge = self.engine(y, x, self.window)
+        self._seed(y, x)
+        return hedge
+
+    def batch_spread(self, leg1, leg2, out, keep):
+        if self.engine is not rolling_ols:
+            return super().batch_spread(leg1, leg2, out, keep)
+        # Hedge ratio and spread fused in one compiled pass
+        count = rolling_spread_ohlc(leg1, leg2, self.window, REANCHOR_INTERVAL, out, keep)
+        self._seed(leg1[3], leg2[3])
+        return count
+
+    def reanchor(self):
+        self.sum_xx = float(np.dot(self.x, self.x))
+        self.sum_xy = float(np.dot(self.x, self.y))
+
+    def hedge_ratio(self):
+        if self.count < self.window or self.sum_xx == 0:
+            return np.nan
+        return self.sum_xy / self.sum_xx
+
+    def _model_mapping(self):
+        return {
+            "pos": self.pos,
+            "sum_xx": repr(self.sum_xx),
+            "sum_xy": repr(self.sum_xy),
+            "updates": self.updates,
+            "x": self.x.astype(np.float64).tobytes(),
+            "y": self.y.astype(np.float64).tobytes(),
+        }
+
+    def _load_model(self, data):
+        self.pos = int(_text(data, "pos"))
+        self.sum_xx = float(_text(data, "sum_xx"))
+        self.sum_xy = float(_text(data, "sum_xy"))
+        self.updates = int(_text(data, "updates"))
+        self.x = np.frombuffer(data["x"], dtype=np.float64).copy()
+        self.y = np.frombuffer(data["y"], dtype=np.float64).copy()
+        if len(self.x) != self.window or len(self.y) != self.window:
+            raise ValueError("Corrupt rolling state: buffer size does not match window")
+
+class RollingOLSInterceptState(HedgeModel):
+    """
+    Rolling OLS with an intercept over the last `window` bars. Sums are kept
+    relative to a reference price (re-centred on every re-anchor) so
+    n*sum(x**2) - sum(x)**2 does not lose precision at crypto price levels.
+    """
+    name = "rolling_ols_intercept"
+
+    def __init__(self, window, symbols=("", "")):
+        super().__init__(window, symbols)
+        self.x = np.zeros(self.window)
+        self.y = np.zeros(self.window)
+        self.pos = 0
+        self.updates = 0
+        self.x0 = self.y0 = 0.0
+        self.sum_u = self.sum_v = self.sum_uu = self.sum_uv = 0.0
+
+    def _add(self, y, x, sign):
+        u, v = x - self.x0, y - self.y0
+        self.sum_u += sign * u
+        self.sum_v += sign * v
+        self.sum_uu += sign * u * u
+        self.sum_uv += sign * u * v
+
+    def update(self, y, x):
+        if self.count == 0:
+            self.x0, self.y0 = x, y
+        if self.count == self.window:
+            self._add(self.y[self.pos], self.x[self.pos], -1.0)
+        else:
+            self.count += 1
+        self.x[self.pos] = x
+        self.y[self.pos] = y
+        self._add(y, x, 1.0)
+        self.pos = (self.pos + 1) % self.window
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.reanchor()
+        return self.hedge_ratio()
+
+    def reanchor(self):
+        x, y = self.x[:self.count], self.y[:self.count]
+        self.x0, self.y0 = float(x.mean()), float(y.mean())
+        u, v = x - self.x0, y - self.y0
+        self.sum_u, self.sum_v = float(u.sum()), float(v.sum())
+        self.sum_uu, self.sum_uv = float(np.dot(u, u)), float(np.dot(u, v))
+
+    def _solve(self, sum_u, sum_v, sum_uu, sum_uv):
+        n = self.window
+        denominator = n * sum_uu - sum_u * sum_u
+        if denominator <= 0:
+            return np.nan, np.nan
+        beta = (n * sum_uv - sum_u * sum_v) / denominator
+        return beta, (self.y0 + sum_v / n) - beta * (self.x0 + sum_u / n)
+
+    def hedge_ratio(self):
+        if self.count < self.window:
+            return np.nan
+        return self._solve(self.sum_u, self.sum_v, self.sum_uu, self.sum_uv)[0]
+
+    def intercept(self):
+        if self.count < self.window:
+            return np.nan
+        return self._solve(self.sum_u, self.sum_v, self.sum_uu, self.sum_uv)[1]
+
+    def peek(self, y, x):
+        if self.count + 1 < self.window:
+            return np.nan
+        u, v = x - self.x0, y - self.y0
+        sums = [self.sum_u + u, self.sum_v + v, self.sum_uu + u * u, self.sum_uv + u * v]
+        if self.count == self.window:
+            old_u, old_v = self.x[self.pos] - self.x0, self.y[self.pos] - self.y0
+            sums = [sums[0] - old_u, sums[1] - old_v, sums[2] - old_u * old_u, sums[3] - old_u * old_v]
+        return self._solve(*sums)[0]
+
+    def batch(self, y, x):
+        hedge, _ = rolling_ols_intercept(y, x, self.window)
+        self.__init__(self.window, self.symbols)
+        for y_i, x_i in zip(_as_array(y)[-self.window:], _as_array(x)[-self.window:]):
+            self.update(float(y_i), float(x_i))
+        self.reanchor()
+        return hedge
+
+    def _model_mapping(self):
+        return {
+            "pos": self.pos,
+            "updates": self.updates,
+            "ref": np.array([self.x0, self.y0]).tobytes(),
+            "sums": np.array([self.sum_u, self.sum_v, self.sum_uu, self.sum_uv]).tobytes(),
+            "x": self.x.astype(np.float64).tobytes(),
+            "y": self.y.astype(np.float64).tobytes(),
+        }
+
+    def _load_model(self, data):
+        self.pos = int(_text(data, "pos"))
+        self.updates = int(_text(data, "updates"))
+        self.x0, self.y0 = np.frombuffer(data["ref"], dtype=np.float64).tolist()
+        self.sum_u, self.sum_v, self.sum_uu, self.sum_uv = np.frombuffer(data["sums"], dtype=np.float64).tolist()
+        self.x = np.frombuffer(data["x"], dtype=np.float64).copy()
+        self.y = np.frombuffer(data["y"], dtype=np.float64).copy()
+        if len(self.x) != self.window or len(self.y) != self.window:
+            raise ValueError("Corrupt rolling state: buffer size does not match window")
+
+class KalmanHedgeState(HedgeModel):
+    """
+    Online Kalman filter hedge ratio: state [beta, alpha] follows a random
+    walk with variance delta / (1 - delta), observations y = beta*x + alpha
+    have noise variance ve. O(1) per bar or tick; the whole state is theta
+    and its 2x2 covariance. Hedge ratios are NaN for the first `window`
+    observations while the filter settles.
+    """
+    name = "kalman"
+    PARAMS = ("delta", "ve")
+    recursive = True
+
+    def __init__(self, window, symbols=("", ""), delta=1e-5, ve=1e-3):
+        super().__init__(window, symbols)
+        self.delta = float(delta)
+        self.ve = float(ve)
+        self.theta = np.zeros(2)
+        self.P = np.eye(2)
+
+    def _step(self, y, x):
+        q = self.delta / (1.0 - self.delta)
+        p00, p01 = self.P[0, 0] + q, self.P[0, 1]
+        p10, p11 = self.P[1, 0], self.P[1, 1] + q
+        ph0 = p00 * x + p01
+        ph1 = p10 * x + p11
+        s = x * ph0 + ph1 + self.ve
+        k0, k1 = ph0 / s, ph1 / s
+        e = y - (self.theta[0] * x + self.theta[1])
+        theta = (self.theta[0] + k0 * e, self.theta[1] + k1 * e)
+        P = ((p00 - k0 * ph0, p01 - k0 * ph1), (p10 - k1 * ph0, p11 - k1 * ph1))
+        return theta, P
+
+    def update(self, y, x):
+        theta, P = self._step(y, x)
+        self.theta[:] = theta
+        self.P[:] = P
+        self.count += 1
+        return self.hedge_ratio()
+
+    def peek(self, y, x):
+        if self.count + 1 < self.window:
+            return np.nan
+        return self._step(y, x)[0][0]
+
+    def batch(self, y, x):
+        self.__init__(self.window, self.symbols, self.delta, self.ve)
+        hedge, _, seen = kalman_filter(_as_array(y), _as_array(x), self.delta, self.ve,
+                                       self.theta, self.P, self.window - 1)
+        self.count = int(seen)
+        return hedge
+
+    def hedge_ratio(self):
+        return float(self.theta[0]) if self.count >= self.window else np.nan
+
+    def intercept(self):
+        return float(self.theta[1]) if self.count >= self.window else np.nan
+
+    def _model_mapping(self):
+        return {
+            "delta": repr(self.delta),
+            "ve": repr(self.ve),
+            "theta": self.theta.astype(np.float64).tobytes(),
+            "P": self.P.astype(np.float64).tobytes(),
+        }
+
+    def _load_model(self, data):
+        self.delta = float(_text(data, "delta"))
+        self.ve = float(_text(data, "ve"))
+        self.theta = np.frombuffer(data["theta"], dtype=np.float64).copy()
+        self.P = np.frombuffer(data["P"], dtype=np.float64).copy().reshape(2, 2)
+
+HEDGE_MODELS = {
+    RollingOLSState.name: RollingOLSState,
+    RollingOLSInterceptState.name: RollingOLSInterceptState,
+    KalmanHedgeState.name: KalmanHedgeState,
+}
+
+def new_hedge_model(name, window, symbols=("", ""), **params):
+    """A fresh model from the registry; params the model does not take are ignored."""
+    if name not in HEDGE_MODELS:
+        raise ValueError(f"Unknown hedge model '{name}', expected one of {list(HEDGE_MODELS)}")
+    model_cls = HEDGE_MODELS[name]
+    return model_cls(window, symbols, **{k: v for k, v in params.items() if k in model_cls.PARAMS})
+
+def load_rolling_state(redis_client, exchange, pair_name):
+    try:
+        mapping = redis_client.hgetall(STATE_KEY.format(exchange=exchange, pair=pair_name))
+        return HedgeModel.from_mapping(mapping) if mapping else None
+    except Exception as e:
+        print(f"[STATE] Could not load rolling state for {pair_name}: {e}")
+        return None
+
+def load_rolling_states(redis_client, exchange, pair_names):
+    """{pair: state or None} for many pairs in one pipelined round trip."""
+    pipe = redis_client.pipeline(transaction=False)
+    for pair_name in pair_names:
+        pipe.hgetall(STATE_KEY.format(exchange=exchange, pair=pair_name))
+    states = {}
+    for pair_name, mapping in zip(pair_names, pipe.execute()):
+        try:
+            states[pair_name] = HedgeModel.from_mapping(mapping) if mapping else None
+        except Exception as e:
+            print(f"[STATE] Could not load rolling state for {pair_name}: {e}")
+            states[pair_name] = None
+    return states
+
+def save_rolling_state(redis_client, exchange, pair_name, state):
+    key = STATE_KEY.format(exchange=exchange, pair=pair_name)
+    pipe = redis_client.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping=state.to_mapping())
+    pipe.hincrby(STATE_VERSION_KEY.format(exchange=exchange), pair_name, 1)
+    pipe.execute()
+
+def delete_rolling_state(redis_client, exchange, pair_name):
+    pipe = redis_client.pipeline()
+    pipe.delete(STATE_KEY.format(exchange=exchange, pair=pair_name))
+    pipe.hincrby(STATE_VERSION_KEY.format(exchange=exchange), pair_name, 1)
+    pipe.execute()
+
+def delete_rolling_states(redis_client, exchange, pair_names):
+    """delete_rolling_state for many pairs in one round trip."""
+    pipe = redis_client.pipeline()
+    for pair_name in pair_names:
+        pipe.delete(STATE_KEY.format(exchange=exchange, pair=pair_name))
+        pipe.hincrby(STATE_VERSION_KEY.format(exchange=exchange), pair_name, 1)
+    pipe.execute()
+
+def load_state_versions(redis_client, exchange):
+    mapping = redis_client.hgetall(STATE_VERSION_KEY.format(exchange=exchange))
+    return {k.decode('utf-8'): int(v) for k, v in mapping.items()}
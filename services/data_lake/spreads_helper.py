@@ -2,92 +2,147 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from services.config import config
+from services.data_lake.hedge_ratio import OLS_ENGINES, vectorized_ols, rolling_ols
+from services.data_lake.spread_state import HedgeModel, HEDGE_MODELS, DEFAULT_HEDGE_MODEL, new_hedge_model
+from services.data_lake.minute_index import align_legs
+from services.data_lake.spread_kernel import spread_buffers
 import warnings
 warnings.filterwarnings('ignore')
 
-def vectorized_ols(y, x, window):
-    print("Vectorized OLS started")
-    n = len(y)
-    hedge_ratio = np.full(n, np.nan)
-    
-    y_vals = y.values
-    x_vals = x.values
-    
-    for i in range(window-1, n):
-        y_window = y_vals[i-window+1:i+1]
-        x_window = x_vals[i-window+1:i+1]
-        denominator = np.sum(x_window ** 2)
-        if denominator != 0:
-            hedge_ratio[i] = np.sum(x_window * y_window) / denominator
-    
-    return hedge_ratio
+SPREAD_MODES = ("full", "incremental", "batch")
+MERGE_TOLERANCE_MINUTES = 5
+OHLC = ['open', 'high', 'low', 'close']
+
+def get_spread_mode(redis_client):
+    """Spread maintenance mode from account_matrix:account ('full' if unset)."""
+    mode = redis_client.hget("account_matrix:account", "spread_mode")
+    mode = mode.decode('utf-8').lower() if mode else "full"
+    return mode if mode in SPREAD_MODES else "full"
 
 class SpreadCalculator:
-    def __init__(self, exchange: str):
+    def __init__(self, exchange: str, ols_engine: str = "rolling", hedge_model: str = None):
         self.exchange = exchange.lower()
         self.config = config
+        if ols_engine not in OLS_ENGINES:
+            raise ValueError(f"Unknown OLS engine '{ols_engine}', expected one of {list(OLS_ENGINES)}")
+        self.ols_engine = ols_engine
         
         # Extract parameters for easy access
         self.signal_params = self.config['params']
         self.window = self.signal_params['window']
+        self.hedge_model = hedge_model or self.signal_params.get('hedge_model', DEFAULT_HEDGE_MODEL)
+        if self.hedge_model not in HEDGE_MODELS:
+            raise ValueError(f"Unknown hedge model '{self.hedge_model}', expected one of {list(HEDGE_MODELS)}")
+        self.hedge_params = self.signal_params.get('hedge_params', {})
 
     def generate_pair_name(self, sym1: str, sym2: str) -> str:
         clean = lambda s: s.replace(':', '').lower()
         return f"{clean(sym1)}_{clean(sym2)}"
 
-    def _calculate_ols_spread(self, merged_df: pd.DataFrame, window: int) -> pd.DataFrame:
-        lookback = self.window
+    def new_hedge_model(self, sym1: str = "", sym2: str = "", engine: str = None) -> HedgeModel:
+        """Hedge model selected by account_matrix:account hedge_model, sized to the OLS window."""
+        return new_hedge_model(self.hedge_model, self.window, (sym1, sym2),
+                               engine=OLS_ENGINES[engine or self.ols_engine], **self.hedge_params)
+
+    def _calculate_ols_spread(self, merged, window: int, engine: str = None, state: HedgeModel = None) -> pd.DataFrame:
+        """
+        Spread rows of an aligned pair (a _merge_dataframes frame or the
+        _align_legs arrays). Hedge ratio and spread OHLC come from one compiled
+        pass into preallocated buffers; rows with any NaN are skipped like dropna.
+        """
+        model = state if state is not None else self.new_hedge_model(engine=engine)
         min_periods = max(1, window // 2) #need to add min_periods from congfig if needed
         
-        y, x = merged_df["close_1"], merged_df["close_2"]
-        
-        if len(y) < min_periods:
+        n = len(merged["close_1"])
+        if n < min_periods:
             return pd.DataFrame()
         
-        hedge = vectorized_ols(y, x, lookback)
-        hedge_series = pd.Series(hedge, index=merged_df.index)
-        
         try:
-            spread_data = pd.DataFrame({
-                "timestamp": merged_df["timestamp"],
-                "symbol": merged_df["symbol_x"] + "_" + merged_df["symbol_y"],
-                "open": merged_df["open_1"] - (hedge_series * merged_df["open_2"]),
-                "high": merged_df["high_1"] - (hedge_series * merged_df["high_2"]),
-                "low": merged_df["low_1"] - (hedge_series * merged_df["low_2"]),
-                "close": merged_df["close_1"] - (hedge_series * merged_df["close_2"]),
+            leg1 = np.vstack([np.asarray(merged[f"{col}_1"], dtype=np.float64) for col in OHLC])
+            leg2 = np.vstack([np.asarray(merged[f"{col}_2"], dtype=np.float64) for col in OHLC])
+            out, keep = spread_buffers(n)
+            count = model.batch_spread(leg1, leg2, out, keep)
+            rows = keep[:count]
+
+            timestamps = pd.Series(merged["timestamp"]).array
+            if state is not None:
+                state.mark({"timestamp": timestamps[-1],
+                            **{f"{col}_{leg}": legs[i, -1] for leg, legs in ((1, leg1), (2, leg2)) for i, col in enumerate(OHLC)}})
+
+            symbol = f"{self._scalar(merged['symbol_x'])}_{self._scalar(merged['symbol_y'])}"
+            return pd.DataFrame({
+                "timestamp": timestamps[rows],
+                "symbol": symbol,
+                "open": out[1, :count],
+                "high": out[2, :count],
+                "low": out[3, :count],
+                "close": out[4, :count],
                 "volume": 0,
-                "slope": hedge_series
-            })
-            return spread_data.dropna()
+                "slope": out[0, :count]
+            }, index=rows)
         except Exception as e:
             print("[ERROR in spread_data creation]", e)
             return pd.DataFrame()
 
+    @staticmethod
+    def _scalar(value):
+        return value if isinstance(value, str) else pd.Series(value).iloc[0]
+
+    def _align_legs(self, df1: pd.DataFrame, df2: pd.DataFrame) -> dict:
+        return align_legs(df1, df2, MERGE_TOLERANCE_MINUTES)
+
     def _merge_dataframes(self, df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
-        df1_renamed = df1.rename(columns={
-            'open': 'open_1', 'high': 'high_1', 'low': 'low_1', 
-            'close': 'close_1', 'volume': 'volume_1'
-        })
-        df2_renamed = df2.rename(columns={
-            'open': 'open_2', 'high': 'high_2', 'low': 'low_2',
-            'close': 'close_2', 'volume': 'volume_2'
-        })
-        
-        merged = pd.merge_asof(
-            df1_renamed.sort_values('timestamp'),
-            df2_renamed.sort_values('timestamp'),
-            on='timestamp', direction='backward',
-            tolerance=pd.Timedelta(minutes=5),
-            suffixes=('_x', '_y')
-        )
-        return merged.ffill().dropna()
-
-    def calculate_historical_spread(self, df1: pd.DataFrame, df2: pd.DataFrame, window: int) -> pd.DataFrame:
+        return pd.DataFrame(self._align_legs(df1, df2))
+
+    def calculate_historical_spread(self, df1: pd.DataFrame, df2: pd.DataFrame, window: int, state: HedgeModel = None) -> pd.DataFrame:
         if df1.empty or df2.empty:
             return pd.DataFrame()
 
-        merged = self._merge_dataframes(df1, df2)
-        if merged.empty:
+        aligned = self._align_legs(df1, df2)
+        if not len(aligned["timestamp"]):
             return pd.DataFrame()
 
-        return self._calculate_ols_spread(merged, window)
\ No newline at end of file
+        return self._calculate_ols_spread(aligned, window, state=state)
+
+    def _seed_frame(self, state: HedgeModel, leg: int, like: pd.Series) -> pd.DataFrame:
+        bar = state.last_bar[4 * (leg - 1):4 * leg]
+        timestamp = state.last_timestamp
+        if getattr(like.dt, 'tz', None) is not None and timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(like.dt.tz)
+        seed = pd.DataFrame({
+            "symbol": [state.symbols[leg - 1]], "timestamp": [timestamp],
+            "open": [bar[0]], "high": [bar[1]], "low": [bar[2]], "close": [bar[3]], "volume": [0.0]
+        })
+        seed["timestamp"] = seed["timestamp"].astype(like.dtype)
+        return seed
+
+    def calculate_incremental_spread(self, state: HedgeModel, df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
+        """
+        Spread rows for bars closed after state.last_timestamp. The last merged
+        bar is prepended to both legs so merge_asof/ffill see the same history
+        as a full recompute; the state is advanced in place.
+        """
+        if df1.empty or not state.is_ready():
+            return pd.DataFrame()
+
+        like = df1["timestamp"]
+        df1 = pd.concat([self._seed_frame(state, 1, like), df1], ignore_index=True)
+        df2 = pd.concat([self._seed_frame(state, 2, like), df2], ignore_index=True) if not df2.empty else self._seed_frame(state, 2, like)
+        merged = self._merge_dataframes(df1, df2)
+        merged = merged[merged["timestamp"] > df1["timestamp"].iloc[0]]
+
+        rows = []
+        for _, row in merged.iterrows():
+            hedge = state.update(float(row["close_1"]), float(row["close_2"]))
+            state.mark(row)
+            rows.append({
+                "timestamp": row["timestamp"],
+                "symbol": f"{row['symbol_x']}_{row['symbol_y']}",
+                "open": row["open_1"] - hedge * row["open_2"],
+                "high": row["high_1"] - hedge * row["high_2"],
+                "low": row["low_1"] - hedge * row["low_2"],
+                "close": row["close_1"] - hedge * row["close_2"],
+                "volume": 0,
+                "slope": hedge
+            })
+        return pd.DataFrame(rows).dropna() if rows else pd.DataFrame()
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+from datetime import date
+import numpy as np
+import pandas as pd
+from services.data_lake.minute_index import LOCAL_TZ, to_epoch_minute
+
+MINUTES_PER_DAY = 1440
+IST_OFFSET_MINUTES = 330
+
+# NSE cash session in minutes of the (IST) day, both ends inclusive: the
+# 9:15 to 15:29 one-minute candles of the 9:15-15:30 market
+NSE_SESSION = (9 * 60 + 15, 15 * 60 + 29)
+
+# Weekday trading holidays of the NSE equity segment. Dates missing here
+# (next year's list, unscheduled closures) can be added through NSE_EXTRA_HOLIDAYS
+# as comma-separated YYYY-MM-DD.
+NSE_HOLIDAYS = (
+    "2016-01-26", "2016-03-07", "2016-03-24", "2016-03-25", "2016-04-14", "2016-04-15", "2016-04-19",
+    "2016-07-06", "2016-08-15", "2016-09-05", "2016-09-13", "2016-10-11", "2016-10-12", "2016-10-31",
+    "2016-11-14",
+    "2017-01-26", "2017-02-24", "2017-03-13", "2017-04-04", "2017-04-14", "2017-05-01", "2017-06-26",
+    "2017-08-15", "2017-08-25", "2017-10-02", "2017-10-19", "2017-10-20", "2017-12-25",
+    "2018-01-26", "2018-02-13", "2018-03-02", "2018-03-29", "2018-03-30", "2018-05-01", "2018-08-15",
+    "2018-08-22", "2018-09-13", "2018-09-20", "2018-10-02", "2018-10-18", "2018-11-07", "2018-11-08",
+    "2018-11-23", "2018-12-25",
+    "2019-03-04", "2019-03-21", "2019-04-17", "2019-04-19", "2019-04-29", "2019-05-01", "2019-06-05",
+    "2019-08-12", "2019-08-15", "2019-09-02", "2019-09-10", "2019-10-02", "2019-10-08", "2019-10-21",
+    "2019-10-28", "2019-11-12", "2019-12-25",
+    "2020-02-21", "2020-03-10", "2020-04-02", "2020-04-06", "2020-04-10", "2020-04-14", "2020-05-01",
+    "2020-05-25", "2020-10-02", "2020-11-16", "2020-11-30", "2020-12-25",
+    "2021-01-26", "2021-03-11", "2021-03-29", "2021-04-02", "2021-04-14", "2021-04-21", "2021-05-13",
+    "2021-07-21", "2021-08-19", "2021-09-10", "2021-10-15", "2021-11-04", "2021-11-05", "2021-11-19",
+    "2022-01-26", "2022-03-01", "2022-03-18", "2022-04-14", "2022-04-15", "2022-05-03", "2022-08-09",
+    "2022-08-15", "2022-08-31", "2022-10-05", "2022-10-24", "2022-10-26", "2022-11-08",
+    "2023-01-26", "2023-03-07", "2023-03-30", "2023-04-04", "2023-04-07", "2023-04-14", "2023-05-01",
+    "2023-06-29", "2023-08-15", "2023-09-19", "2023-10-02", "2023-10-24", "2023-11-14", "2023-11-27",
+    "2023-12-25",
+    "2024-01-22", "2024-01-26", "2024-03-08", "2024-03-25", "2024-03-29", "2024-04-11", "2024-04-17",
+    "2024-05-01", "2024-05-20", "2024-06-17", "2024-07-17", "2024-08-15", "2024-10-02", "2024-11-01",
+    "2024-11-15", "2024-11-20", "2024-12-25",
+    "2025-02-26", "2025-03-14", "2025-03-31", "2025-04-10", "2025-04-14", "2025-04-18", "2025-05-01",
+    "2025-08-15", "2025-08-27", "2025-10-02", "2025-10-21", "2025-10-22", "2025-11-05", "2025-12-25",
+    "2026-01-26", "2026-03-03", "2026-03-26", "2026-03-31", "2026-04-03", "2026-04-14", "2026-05-01",
+    "2026-05-28", "2026-06-26", "2026-09-14", "2026-10-02", "2026-10-20", "2026-11-10", "2026-11-24",
+    "2026-12-25",
+)
+EXTRA_HOLIDAYS = tuple(d.strip() for d in os.getenv("NSE_EXTRA_HOLIDAYS", "").split(",") if d.strip())
+CALENDAR_START = date(2016, 1, 1)
+
+class TradingCalendar:
+    """
+    Every trading minute of an exchange as one sorted int64 array of
+    wall-clock epoch minutes (the keying to_epoch_minutes() uses for naive
+    nse_stocks timestamps), so offsets, counts and ranges are searchsorted
+    lookups instead of minute-by-minute walks. Built for weekdays from
+    `start` through the end of next year, minus `holidays`.
+    """
+    def __init__(self, session, holidays=(), start=CALENDAR_START, end=None):
+        end = end or date(date.today().year + 1, 12, 31)
+        days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1).astype(np.int64)
+        # Epoch day 0 was a Thursday; Monday = 0
+        days = days[(days + 3) % 7 < 5]
+        days = np.setdiff1d(days, np.array(holidays, dtype='datetime64[D]').astype(np.int64))
+        self.session = session
+        self.minutes_per_session = session[1] - session[0] + 1
+        self.minutes = (days[:, None] * MINUTES_PER_DAY
+                        + np.arange(session[0], session[1] + 1)[None, :]).ravel()
+
+    def position(self, minute, side='right'):
+        """Number of trading minutes at or before (side='right') or before (side='left') `minute`."""
+        return int(np.searchsorted(self.minutes, minute, side=side))
+
+    def count(self, first, last):
+        """Trading minutes in the inclusive wall-clock minute range [first, last]."""
+        return max(0, self.position(last) - self.position(first, side='left'))
+
+    def between(self, first, last):
+        """The trading minutes in [first, last], as a view of the calendar."""
+        return self.minutes[self.position(first, side='left'):self.position(last)]
+
+    def runs(self, first, last):
+        """Inclusive (start, end) stretches of consecutive trading minutes in [first, last]."""
+        minutes = self.between(first, last)
+        if not len(minutes):
+            return []
+        breaks = np.flatnonzero(np.diff(minutes) > 1)
+        starts = np.concatenate(([minutes[0]], minutes[breaks + 1]))
+        ends = np.concatenate((minutes[breaks], [minutes[-1]]))
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def shift(self, minute, n):
+        """
+        The trading minute n trading minutes after (n < 0: before) the last
+        trading minute at or before `minute`, clipped to the calendar.
+        """
+        index = self.position(minute) - 1 + n
+        return int(self.minutes[min(max(index, 0), len(self.minutes) - 1)])
+
+    def subtract(self, value, minutes):
+        """
+        Datetime `minutes` trading minutes before `value` (counting `value`
+        itself when it is a trading minute). Naive values are wall-clock IST
+        and stay naive; aware values keep their timezone.
+        """
+        if minutes <= 0:
+            return value
+        minute = self.shift(to_epoch_minute(value), -minutes)
+        result = pd.Timestamp(minute * 60, unit='s')
+        tzinfo = getattr(value, 'tzinfo', None)
+        if tzinfo is not None:
+            result = result.tz_localize(LOCAL_TZ).tz_convert(tzinfo)
+        return result.to_pydatetime()
+
+NSE_CALENDAR = TradingCalendar(NSE_SESSION, NSE_HOLIDAYS + EXTRA_HOLIDAYS)
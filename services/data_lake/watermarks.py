@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+import pandas as pd
+from services.db_config import get_db_connection
+
+WATERMARK_TTL_SECONDS = float(os.getenv("WATERMARK_TTL_SECONDS", 300))
+
+class WatermarkService:
+    """
+    Last stored timestamp per symbol (or spread pair) of one table, held in
+    memory. Missing or expired entries are fetched for all requested and
+    already known symbols in one query; writers call advance() after they
+    commit so the next cycle needs no query at all. Entries are re-read after
+    ttl seconds to pick up rows written by other processes.
+    """
+    def __init__(self, table, ttl=WATERMARK_TTL_SECONDS):
+        self.table = table
+        self.ttl = ttl
+        self._marks = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def _query(self, symbols=None):
+        if symbols is None:
+            query = f"SELECT symbol, MAX(timestamp) FROM {self.table} GROUP BY symbol"
+            params = None
+        else:
+            # One index lookup per symbol instead of a scan of the whole table
+            query = f"""
+                SELECT s.symbol, (SELECT MAX(t.timestamp) FROM {self.table} t WHERE t.symbol = s.symbol)
+                FROM unnest(%s::text[]) AS s(symbol)
+            """
+            params = (list(symbols),)
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            return dict(cur.fetchall())
+
+    def load(self, symbols=None):
+        """Fetch watermarks for `symbols` (every symbol of the table if None) in one query."""
+        marks = self._query(symbols)
+        now = time.monotonic()
+        with self._lock:
+            for symbol in (marks if symbols is None else symbols):
+                self._marks[symbol] = marks.get(symbol)
+                self._loaded_at[symbol] = now
+        return marks
+
+    def get_many(self, symbols):
+        symbols = list(symbols)
+        now = time.monotonic()
+        with self._lock:
+            stale = [s for s in symbols if now - self._loaded_at.get(s, -float("inf")) > self.ttl]
+            if stale:
+                # Refresh every other expired entry in the same round trip
+                stale += [s for s, at in self._loaded_at.items() if now - at > self.ttl and s not in stale]
+        if stale:
+            self.load(stale)
+        with self._lock:
+            return {s: self._marks.get(s) for s in symbols}
+
+    def get(self, symbol):
+        return self.get_many([symbol])[symbol]
+
+    def advance(self, symbol, timestamp):
+        """Move a symbol's watermark forward after rows up to `timestamp` were committed."""
+        if timestamp is None:
+            return
+        with self._lock:
+            current = self._marks.get(symbol)
+            if symbol in self._loaded_at and (current is None or timestamp > current):
+                self._marks[symbol] = timestamp
+
+    def behind(self, df):
+        """
+        Symbols of a written frame whose oldest row is at or behind their
+        watermark, i.e. not a plain append; symbols never loaded count too.
+        """
+        oldest = df.groupby('symbol', sort=False)['timestamp'].min()
+        with self._lock:
+            return [symbol for symbol, timestamp in oldest.items()
+                    if symbol not in self._marks
+                    or (self._marks[symbol] is not None and pd.Timestamp(timestamp) <= self._marks[symbol])]
+
+    def advance_from(self, df):
+        """advance() every symbol of a written frame to its newest timestamp."""
+        if df.empty:
+            return
+        newest = df.groupby('symbol', sort=False)['timestamp'].max()
+        for symbol, timestamp in newest.items():
+            self.advance(symbol, pd.Timestamp(timestamp).to_pydatetime())
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(symbol, None)
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_watermarks(table):
+    """The process-wide WatermarkService for a table, created on first use."""
+    with _services_lock:
+        service = _services.get(table)
+        if service is None:
+            service = _services[table] = WatermarkService(table)
+        return service
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import random
+import asyncio
+import itertools
+import orjson
+import websockets
+
+# Binance allows 1024 streams per connection; stay well below it so a
+# reconnect resubscribes a bounded number of streams
+MAX_STREAMS_PER_SOCKET = int(os.getenv("BINANCE_WS_MAX_STREAMS", 200))
+RECONNECT_BASE_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 60.0
+SHARD_METRICS_KEY = "live_feed:shard_metrics"
+
+class Shard:
+    """One websocket and the symbols subscribed on it."""
+    def __init__(self, shard_id):
+        self.id = shard_id
+        self.symbols = set()
+        self.websocket = None
+        self.idle_closed = False
+        self.wake = asyncio.Event()
+        self.task = None
+        self.connects = 0
+        self.reconnects = 0
+        self.messages = 0
+        self.errors = 0
+        self.last_message = None
+        self.last_error = None
+        self._rate_mark = (time.monotonic(), 0)
+
+    def metrics(self):
+        now = time.monotonic()
+        mark_time, mark_count = self._rate_mark
+        self._rate_mark = (now, self.messages)
+        return {
+            "streams": len(self.symbols),
+            "connected": self.websocket is not None,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "messages": self.messages,
+            "message_rate": round((self.messages - mark_count) / (now - mark_time), 2) if now > mark_time else 0.0,
+            "last_message_age": round(now - self.last_message, 3) if self.last_message else None,
+            "handler_errors": self.errors,
+            "last_error": self.last_error,
+            "updated": int(time.time()),
+        }
+
+class StreamManager:
+    """
+    Spreads Binance stream subscriptions over as many websockets as needed,
+    at most max_streams each. Every shard reconnects on its own with
+    jittered exponential backoff and resubscribes its symbols, so one
+    dropped socket never takes the others down. set_symbols() can be called
+    at any time: only the difference is (un)subscribed, on the shards that
+    hold it, new symbols fill the emptiest shard first and a shard left
+    without symbols closes its socket until it gets some. Every decoded
+    message is passed to on_message(data) on the event loop, and the raw
+    frame to recorder.write(frame) first when a FrameRecorder is given.
+    """
+    def __init__(self, uri, on_message, stream_suffix="@trade", max_streams=MAX_STREAMS_PER_SOCKET, recorder=None):
+        self.uri = uri
+        self.on_message = on_message
+        self.recorder = recorder
+        self.stream_suffix = stream_suffix
+        self.max_streams = max_streams
+        self.shards = []
+        self.assigned = {}
+        self._ids = itertools.count(1)
+
+    async def _send(self, shard, method, symbols):
+        if shard.websocket is None or not symbols:
+            return
+        params = [f"{symbol}{self.stream_suffix}" for symbol in sorted(symbols)]
+        try:
+            await shard.websocket.send(json.dumps({"method": method, "params": params, "id": next(self._ids)}))
+        except Exception as e:
+            # The shard's reconnect resubscribes whatever it holds by then
+            print(f"[WS] shard {shard.id} {method} failed: {e}")
+
+    def _place(self, symbol):
+        open_shards = [s for s in self.shards if len(s.symbols) < self.max_streams]
+        if open_shards:
+            shard = min(open_shards, key=lambda s: len(s.symbols))
+        else:
+            shard = Shard(len(self.shards))
+            self.shards.append(shard)
+        shard.symbols.add(symbol)
+        self.assigned[symbol] = shard
+        return shard
+
+    async def set_symbols(self, symbols):
+        symbols = set(symbols)
+        removed, added = {}, {}
+        for symbol in set(self.assigned) - symbols:
+            shard = self.assigned.pop(symbol)
+            shard.symbols.discard(symbol)
+            removed.setdefault(shard, set()).add(symbol)
+        for symbol in sorted(symbols - set(self.assigned)):
+            added.setdefault(self._place(symbol), set()).add(symbol)
+        for shard, shard_symbols in removed.items():
+            if not shard.symbols and shard.websocket is not None:
+                # Nothing left on it: drop the socket, _run_shard parks on wake
+                shard.idle_closed = True
+                try:
+                    await shard.websocket.close()
+                except Exception as e:
+                    print(f"[WS] shard {shard.id} close failed: {e}")
+            else:
+                await self._send(shard, "UNSUBSCRIBE", shard_symbols)
+        for shard, shard_symbols in added.items():
+            if shard.task is None:
+                shard.task = asyncio.create_task(self._run_shard(shard))
+            await self._send(shard, "SUBSCRIBE", shard_symbols)
+            shard.wake.set()
+        if removed or added:
+            print(f"[WS] {len(self.assigned)} streams on {len(self.shards)} shards "
+                  f"(+{sum(map(len, added.values()))} -{sum(map(len, removed.values()))})")
+
+    async def _run_shard(self, shard):
+        attempt = 0
+        while True:
+            if not shard.symbols:
+                # Emptied by set_symbols: hold no socket until symbols come back
+                shard.wake.clear()
+                await shard.wake.wait()
+                continue
+            try:
+                async with websockets.connect(self.uri, ping_interval=20, ping_timeout=20) as websocket:
+                    shard.websocket = websocket
+                    shard.connects += 1
+                    await self._send(shard, "SUBSCRIBE", set(shard.symbols))
+                    print(f"[WS] shard {shard.id} subscribed to {len(shard.symbols)} symbols")
+                    async for message in websocket:
+                        shard.messages += 1
+                        shard.last_message = time.monotonic()
+                        attempt = 0
+                        try:
+                            if self.recorder is not None:
+                                self.recorder.write(message)
+                            self.on_message(orjson.loads(message))
+                        except Exception as e:
+                            shard.errors += 1
+                            shard.last_error = f"handler: {e}"
+                            print(f"[WS] shard {shard.id} message handler failed: {e}")
+                    shard.last_error = "closed by server"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                shard.last_error = str(e)
+            finally:
+                shard.websocket = None
+            if shard.idle_closed:
+                # Closed by set_symbols, not dropped: reconnect right away if symbols came back
+                shard.idle_closed = False
+                shard.last_error = None
+                attempt = 0
+                print(f"[WS] shard {shard.id} closed, no symbols left")
+                continue
+            shard.reconnects += 1
+            delay = min(RECONNECT_MAX_SECONDS, RECONNECT_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            print(f"[WS] shard {shard.id} disconnected ({shard.last_error}), reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def metrics(self):
+        return {shard.id: shard.metrics() for shard in self.shards}
+
+def load_shard_metrics(redis_client):
+    mapping = redis_client.hgetall(SHARD_METRICS_KEY)
+    return {k.decode(): json.loads(v) for k, v in mapping.items()}